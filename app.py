@@ -1,94 +1,250 @@
-from flask import Flask, request, abort, render_template  # ★ render_template を追加
+import time
 
-import json
+# 起動時間計測用（import 開始時刻）
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Blueprint, request, abort
+from jinja2 import FileSystemBytecodeCache
+
+import asyncio
+import contextvars
+import inspect
+import logging
 import os
+import unicodedata
+import uuid
 
-from linebot import LineBotApi, WebhookHandler
+from linebot import WebhookHandler, WebhookParser
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
     MessageEvent,
     TextMessage,
     TextSendMessage,
     TemplateSendMessage,
-    ConfirmTemplate,
-    MessageAction,
 )
 
-from dotenv import load_dotenv
-import datetime
+from datetime import datetime
 
-import secrets  # ★ 追加: 安全なトークン生成用
-from datetime import datetime, timedelta, timezone
 import constants
 
 
-from utils.db_utils import execute_sql
-from utils.validation import parse_and_validate_registration_data
+from utils.async_runtime import submit
+from utils.billing import get_month_invoices, get_recent_invoices, recent_billing_months
+from utils.config import get_config
+from utils.date_utils import order_window
+from utils.db_async import execute_prepared_async
+from utils.db_utils import execute_prepared, register_statement
+from utils.line_utils import get_line_bot_api, get_async_line_bot_api
+from utils.load_shed import ADMIT, get_load_shedder
+from utils.log_utils import log_context, log_event, setup_logging, should_log_body
+from utils.catalog import get_catalog
+from utils.menu import get_menu_payload, next_menu_days, reply_raw, serialize_message
+from utils.order_cache import get_order_cache
+from utils.orders import place_orders
+from utils.session_store import DbSessionInterface
+from utils.validation import (
+    parse_and_validate_order_text,
+    parse_and_validate_registration_data,
+)
 from routes.admin_holiday import register_store_holiday_form
 from routes.admin_holiday import admin_holiday_bp
-
-DATABASE_URL = os.environ.get("DATABASE_URL")
+from routes.admin_export import admin_export_bp, send_order_sheet_link
+from routes.metrics import metrics_bp
+from routes.assets import assets_bp
+from utils.assets import asset_url
 
 # import tasks
 
-# 環境変数（.envファイル）を読み込む
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# =========================================================
-# 1. 環境変数と認証情報の取得
-# =========================================================
-SECRET_KEY = os.environ.get("SECRET_KEY")
-LINE_CHANNEL_ACCESS_TOKEN = os.environ.get("LINE_CHANNEL_ACCESS_TOKEN")
-LINE_CHANNEL_SECRET = os.environ.get("LINE_CHANNEL_SECRET")
+# 処理中のメッセージの送り主の users.user_id（未登録なら None）。
+# handle_message / handle_message_async の user_check の結果を、ディスパッチ先で引き直さずに使う。
+# asyncio.to_thread はコンテキストを引き継ぐので、非同期版からスレッドで呼ぶ処理でも読める。
+current_user_id = contextvars.ContextVar("current_user_id", default=None)
 
-HOST_URL = os.environ.get("HOST_URL")  # ★★★ HOST_URL を取得 ★★★
+# import 時には .env の読み込みも SDK の初期化も行わない。
+# 設定は get_config()、LINE クライアントと DB プールは初回利用時に生成する。
+_handler = None
+_parser = None
 
-line_bot_api = LineBotApi(LINE_CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(LINE_CHANNEL_SECRET)
 
-# キーが不足していた場合の致命的なエラーチェック
-if not all([LINE_CHANNEL_ACCESS_TOKEN, LINE_CHANNEL_SECRET, DATABASE_URL]):
-    print(
-        "FATAL ERROR: 必要な環境変数が不足しています。LINE_... または DATABASE_URL を確認してください。"
-    )
+def get_handler():
+    """WebhookHandler を初回利用時に生成し、メッセージハンドラを登録する。"""
+    global _handler
+    if _handler is None:
+        _handler = WebhookHandler(get_config()["LINE_CHANNEL_SECRET"])
+        _handler.add(MessageEvent, message=TextMessage)(handle_message_guarded)
+    return _handler
 
-# 💡 デバッグ用（HOST_URLは正しく取得できています）
-print(f"DEBUG: HOST_URL is set to: {HOST_URL}")
+
+def get_parser():
+    """非同期 Webhook 用の WebhookParser（署名検証とイベントの解析だけを行う）。"""
+    global _parser
+    if _parser is None:
+        _parser = WebhookParser(get_config()["LINE_CHANNEL_SECRET"])
+    return _parser
 
 
 # =========================================================
-# 2. Flask/SDKの初期化
+# 2. Flask/SDKの初期化（アプリケーションファクトリ）
 # =========================================================
-app = Flask(__name__)
-app.register_blueprint(admin_holiday_bp)
-if SECRET_KEY:
-    app.secret_key = SECRET_KEY
-else:
-    print(
-        "WARNING: SECRET_KEY is missing. Session and security features will be disabled."
+def create_app():
+    """
+    Flask アプリを組み立てて返す。
+    gunicorn --preload でも fork 前に接続を作らないため、ワーカー間でメモリを共有しやすい。
+    """
+    boot_started = time.perf_counter()
+
+    # 環境変数（.envファイル）を読み込む
+    config = get_config()
+
+    # ログはキュー経由で別スレッドから書き出す（LOG_LEVEL で制御）
+    setup_logging()
+
+    # キーが不足していた場合の致命的なエラーチェック
+    if not all(
+        [
+            config["LINE_CHANNEL_ACCESS_TOKEN"],
+            config["LINE_CHANNEL_SECRET"],
+            config["DATABASE_URL"],
+        ]
+    ):
+        logger.critical(
+            "FATAL ERROR: 必要な環境変数が不足しています。LINE_... または DATABASE_URL を確認してください。"
+        )
+
+    # 💡 デバッグ用（HOST_URLは正しく取得できています）
+    logger.debug("HOST_URL is set to: %s", config["HOST_URL"])
+
+    app = Flask(__name__)
+    app.register_blueprint(webhook_bp)
+    app.register_blueprint(admin_holiday_bp)
+    app.register_blueprint(admin_export_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(assets_bp)
+
+    # テンプレートはコンパイル結果をファイルに残し、再起動・ワーカー追加時に再コンパイルしない
+    os.makedirs(config["JINJA_CACHE_DIR"], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(config["JINJA_CACHE_DIR"])
+    # CSS/JS はハッシュ付きURLで参照する（{{ asset_url('css/form.css') }}）
+    app.add_template_global(asset_url)
+
+    # セッションは Cookie ではなく sessions テーブルに保存する
+    app.session_interface = DbSessionInterface(
+        lifetime_minutes=config["SESSION_LIFETIME_MINUTES"],
+        cache_ttl=config["SESSION_CACHE_TTL"],
+    )
+    if config["SECRET_KEY"]:
+        app.secret_key = config["SECRET_KEY"]
+    else:
+        logger.warning(
+            "SECRET_KEY is missing. Session and security features will be disabled."
+        )
+
+    # 起動メトリクス: import にかかった時間と create_app にかかった時間
+    now = time.perf_counter()
+    app.config["STARTUP_METRICS"] = {
+        "import_ms": round((boot_started - _IMPORT_STARTED) * 1000, 1),
+        "boot_ms": round((now - boot_started) * 1000, 1),
+    }
+    logger.info(
+        "startup: import=%.1fms boot=%.1fms pid=%s",
+        app.config["STARTUP_METRICS"]["import_ms"],
+        app.config["STARTUP_METRICS"]["boot_ms"],
+        os.getpid(),
     )
+    return app
 
 
 # =========================================================
 # 3. Webhookの処理ルート（省略）
 # =========================================================
-@app.route("/webhook", methods=["POST"])
+webhook_bp = Blueprint("webhook", __name__)
+
+
+@webhook_bp.route("/webhook", methods=["POST"])
 def webhook_handler():
+    # この Webhook 呼び出しで出すログ（非同期で処理するイベントの分も含む）に request_id を付ける
+    request_id = request.headers.get("X-Request-Id") or uuid.uuid4().hex
+    with log_context(request_id=request_id):
+        return _handle_webhook_request()
+
+
+def _handle_webhook_request():
     signature = request.headers.get("X-Line-Signature")
     body = request.get_data(as_text=True)
 
-    print("\n--- WEBHOOK REQUEST RECEIVED ---")
-    app.logger.info("Request body: " + body)
+    logger.debug("--- WEBHOOK REQUEST RECEIVED ---")
+    # ボディ全文はサンプリングした分だけ出す（マスキングはリスナー側で行う）
+    if should_log_body():
+        logger.info("Request body: %s", body)
 
     try:
-        handler.handle(body, signature)
+        if get_config()["WEBHOOK_ASYNC"]:
+            # 非同期モード: イベントをバックグラウンドのループに渡してすぐに応答する
+            for event in get_parser().parse(body, signature):
+                if isinstance(event, MessageEvent) and isinstance(
+                    event.message, TextMessage
+                ):
+                    # DB に触れる前に受け付け可否を判定（枠は処理完了時に返す）
+                    if not admit_event(event):
+                        continue
+                    future = submit(handle_message_async(event))
+                    future.add_done_callback(_on_async_message_done)
+        else:
+            get_handler().handle(body, signature)
     except InvalidSignatureError:
-        print("Invalid signature. Check your channel secret.")
+        logger.warning("Invalid signature. Check your channel secret.")
         abort(400)
 
     return "OK", 200
 
 
+def _on_async_message_done(future):
+    get_load_shedder().release()
+    exc = future.exception()
+    if exc:
+        logger.error("非同期メッセージ処理でエラーが発生しました: %s", exc, exc_info=exc)
+
+
+# =========================================================
+# 過負荷対策: DB に触れる前にイベントを受け付けるか判定する
+# =========================================================
+# 断りの返信は毎回同じなので一度だけ作っておく
+BUSY_REPLY = TextSendMessage(
+    text="ただいま混み合っています。少し時間をおいてから、もう一度送ってください。"
+)
+
+
+def admit_event(event):
+    """受け付けるなら True。断る場合は必要に応じて定型文を返信して False。"""
+    load_shedder = get_load_shedder()
+    decision = load_shedder.admit(event)
+    if decision == ADMIT:
+        return True
+
+    logger.info("shed event: %s", decision)
+    if get_config()["SHED_REPLY_MODE"] == "reply" and load_shedder.should_reply(
+        event, decision
+    ):
+        try:
+            get_line_bot_api().reply_message(event.reply_token, BUSY_REPLY)
+        except Exception as e:
+            logger.warning("BUSY REPLY ERROR: %s", e)
+    return False
+
+
+def handle_message_guarded(event):
+    """WebhookHandler に登録する入口。受け付けた場合だけ handle_message を呼ぶ。"""
+    if not admit_event(event):
+        return "SHED"
+    try:
+        with log_event(logger, event_id=event.webhook_event_id, event_type=event.type):
+            return handle_message(event)
+    finally:
+        get_load_shedder().release()
+
+
 # ============================================================
 # プレ5 まずここを追加（ファイル先頭〜handle_message より上）
 # ============================================================
@@ -105,10 +261,181 @@ def admin_daily_status(event, user_id):
     return "（管理者）ゆりぴょんチェック：あとで実装"
 
 
+# 1通のメッセージに載せる請求の行数（LINE のテキストは 5000 文字まで）
+ADMIN_INVOICE_MAX_LINES = 60
+
+
+def admin_invoices(event, user_id):
+    """「請求」「請求 2024-05」: 指定月（省略時は前月）の請求スナップショットの一覧。"""
+    parts = unicodedata.normalize("NFKC", event.message.text).split()
+    if len(parts) >= 2:
+        try:
+            month_start = datetime.strptime(parts[1], "%Y-%m")
+        except ValueError:
+            return "月は「請求 2024-05」のように YYYY-MM で指定してください。"
+        year, month = month_start.year, month_start.month
+    else:
+        year, month = recent_billing_months()[0]
+
+    rows = get_month_invoices(year, month)
+    if "error" in rows:
+        return "🚨 データベースエラーが発生しました。時間を置いてお試しください。"
+    if not rows:
+        return f"{year}年{month}月分の請求はまだ作成されていません（python tasks.py billing {year}-{month:02d}）。"
+
+    lines = [
+        f"{row['user_grade']}年{row['user_class']}組 {row['user_last_name']} {row['user_first_name']}："
+        f"{row['total_amount']}円（{row['order_count']}件）"
+        for row in rows[:ADMIN_INVOICE_MAX_LINES]
+    ]
+    if len(rows) > ADMIN_INVOICE_MAX_LINES:
+        lines.append(f"…ほか{len(rows) - ADMIN_INVOICE_MAX_LINES}名")
+    total = sum(row["total_amount"] for row in rows)
+    return (
+        f"{year}年{month}月分の請求（{len(rows)}名・合計{total}円）\n" + "\n".join(lines)
+    )
+
+
 # ---------------------- 一般ユーザー機能 --------------------
+WEEKDAYS_JA = "月火水木金土日"
+
+ORDER_USAGE_TEXT = (
+    "注文する日と商品を続けて送ってください。複数日は「/」で区切れます。\n"
+    "例: 注文 月 幕の内 / 火 ハンバーグ丼 / 5/20 カレー 2"
+)
+
+# メニューと一緒に送る使い方（送るたびに組み立てないよう bytes にしておく）
+ORDER_USAGE_PAYLOAD = serialize_message({"type": "text", "text": ORDER_USAGE_TEXT})
+
+
+def reply_order_menu(event):
+    """
+    使い方と、次に注文できる日のメニューを返信する（メニューは作り置きの bytes をそのまま送る）。
+    送れなかった場合は False（呼び出し側で使い方の文だけを返す）。
+    """
+    days = next_menu_days(1)
+    if not days:
+        return False
+    payload = get_menu_payload(days[0])
+    if not isinstance(payload, bytes):
+        return False
+    try:
+        reply_raw(event.reply_token, [ORDER_USAGE_PAYLOAD, payload])
+    except Exception as e:
+        logger.warning("MENU REPLY ERROR: %s", e)
+        return False
+    return True
+
+
 def user_order(event, user_id):
-    # 後でここに注文処理を書く
-    return "（一般ユーザー）注文機能：あとで実装"
+    # 「注文」だけなら使い方とメニューを返す
+    if len(event.message.text.split()) < 2:
+        if reply_order_menu(event):
+            return None
+        return ORDER_USAGE_TEXT
+
+    # 商品マスタ・休日はメモリ上のスナップショットで検証する（DBは見ない）
+    catalog = get_catalog()
+    if isinstance(catalog, dict):
+        return "🚨 データベースエラーが発生しました。時間を置いてお試しください。"
+
+    validation_result = parse_and_validate_order_text(event.message.text, catalog)
+    if not validation_result.get("success"):
+        return f"⚠️ 入力エラー：{validation_result['error']}\n\n{ORDER_USAGE_TEXT}"
+
+    items = validation_result["data"]
+    result = place_orders(user_id, items)
+    if "error" in result:
+        return f"🚨 {result['error']}"
+
+    # [ ] 内は注文番号（キャンセルで指定する）
+    lines = [
+        f"[{order_id}] {item['order_date'].month}/{item['order_date'].day}"
+        f"({WEEKDAYS_JA[item['order_date'].weekday()]}) "
+        f"{item['product_name']} ×{item['quantity']} {item['unit_price'] * item['quantity']}円"
+        for item, order_id in zip(items, result["order_ids"])
+    ]
+    return (
+        "注文を受け付けました。\n"
+        + "\n".join(lines)
+        + f"\n\n合計：{result['total_amount']}円\n確認は「確認」、取り消しは「キャンセル」と送ってください。"
+    )
+
+
+def format_upcoming_order(order):
+    """
+    確認・キャンセルの一覧の1行（例: [123] 5/20(月) 幕の内弁当 ×1 500円）。
+    [ ] 内は注文番号（order_id）。キャンセルは一覧の何番目かではなくこの番号で指定する。
+    """
+    order_date = order["order_date"]
+    line = (
+        f"[{order['order_id']}] {order_date.month}/{order_date.day}({WEEKDAYS_JA[order_date.weekday()]}) "
+        f"{order['product_name']} ×{order['quantity']} {order['total_amount']}円"
+    )
+    if order["options"]:
+        line += f"\n   {order['options']}"
+    return line
+
+
+def invoice_lines(user_id):
+    """
+    前月・今月の請求額（請求スナップショットの最新版）の行。集計し直さずスナップショットを読むだけ。
+    請求処理（python tasks.py billing）がまだの月は出さない。user_id は users.user_id。
+    """
+    if user_id is None:
+        return []
+    rows = get_recent_invoices(user_id)
+    if "error" in rows:
+        return []
+    return [
+        f"{row['billing_month'].month}月分のご請求：{row['total_amount']}円"
+        f"（{row['order_count']}件・税込）"
+        for row in rows
+    ]
+
+
+def user_status(event, user_id):
+    orders = get_order_cache().get(user_id)
+    if "error" in orders:
+        return "🚨 データベースエラーが発生しました。時間を置いてお試しください。"
+
+    if orders:
+        lines = [format_upcoming_order(order) for order in orders]
+        total = sum(order["total_amount"] for order in orders)
+        response_text = "今後の注文\n" + "\n".join(lines) + f"\n\n合計：{total}円"
+    else:
+        response_text = "今後の注文はありません。"
+
+    invoices = invoice_lines(current_user_id.get())
+    if invoices:
+        response_text += "\n\n" + "\n".join(invoices)
+    return response_text
+
+
+def user_cancel(event, user_id):
+    # 「キャンセル」だけなら締め切り前の注文の一覧を返し、「キャンセル 123」なら注文番号 123 をキャンセルする
+    parts = unicodedata.normalize("NFKC", event.message.text).split()
+    if len(parts) < 2:
+        orders = get_order_cache().get(user_id)
+        if "error" in orders:
+            return "🚨 データベースエラーが発生しました。時間を置いてお試しください。"
+        first_day, _ = order_window()
+        orders = [order for order in orders if order["order_date"] >= first_day]
+        if not orders:
+            return "キャンセルできる注文はありません。"
+        lines = [format_upcoming_order(order) for order in orders]
+        return (
+            "キャンセルする注文の番号（[ ] 内の数字）を「キャンセル 123」のように送ってください。\n"
+            + "\n".join(lines)
+        )
+
+    if not parts[1].isdigit():
+        return "注文番号（[ ] 内の数字）を「キャンセル 123」のように指定してください。"
+
+    result = get_order_cache().cancel(user_id, int(parts[1]))
+    if "error" in result:
+        return f"キャンセルできませんでした：{result['error']}"
+    return "以下の注文をキャンセルしました。\n" + format_upcoming_order(result["order"])
 
 
 # ---------------------- デフォルト応答 ------------------------
@@ -121,69 +448,246 @@ ADMIN_DISPATCH = {
     "休み": register_store_holiday_form,
     "テクマクマヤコン": admin_order_by_user,
     "ゆりぴょんチェック": admin_daily_status,
+    constants.ADMIN_KEYWORD_ORDER_SHEET: send_order_sheet_link,
+    constants.ADMIN_KEYWORD_INVOICES: admin_invoices,
 }
 
 USER_DISPATCH = {
-    "注文": user_order,
+    constants.USER_KEYWORD_ORDER: user_order,
+    constants.USER_KEYWORD_STATUS: user_status,
+    constants.USER_KEYWORD_CANCEL: user_cancel,
 }
 
 
+# ---------------------- 頻出クエリ ----------------------
+# 全メッセージで実行されるため、接続ごとに一度だけ PREPARE して EXECUTE で使い回す
+USER_CHECK_SQL = "SELECT user_id FROM users WHERE user_line_id = %s;"
+ADMIN_CHECK_SQL = "SELECT admin_id FROM admins WHERE admin_line_id = %s;"
+STATE_SELECT_SQL = """
+SELECT 
+    temp_user_grade, temp_user_class, temp_user_last_name, 
+    temp_user_first_name, temp_user_line_name
+FROM registration_states WHERE user_line_id = %s;
+"""
+register_statement("user_check", USER_CHECK_SQL)
+register_statement("admin_check", ADMIN_CHECK_SQL)
+register_statement("registration_state_select", STATE_SELECT_SQL)
+
+# ---------------------- 登録フロー用SQL（同期・非同期で共有） ----------------------
+# DBリセット用のSQL (全体で共有)
+DELETE_SQL = "DELETE FROM registration_states WHERE user_line_id = %s;"
+
+INSERT_USERS_SQL = """
+INSERT INTO users (user_line_id, user_grade, user_class, user_last_name, user_first_name, user_line_name)
+VALUES (%s, %s, %s, %s, %s, %s);
+"""
+
+UPDATE_SQL = """
+UPDATE registration_states 
+SET temp_user_grade = %s, temp_user_class = %s, 
+    temp_user_last_name = %s, temp_user_first_name = %s,
+    temp_user_line_name = %s
+WHERE user_line_id = %s;
+"""
+
+INSERT_SQL = """
+INSERT INTO registration_states (user_line_id) 
+VALUES (%s);
+"""
+register_statement("registration_delete", DELETE_SQL)
+register_statement("registration_user_insert", INSERT_USERS_SQL)
+register_statement("registration_update", UPDATE_SQL)
+register_statement("registration_start", INSERT_SQL)
+
+
+def dispatch_keyword(user_text):
+    """メッセージの先頭の語（「キャンセル 2」なら「キャンセル」）をキーワードとして返す。"""
+    parts = user_text.replace("　", " ").split(maxsplit=1)
+    return parts[0] if parts else ""
+
+
+def select_dispatch_handler(is_user, is_admin, user_text):
+    """
+    登録済みユーザーの場合にキーワードに対応する処理関数を返す。
+    未登録ユーザー（登録フローに進む）の場合は None を返す。
+    """
+    keyword = dispatch_keyword(user_text)
+
+    # ⭐ 1. 管理者（ユーザー登録済み）
+    if is_user and is_admin:
+        handler = ADMIN_DISPATCH.get(keyword)
+        if handler:
+            return handler
+        # 管理者は一般ユーザー機能も使える→この書き方が違う。
+        #ユーザーでもあり管理者でもある者が送った言葉が管理者用でなければユーザー機能や登録フローに移る。
+        return USER_DISPATCH.get(keyword, user_default)
+
+    # ⭐ 2. 一般ユーザー（ユーザー登録済み）
+    if is_user:
+        return USER_DISPATCH.get(keyword, user_default)
+
+    return None
+
+
+def registration_confirm_text(d):
+    response_text = "以下の内容で登録しますか？\n"
+    response_text += f"学年：**{d['grade']}**、クラス：**{d['class']}**\n"
+    response_text += f"氏名：**{d['last_name']} {d['first_name']}**\n"
+    response_text += (
+        "\nよろしければ**「はい」**、やめる場合は「いいえ」と送ってください。"
+    )
+    return response_text
+
+
+# ---------------------- 登録フロー（同期・非同期で共有） ----------------------
+# 登録の状態遷移は registration_flow に一つだけ書き、DB への問い合わせは
+# (ステートメント名, パラメータ, fetch) を yield して呼び出し側に任せる。
+# 同期版は execute_prepared、非同期版は execute_prepared_async で実行して結果を send() で返す。
+REGISTRATION_RESTART_TEXT = "登録を中断しました。再度**「登録」**と送ってください。"
+
+
+def registration_flow(line_user_id, user_text, user_line_name):
+    """未登録ユーザーのメッセージを処理し、応答文を返す（return）ジェネレータ。"""
+    state_result = yield ("registration_state_select", (line_user_id,), True)
+    state_data = (
+        state_result[0] if state_result and "error" not in state_result else None
+    )
+
+    # ----------------------------------------------
+    # B. 状態レコードがない場合（登録トリガー or 誘導）
+    # ----------------------------------------------
+    if not state_data:
+        if user_text != "登録":
+            # 登録誘導メッセージ (管理者キーワードであってもここに来る)
+            return f"{user_line_name} さん、ユーザー情報が未登録です。\n登録をご希望の場合は、**「登録」**と送ってください。"
+
+        start_result = yield ("registration_start", (line_user_id,), False)
+        if "success" in start_result:
+            return "登録を開始します。\n\n**学年（1〜3）・クラス・姓・名**をスペース区切りで一度に返信してください。\n例: 2 1 山田 太郎"
+        return "🚨 登録開始中にデータベースエラーが発生しました。再度「登録」と送ってください。"
+
+    # ----------------------------------------------
+    # A-i. 最終確認待ち ('grade' が入っていればデータは揃っている)
+    # ----------------------------------------------
+    if state_data.get("temp_user_grade") is not None:
+        if user_text.lower() not in ["はい", "yes"]:
+            # 「いいえ」またはその他のメッセージ -> 状態を破棄してリセット
+            yield ("registration_delete", (line_user_id,), False)
+            return REGISTRATION_RESTART_TEXT
+
+        # 最終登録処理 (INSERT users, DELETE state)
+        final_reg_result = yield (
+            "registration_user_insert",
+            (
+                line_user_id,
+                state_data.get("temp_user_grade"),
+                state_data.get("temp_user_class"),
+                state_data.get("temp_user_last_name"),
+                state_data.get("temp_user_first_name"),
+                user_line_name,
+            ),
+            False,
+        )
+        yield ("registration_delete", (line_user_id,), False)
+        if "success" in final_reg_result:
+            return f"{user_line_name} さん、ユーザー登録が完了しました！🎉"
+        return "🚨 最終登録処理中にデータベースエラーが発生しました。" + REGISTRATION_RESTART_TEXT
+
+    # ----------------------------------------------
+    # A-ii. データ入力待ち
+    # ----------------------------------------------
+    validation_result = parse_and_validate_registration_data(user_text)
+    if not validation_result.get("success"):
+        # 検証失敗 -> 状態を破棄してリセット
+        yield ("registration_delete", (line_user_id,), False)
+        error_message = validation_result.get("error", "入力が不正です。")
+        return f"⚠️ 入力エラー：{error_message}\n\n" + REGISTRATION_RESTART_TEXT
+
+    # 検証成功 -> 個別カラムに保存し、確認メッセージを返す
+    new_temp_data = validation_result.get("data")
+    yield (
+        "registration_update",
+        (
+            new_temp_data["grade"],
+            new_temp_data["class"],
+            new_temp_data["last_name"],
+            new_temp_data["first_name"],
+            user_line_name,
+            line_user_id,
+        ),
+        False,
+    )
+    return registration_confirm_text(new_temp_data)
+
+
+def run_registration_flow(line_user_id, user_text, user_line_name):
+    flow = registration_flow(line_user_id, user_text, user_line_name)
+    result = None
+    try:
+        while True:
+            name, params, fetch = flow.send(result)
+            result = execute_prepared(name, params, fetch=fetch, sticky_key=line_user_id)
+    except StopIteration as done:
+        return done.value
+
+
+async def run_registration_flow_async(line_user_id, user_text, user_line_name):
+    flow = registration_flow(line_user_id, user_text, user_line_name)
+    result = None
+    try:
+        while True:
+            name, params, fetch = flow.send(result)
+            result = await execute_prepared_async(
+                name, params, fetch=fetch, sticky_key=line_user_id
+            )
+    except StopIteration as done:
+        return done.value
+
+
+def build_reply_message(response_text):
+    if isinstance(response_text, TemplateSendMessage):
+        return response_text
+    return TextSendMessage(text=str(response_text))
+
+
 # =========================================================
 # 5. 🚨 メッセージイベント発生時の処理（最終構造：ID状態とキーワードの組み合わせ）
 # =========================================================
-# ※ 外部で定義された line_bot_api, handler, execute_sql, parse_and_validate_registration_data を使用
-@handler.add(MessageEvent, message=TextMessage)
+# ※ get_handler() で WebhookHandler に登録される
 def handle_message(event):
+    line_bot_api = get_line_bot_api()
     line_user_id = event.source.user_id
     user_text = event.message.text
     response_text = None
 
-    # DBリセット用のSQL (全体で共有)
-    DELETE_SQL = "DELETE FROM registration_states WHERE user_line_id = %s;"
-
     # ----------------------------------------------------
     # 1. ID 検索とステータス取得 (テーブル検索はここで完了)
     # ----------------------------------------------------
-    USER_CHECK_SQL = "SELECT user_id FROM users WHERE user_line_id = %s;"
-    user_result = execute_sql(USER_CHECK_SQL, params=(line_user_id,), fetch=True)
+    user_result = execute_prepared(
+        "user_check", params=(line_user_id,), sticky_key=line_user_id
+    )
     is_user = bool(user_result)
+    current_user_id.set(
+        user_result[0]["user_id"] if is_user and "error" not in user_result else None
+    )
 
-    ADMIN_CHECK_SQL = "SELECT admin_id FROM admins WHERE admin_line_id = %s;"
-    admin_result = execute_sql(ADMIN_CHECK_SQL, params=(line_user_id,), fetch=True)
+    admin_result = execute_prepared(
+        "admin_check", params=(line_user_id,), sticky_key=line_user_id
+    )
     is_admin = bool(admin_result)
 
     # DBエラーチェック
     if "error" in user_result or "error" in admin_result:
         response_text = (
-            f"🚨 データベースエラーが発生しました。時間を置いてお試しください。"
+            "🚨 データベースエラーが発生しました。時間を置いてお試しください。"
         )
 
     # ----------------------------------------------------
     # 2. 応答決定ロジック（ディスパッチ方式）
     # ----------------------------------------------------
-
-    # ⭐ 1. 管理者（ユーザー登録済み）
-    if is_user and is_admin:
-        handler = ADMIN_DISPATCH.get(user_text)
-
-        if handler:
-            response_text = handler(event, line_user_id)
-        else:
-            # 管理者は一般ユーザー機能も使える→この書き方が違う。
-            #ユーザーでもあり管理者でもある者が送った言葉が管理者用でなければユーザー機能や登録フローに移る。
-            handler = USER_DISPATCH.get(user_text)
-            if handler:
-                response_text = handler(event, line_user_id)
-            else:
-                response_text = user_default(event, line_user_id)
-
-    # ⭐ 2. 一般ユーザー（ユーザー登録済み）
-    elif is_user:
-        handler = USER_DISPATCH.get(user_text)
-        if handler:
-            response_text = handler(event, line_user_id)
-        else:
-            response_text = user_default(event, line_user_id)
+    handler = select_dispatch_handler(is_user, is_admin, user_text)
+    if handler:
+        response_text = handler(event, line_user_id)
 
     # 2.2B. 未登録ユーザーの処理 (is_userがFalseのすべて)
     else:
@@ -196,146 +700,98 @@ def handle_message(event):
         except Exception:
             user_line_name = "お客様"
 
-        # 状態の取得 (登録継続中かチェック)
-        STATE_SELECT_SQL = """
-        SELECT 
-            temp_user_grade, temp_user_class, temp_user_last_name, 
-            temp_user_first_name, temp_user_line_name
-        FROM registration_states WHERE user_line_id = %s;
-        """
-        state_result = execute_sql(STATE_SELECT_SQL, params=(line_user_id,), fetch=True)
-        state_data = (
-            state_result[0] if state_result and "error" not in state_result else None
-        )
-
-        # ----------------------------------------------
-        # A. 状態レコードが存在する場合（登録継続）
-        # ----------------------------------------------
-        if state_data:
-
-            temp_data = {
-                "grade": state_data.get("temp_user_grade"),
-                "class": state_data.get("temp_user_class"),
-                "last_name": state_data.get("temp_user_last_name"),
-                "first_name": state_data.get("temp_user_first_name"),
-            }
-            # 'grade'がNoneでないかを見て、データが揃っているか否かを判定（簡略化）
-            is_data_filled = temp_data["grade"] is not None
-
-            # --- A-i. 最終確認待ち (データがすべて揃っている場合) ---
-            if is_data_filled:
-
-                if user_text.lower() in ["はい", "yes"]:
-                    # 最終登録処理 (INSERT users, DELETE state)
-                    INSERT_USERS_SQL = """
-                    INSERT INTO users (user_line_id, user_grade, user_class, user_last_name, user_first_name, user_line_name)
-                    VALUES (%s, %s, %s, %s, %s, %s);
-                    """
-                    final_reg_result = execute_sql(
-                        INSERT_USERS_SQL,
-                        (
-                            line_user_id,
-                            temp_data["grade"],
-                            temp_data["class"],
-                            temp_data["last_name"],
-                            temp_data["first_name"],
-                            user_line_name,
-                        ),
-                    )
-
-                    if "success" in final_reg_result:
-                        execute_sql(DELETE_SQL, (line_user_id,))
-                        response_text = (
-                            f"{user_line_name} さん、ユーザー登録が完了しました！🎉"
-                        )
-                    else:
-                        execute_sql(DELETE_SQL, (line_user_id,))
-                        response_text = f"🚨 最終登録処理中にデータベースエラーが発生しました。登録を中断しました。再度**「登録」**と送ってください。"
-
-                else:
-                    # 「いいえ」またはその他のメッセージ -> 状態を破棄してリセット
-                    execute_sql(DELETE_SQL, (line_user_id,))
-                    response_text = (
-                        "登録を中断しました。再度**「登録」**と送ってください。"
-                    )
-
-            # --- A-ii. データ入力待ち (まだデータが未入力/不足している場合) ---
-            else:
-                # parse_and_validate_registration_data は外部関数として定義済みと仮定
-                validation_result = parse_and_validate_registration_data(user_text)
-
-                if validation_result.get("success"):
-                    # 検証成功 -> 個別カラムに保存し、確認メッセージを返す
-                    new_temp_data = validation_result.get("data")
-
-                    UPDATE_SQL = """
-                    UPDATE registration_states 
-                    SET temp_user_grade = %s, temp_user_class = %s, 
-                        temp_user_last_name = %s, temp_user_first_name = %s,
-                        temp_user_line_name = %s
-                    WHERE user_line_id = %s;
-                    """
-                    execute_sql(
-                        UPDATE_SQL,
-                        (
-                            new_temp_data["grade"],
-                            new_temp_data["class"],
-                            new_temp_data["last_name"],
-                            new_temp_data["first_name"],
-                            user_line_name,
-                            line_user_id,
-                        ),
-                    )
-
-                    d = new_temp_data
-                    response_text = f"以下の内容で登録しますか？\n"
-                    response_text += (
-                        f"学年：**{d['grade']}**、クラス：**{d['class']}**\n"
-                    )
-                    response_text += f"氏名：**{d['last_name']} {d['first_name']}**\n"
-                    response_text += "\nよろしければ**「はい」**、やめる場合は「いいえ」と送ってください。"
-
-                else:
-                    # 検証失敗 -> 状態を破棄してリセット
-                    execute_sql(DELETE_SQL, (line_user_id,))
-                    error_message = validation_result.get("error", "入力が不正です。")
-                    response_text = f"⚠️ 入力エラー：{error_message}\n\n登録を中断しました。再度**「登録」**と送ってください。"
-
-        # ----------------------------------------------
-        # B. 状態レコードがない場合（登録トリガー or 誘導）
-        # ----------------------------------------------
-        else:
-            if user_text == "登録":
-                # INSERT_SQL のロジック
-                INSERT_SQL = """
-                INSERT INTO registration_states (user_line_id) 
-                VALUES (%s);
-                """
-                start_result = execute_sql(INSERT_SQL, (line_user_id,))
-
-                if "success" in start_result:
-                    response_text = "登録を開始します。\n\n**学年（1〜3）・クラス・姓・名**をスペース区切りで一度に返信してください。\n例: 2 1 山田 太郎"
-                else:
-                    response_text = "🚨 登録開始中にデータベースエラーが発生しました。再度「登録」と送ってください。"
-            else:
-                # 登録誘導メッセージ (管理者キーワードであってもここに来る)
-                response_text = f"{user_line_name} さん、ユーザー情報が未登録です。\n登録をご希望の場合は、**「登録」**と送ってください。"
+        response_text = run_registration_flow(line_user_id, user_text, user_line_name)
 
     # ----------------------------------------------------
     # 3. LINEに応答を返す (最終処理)
     # ----------------------------------------------------
     if response_text:
-        print("DEBUG:", type(response_text))
+        logger.debug("reply type: %s", type(response_text).__name__)
         try:
-            if isinstance(response_text, TemplateSendMessage):
-                line_bot_api.reply_message(event.reply_token, response_text)
-            else:
-                line_bot_api.reply_message(
-                    event.reply_token, TextSendMessage(text=str(response_text))
-                )
+            line_bot_api.reply_message(
+                event.reply_token, build_reply_message(response_text)
+            )
         except Exception as e:
-            print("REPLY ERROR:", e)
+            logger.exception("REPLY ERROR: %s", e)
             raise e
 
 
     return "OK"
+
+
+# =========================================================
+# 6. 非同期版のメッセージ処理（WEBHOOK_ASYNC=1 のとき /webhook から使う）
+#   ディスパッチ辞書・応答文・戻り値は handle_message と同じ。
+#   DB は execute_prepared_async、LINE は AsyncLineBotApi で待ち、
+#   同期のディスパッチ処理はスレッドで実行する。
+# =========================================================
+async def _call_dispatch_handler(handler, event, line_user_id):
+    if inspect.iscoroutinefunction(handler):
+        return await handler(event, line_user_id)
+    return await asyncio.to_thread(handler, event, line_user_id)
+
+
+async def handle_message_async(event):
+    with log_event(logger, event_id=event.webhook_event_id, event_type=event.type):
+        return await _handle_message_async(event)
+
+
+async def _handle_message_async(event):
+    line_bot_api = await get_async_line_bot_api()
+    line_user_id = event.source.user_id
+    user_text = event.message.text
+    response_text = None
+
+    # 1. ID 検索とステータス取得（2つの問い合わせを同時に待つ）
+    user_result, admin_result = await asyncio.gather(
+        execute_prepared_async("user_check", (line_user_id,)),
+        execute_prepared_async("admin_check", (line_user_id,)),
+    )
+    is_user = bool(user_result)
+    is_admin = bool(admin_result)
+    current_user_id.set(
+        user_result[0]["user_id"] if is_user and "error" not in user_result else None
+    )
+
+    if "error" in user_result or "error" in admin_result:
+        response_text = (
+            "🚨 データベースエラーが発生しました。時間を置いてお試しください。"
+        )
+
+    # 2. 応答決定ロジック（ディスパッチ方式）
+    handler = select_dispatch_handler(is_user, is_admin, user_text)
+    if handler:
+        response_text = await _call_dispatch_handler(handler, event, line_user_id)
+
+    # 2.2B. 未登録ユーザーの処理
+    else:
+        try:
+            profile = await line_bot_api.get_profile(line_user_id)
+            user_line_name = profile.display_name
+        except Exception:
+            user_line_name = "お客様"
+
+        response_text = await run_registration_flow_async(
+            line_user_id, user_text, user_line_name
+        )
+
+    # 3. LINEに応答を返す
+    if response_text:
+        try:
+            await line_bot_api.reply_message(
+                event.reply_token, build_reply_message(response_text)
+            )
+        except Exception as e:
+            logger.exception("REPLY ERROR: %s", e)
+            raise e
+
+    return "OK"
+
+
+# =========================================================
+# 起動方法
+#   gunicorn 'app:create_app()'（--preload 可。import 時にはアプリを作らない）
+#   ローカル: python app.py
+# =========================================================
+if __name__ == "__main__":
+    create_app().run(port=int(os.environ.get("PORT", "5000")))
@@ -0,0 +1 @@
+# __init__.py を作成（Pythonパッケージとして認識させる）
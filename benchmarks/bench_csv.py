@@ -0,0 +1,73 @@
+# 移行スクリプト（replicate.py / replicate_user.py）の CSV 読み込み・整形のベンチマーク
+#   python -m benchmarks.bench_csv [行数]
+# 一時ディレクトリに CSV を生成し、各スクリプトの migrate_data() を実行する。
+import csv
+import logging
+import os
+import sys
+import tempfile
+
+import replicate
+import replicate_user
+from benchmarks.runner import time_per_call
+
+ORDER_HEADERS = ["ユーザーID", "注文対象日", "商品名", "受信日時"]
+USER_HEADERS = ["ユーザーID", "学年", "クラス", "姓", "名", "ユーザー名", "登録日時", "更新日", "通知停止日", "削除日"]
+
+# 生成した CSV の置き場所（プロセスの終了時に消える）
+_work_dir = tempfile.TemporaryDirectory(prefix="bench_csv_")
+
+
+def _write_csv(path, headers, rows):
+    with open(path, mode="w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def _order_rows(count):
+    # ハイフン区切りとスラッシュ区切りを半分ずつ混ぜる
+    for i in range(count):
+        sep = "-" if i % 2 else "/"
+        day = i % 28 + 1
+        yield [
+            f"U{i:032x}",
+            f"2024{sep}05{sep}{day:02d}",
+            "幕の内弁当",
+            f"2024{sep}05{sep}{day:02d} 09:{i % 60:02d}:00",
+        ]
+
+
+def _user_rows(count):
+    for i in range(count):
+        sep = "-" if i % 2 else "/"
+        registered = f"2024{sep}04{sep}{i % 28 + 1:02d} 12:00:00"
+        yield [
+            f"U{i:032x}", str(i % 3 + 1), str(i % 8 + 1), "山田", "太郎", "やまだ",
+            registered, registered if i % 3 == 0 else "", "", "",
+        ]
+
+
+def benchmarks(rows=2000):
+    # 1行ごとの DEBUG ログや開始・終了の INFO ログは測定対象にしない
+    replicate.logger.setLevel(logging.WARNING)
+    replicate_user.logger.setLevel(logging.WARNING)
+
+    orders_csv = os.path.join(_work_dir.name, "orders.csv")
+    users_csv = os.path.join(_work_dir.name, "users.csv")
+    _write_csv(orders_csv, ORDER_HEADERS, _order_rows(rows))
+    _write_csv(users_csv, USER_HEADERS, _user_rows(rows))
+    replicate.CSV_FILE = orders_csv
+    replicate_user.CSV_FILE = users_csv
+
+    # 1回の migrate_data() で rows 行を処理する
+    return [
+        (f"csv.replicate_orders_{rows}", replicate.migrate_data, 20),
+        (f"csv.replicate_users_{rows}", replicate_user.migrate_data, 20),
+    ]
+
+
+if __name__ == "__main__":
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for name, func, iterations in benchmarks(row_count):
+        print(f"{name}: {time_per_call(func, iterations) / 1000:.1f} ms/call")
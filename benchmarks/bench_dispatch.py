@@ -0,0 +1,62 @@
+# handle_message（ディスパッチ経路）のベンチマーク
+#   python -m benchmarks.bench_dispatch [回数]
+# DB と LINE クライアントは benchmarks.fakes の偽物に差し替える（接続しない）。
+import sys
+import tempfile
+
+import app
+import utils.catalog
+import utils.data_versions
+import utils.menu
+from benchmarks.fakes import FakeDb, FakeLineBotApi, make_event
+from utils.config import get_config
+from benchmarks.runner import time_per_call
+
+REGISTERED = "U" + "1" * 32
+ADMIN = "U" + "2" * 32
+UNREGISTERED = "U" + "3" * 32
+IN_REGISTRATION = "U" + "4" * 32
+
+_menu_cache_dir = tempfile.TemporaryDirectory(prefix="bench-menu-")
+
+
+def _install_fakes():
+    """
+    app モジュールと、ディスパッチ先が使う utils.catalog / utils.data_versions / utils.menu の
+    DB・LINE 呼び出しを偽物に差し替える（どれか1つでも本物のままだと実際に接続してしまう）。
+    """
+    db = FakeDb(
+        users={REGISTERED, ADMIN},
+        admins={ADMIN},
+        states={IN_REGISTRATION: {"temp_user_grade": None}},
+    )
+    line_bot_api = FakeLineBotApi()
+    app.execute_prepared = db.execute_prepared
+    app.get_line_bot_api = lambda: line_bot_api
+    utils.catalog.execute_sql = db.execute_sql
+    utils.data_versions.execute_prepared = db.execute_prepared
+    utils.menu.post_json = line_bot_api.post_json
+    # メニューのディスクキャッシュは一時ディレクトリに置く（終了時に消える）
+    get_config()["MENU_CACHE_DIR"] = _menu_cache_dir.name
+    return db, line_bot_api
+
+
+def benchmarks():
+    _install_fakes()
+    cases = [
+        ("dispatch.user_keyword", make_event("注文", REGISTERED)),
+        ("dispatch.user_default", make_event("こんにちは", REGISTERED)),
+        ("dispatch.admin_fallthrough", make_event("注文", ADMIN)),
+        ("dispatch.unregistered", make_event("こんにちは", UNREGISTERED)),
+        ("dispatch.registration_input", make_event("2 1 山田 太郎", IN_REGISTRATION)),
+    ]
+    return [
+        (name, (lambda event=event: app.handle_message(event)), 5000)
+        for name, event in cases
+    ]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for name, func, _ in benchmarks():
+        print(f"{name}: {time_per_call(func, count):.1f} us/call")
@@ -0,0 +1,59 @@
+# execute_sql のオーバーヘッド（psycopg2 を直接使う場合との差）のベンチマーク
+#   python -m benchmarks.bench_execute_sql [回数]
+# DATABASE_URL のDB（ローカルの PostgreSQL を想定）に SELECT 1 を送る（書き込みはしない）。
+import sys
+
+from benchmarks.runner import time_per_call
+from utils.db_utils import execute_sql, execute_sql_stream, get_connection
+
+REQUIRES_DB = True
+
+BENCH_SQL = "SELECT 1"
+
+# 行の形式ごとの読み出しコストを比べるための数千行の結果（PostgreSQL・SQLite どちらでも動く）
+STREAM_ROWS = 5000
+STREAM_SQL = f"""
+    WITH RECURSIVE s(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM s WHERE n < {STREAM_ROWS})
+    SELECT n, n * 2 AS doubled, 'row' AS label FROM s
+"""
+
+
+def _raw_select():
+    # プールから借りた接続で直接実行（execute_sql のエラー処理・振り分けを通らない）
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(BENCH_SQL)
+            cursor.fetchall()
+
+
+def _execute_sql_select():
+    result = execute_sql(BENCH_SQL, fetch=True)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+
+def _stream(row_type):
+    def run():
+        for rows in execute_sql_stream(STREAM_SQL, row_type=row_type):
+            for row in rows:
+                row[0]
+    return run
+
+
+def benchmarks():
+    return [
+        ("db.raw_cursor_select", _raw_select, 2000),
+        ("db.execute_sql_select", _execute_sql_select, 2000),
+        ("db.stream_5000_dict", _stream("dict"), 20),
+        ("db.stream_5000_tuple", _stream("tuple"), 20),
+        ("db.stream_5000_compact", _stream("compact"), 20),
+    ]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    results = {name: time_per_call(func, count) for name, func, _ in benchmarks()}
+    for name, us in results.items():
+        print(f"{name}: {us:.1f} us/query")
+    overhead = results["db.execute_sql_select"] - results["db.raw_cursor_select"]
+    print(f"execute_sql overhead: {overhead:.1f} us/query")
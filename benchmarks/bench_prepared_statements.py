@@ -0,0 +1,58 @@
+# プリペアドステートメントと通常の execute_sql の比較ベンチマーク
+#   python -m benchmarks.bench_prepared_statements [回数]
+# DATABASE_URL のDBに対して users テーブルの検索を繰り返す（書き込みはしない）。
+import sys
+import time
+
+from utils.db_utils import execute_sql, execute_prepared, register_statement
+
+REQUIRES_DB = True
+
+BENCH_SQL = "SELECT user_id FROM users WHERE user_line_id = %s;"
+register_statement("bench_user_check", BENCH_SQL)
+
+
+def _time_calls(func, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        result = func(f"U{i:032x}")
+        if "error" in result:
+            raise RuntimeError(result["error"])
+    return time.perf_counter() - started
+
+
+def run(iterations=2000):
+    """両方の経路を同じ回数実行し、1回あたりの平均時間（マイクロ秒）を返す。"""
+    # プールの接続作成と PREPARE をウォームアップで済ませておく
+    execute_sql(BENCH_SQL, ("U0",), fetch=True)
+    execute_prepared("bench_user_check", ("U0",))
+
+    plain = _time_calls(lambda key: execute_sql(BENCH_SQL, (key,), fetch=True), iterations)
+    prepared = _time_calls(lambda key: execute_prepared("bench_user_check", (key,)), iterations)
+    return {
+        "execute_sql_us": plain / iterations * 1e6,
+        "execute_prepared_us": prepared / iterations * 1e6,
+        "speedup": plain / prepared if prepared else 0.0,
+    }
+
+
+def benchmarks():
+    """benchmarks.runner から使う（1回の呼び出しが1クエリ）。"""
+    def plain():
+        _time_calls(lambda key: execute_sql(BENCH_SQL, (key,), fetch=True), 1)
+
+    def prepared():
+        _time_calls(lambda key: execute_prepared("bench_user_check", (key,)), 1)
+
+    return [
+        ("db.user_check_execute_sql", plain, 2000),
+        ("db.user_check_execute_prepared", prepared, 2000),
+    ]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    results = run(count)
+    print(f"execute_sql      : {results['execute_sql_us']:.1f} us/query")
+    print(f"execute_prepared : {results['execute_prepared_us']:.1f} us/query")
+    print(f"speedup          : x{results['speedup']:.2f}")
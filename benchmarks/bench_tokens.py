@@ -0,0 +1,26 @@
+# create_token / verify_token のベンチマーク
+#   python -m benchmarks.bench_tokens [回数]
+# DB は benchmarks.fakes.FakeDb に差し替え、トークン生成・検証の Python 側の処理だけを測る。
+import sys
+
+from benchmarks.fakes import FakeDb
+from benchmarks.runner import time_per_call
+from utils import token_utils
+
+
+def benchmarks():
+    db = FakeDb()
+    token_utils.execute_sql = db.execute_sql
+    token = token_utils.create_token(admin_id=1)
+
+    return [
+        ("tokens.create", lambda: token_utils.create_token(admin_id=1), 5000),
+        ("tokens.verify", lambda: token_utils.verify_token(token), 5000),
+        ("tokens.verify_unknown", lambda: token_utils.verify_token("0" * 64), 5000),
+    ]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for name, func, _ in benchmarks():
+        print(f"{name}: {time_per_call(func, count):.1f} us/call")
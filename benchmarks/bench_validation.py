@@ -0,0 +1,31 @@
+# 登録データ検証（parse_and_validate_registration_data）のベンチマーク
+#   python -m benchmarks.bench_validation [回数]
+import sys
+
+from benchmarks.runner import time_per_call
+from utils.validation import parse_and_validate_registration_data
+
+# 成功・失敗（要素数・学年・姓名）を一通り含む入力
+INPUTS = [
+    "2 1 山田 太郎",
+    "３　２　佐藤　花子",
+    "1 10 Smith John",
+    "2 1 山田",
+    "4 1 山田 太郎",
+    "2 A 山田 太郎",
+    "2 1 山田1 太郎",
+]
+
+
+def benchmarks():
+    def validate_all():
+        for text in INPUTS:
+            parse_and_validate_registration_data(text)
+
+    return [("validation.parse_registration", validate_all, 5000)]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for name, func, _ in benchmarks():
+        print(f"{name}: {time_per_call(func, count):.1f} us/call")
@@ -0,0 +1,86 @@
+# ベンチマーク用の偽物（DB・LINE クライアント・イベント）
+#   DB や LINE に接続せず、アプリ側の Python の処理時間だけを測るために使う。
+from types import SimpleNamespace
+
+
+def make_event(text, user_id="U" + "0" * 32):
+    """handle_message に渡す MessageEvent の代わり（使う属性だけを持つ）。"""
+    return SimpleNamespace(
+        reply_token="0" * 32,
+        source=SimpleNamespace(user_id=user_id),
+        message=SimpleNamespace(text=text),
+        timestamp=0,
+        delivery_context=None,
+    )
+
+
+# 毎日販売の商品。utils.catalog.PRODUCTS_SQL の列と同じ
+DEFAULT_PRODUCTS = (
+    {"product_id": 1, "product_name": "日替わり弁当", "price": 500, "schedule_type": "DAILY", "schedule_day": None},
+    {"product_id": 2, "product_name": "幕の内弁当", "price": 600, "schedule_type": "DAILY", "schedule_day": None},
+)
+
+
+class FakeLineBotApi:
+    """reply_message / post_json（utils.menu.reply_raw）/ get_profile を受け取るだけの LINE クライアント。"""
+
+    def __init__(self):
+        self.replies = 0
+
+    def reply_message(self, reply_token, messages):
+        self.replies += 1
+
+    def post_json(self, path, body):
+        self.replies += 1
+
+    def get_profile(self, user_id):
+        return SimpleNamespace(display_name="ベンチ 太郎")
+
+
+class FakeDb:
+    """
+    execute_sql / execute_prepared と同じ戻り値を返すメモリ上の DB。
+    users / admins / registration_states の有無と、商品マスタ（utils.catalog 用）だけを管理する。
+    """
+
+    def __init__(self, users=(), admins=(), states=None, products=None):
+        self.users = set(users)
+        self.admins = set(admins)
+        self.states = dict(states or {})
+        self.tokens = {}
+        self.products = list(products if products is not None else DEFAULT_PRODUCTS)
+
+    def execute_prepared(self, name, params=None, fetch=True, sticky_key=None):
+        if name == "data_versions_all":
+            return [{"name": "products", "version": 1}, {"name": "holidays", "version": 1}]
+        key = params[0] if params else None
+        if name == "user_check":
+            return [{"user_id": 1}] if key in self.users else []
+        if name == "admin_check":
+            return [{"admin_id": 1}] if key in self.admins else []
+        if name == "registration_state_select":
+            state = self.states.get(key)
+            return [state] if state is not None else []
+        return [] if fetch else {"success": True}
+
+    def execute_sql(self, sql_query, params=None, fetch=False, sticky_key=None):
+        sql = sql_query.lstrip().upper()
+        if sql.startswith("INSERT INTO AUTH_TOKENS"):
+            self.tokens[params[0]] = {
+                "token": params[0],
+                "admin_id": params[1],
+                "user_id": params[2],
+                "created_at": None,
+                "expires_at": params[3],
+            }
+            return {"success": True}
+        if sql.startswith("SELECT") and "FROM AUTH_TOKENS" in sql:
+            row = self.tokens.get(params[0])
+            return [row] if row else []
+        if sql.startswith("SELECT") and "FROM PRODUCTS" in sql:
+            return list(self.products)
+        if sql.startswith("SELECT") and "FROM HOLIDAYS" in sql:
+            return []
+        if fetch:
+            return []
+        return {"success": True}
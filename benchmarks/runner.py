@@ -0,0 +1,174 @@
+# ベンチマークの一括実行とベースラインとの比較
+#   python -m benchmarks.runner --save-baseline 結果をベースラインとして保存
+#   python -m benchmarks.runner                 全ベンチマークを実行し、ベースラインと比較
+#   python -m benchmarks.runner --threshold 0.8 80% を超えて遅くなったら失敗
+#
+# 各 bench_*.py は benchmarks() で (名前, 関数, 1回の計測での呼び出し回数) のリストを返す。
+# REQUIRES_DB = True のモジュールは DATABASE_URL が無ければスキップする。
+#
+# ベースラインは計測したマシンに依存するため、リポジトリには置かない（baseline.json は .gitignore）。
+# 比較は同じジョブの中で行う。例（CI）:
+#   git checkout <比較元> && python -m benchmarks.runner --save-baseline
+#   git checkout <変更>   && python -m benchmarks.runner
+# 1つの結果は --runs 回の全体計測の中央値（各回は --repeat 回の最速）。それでも数十%の揺れはあるので、
+# 閾値は小さな差ではなく「明らかに遅くなった」を拾う大きさにしておく。
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BENCHMARK_MODULES = [
+    "benchmarks.bench_validation",
+    "benchmarks.bench_dispatch",
+    "benchmarks.bench_tokens",
+    "benchmarks.bench_csv",
+    "benchmarks.bench_execute_sql",
+    "benchmarks.bench_prepared_statements",
+]
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 何割遅くなったら失敗にするか（0.5 = ベースラインの 1.5 倍を超えたら失敗）
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.5"))
+
+# 全体計測の回数（中央値を採用）
+DEFAULT_RUNS = int(os.getenv("BENCH_RUNS", "3"))
+
+
+def time_per_call(func, iterations, repeat=5):
+    """func を iterations 回呼ぶ計測を repeat 回行い、最も速かった回の1回あたりの時間（マイクロ秒）を返す。"""
+    func()  # ウォームアップ（import・接続作成・PREPARE など）
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / iterations * 1e6
+
+
+def run_benchmarks(name_filter=None, repeat=5):
+    """全モジュールのベンチマークを実行し、{名前: マイクロ秒/回} を返す。"""
+    results = {}
+    for module_name in BENCHMARK_MODULES:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"SKIP {module_name}: {e}", file=sys.stderr)
+            continue
+        if getattr(module, "REQUIRES_DB", False) and not os.getenv("DATABASE_URL"):
+            print(f"SKIP {module_name}: DATABASE_URL が設定されていません。", file=sys.stderr)
+            continue
+
+        for name, func, iterations in module.benchmarks():
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = time_per_call(func, iterations, repeat)
+            print(f"{name}: {results[name]:.1f} us/call", file=sys.stderr)
+    return results
+
+
+def run_benchmarks_median(name_filter=None, repeat=5, runs=DEFAULT_RUNS):
+    """run_benchmarks を runs 回行い、ベンチマークごとの中央値を返す。"""
+    all_runs = []
+    for run in range(runs):
+        print(f"--- {run + 1}/{runs} 回目", file=sys.stderr)
+        all_runs.append(run_benchmarks(name_filter, repeat))
+    return {
+        name: statistics.median(r[name] for r in all_runs if name in r)
+        for name in all_runs[0]
+    }
+
+
+def database_backend():
+    """db.* の計測先（"postgres" / "sqlite"）。DATABASE_URL が無ければ None。"""
+    if not os.getenv("DATABASE_URL"):
+        return None
+    from utils.db_utils import backend_name
+
+    return backend_name(os.getenv("DATABASE_URL"))
+
+
+# ---------------------------------------
+# ベースライン（JSON）
+# ---------------------------------------
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "database": database_backend(),
+        "results": {name: {"us_per_call": round(us, 3)} for name, us in sorted(results.items())},
+    }
+    with open(path, mode="w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """ベースラインより threshold を超えて遅くなったものを (名前, 基準, 今回, 倍率) のリストで返す。"""
+    regressions = []
+    # PostgreSQL と SQLite の計測どうしは比べない
+    same_database = baseline.get("database") == database_backend()
+    for name, us in sorted(results.items()):
+        if name.startswith("db.") and not same_database:
+            print(f"SKIP {name}: ベースラインと DB が違います（{baseline.get('database')}）")
+            continue
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"NEW  {name}: {us:.1f} us（ベースラインなし）")
+            continue
+        ratio = us / base["us_per_call"] if base["us_per_call"] else 0.0
+        mark = "FAIL" if ratio > 1 + threshold else "ok  "
+        print(f"{mark} {name}: {base['us_per_call']:.1f} -> {us:.1f} us (x{ratio:.2f})")
+        if ratio > 1 + threshold:
+            regressions.append((name, base["us_per_call"], us, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマークを実行し、ベースラインと比較します。")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="ベースラインの JSON ファイル")
+    parser.add_argument("--save-baseline", action="store_true", help="結果をベースラインとして保存する")
+    parser.add_argument("--output", help="今回の結果を書き出す JSON ファイル")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="許容する遅延の割合（既定 0.5）")
+    parser.add_argument("--filter", help="名前にこの文字列を含むベンチマークだけを実行する")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数（最速の回を採用）")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="全体計測の回数（中央値を採用、既定 3）")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks_median(args.filter, args.repeat, args.runs)
+    if args.output:
+        save_results(results, args.output)
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f"ベースラインを保存しました: {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"ベースラインがありません（{args.baseline}）。比較元で --save-baseline を実行してください。")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} 件のベンチマークが {args.threshold:.0%} を超えて遅くなりました。")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
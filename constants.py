@@ -31,6 +31,18 @@ ADMIN_KEYWORD_TODAY_USER_REPORT = '今日'
 # 休日設定
 ADMIN_KEYWORD_HOLIDAYS = '休み'
 
+# 厨房用の注文表（CSV）ダウンロード
+ADMIN_KEYWORD_ORDER_SHEET = '注文表'
+
+# 月次請求の一覧（請求スナップショットを読む。「請求 2024-05」で月を指定）
+ADMIN_KEYWORD_INVOICES = '請求'
+
+# 当日分の注文の締切（日本時間の時。これ以降は翌営業日以降のみ注文できる）
+ORDER_DEADLINE_HOUR = 9
+
+# 何日先まで注文できるか
+ORDER_MAX_DAYS_AHEAD = 14
+
 # 現行の標準消費税率 (10%を小数で表現)
 TAX_RATE = 0.00
 
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import re
+import sys
+from typing import List, Tuple
+
+from utils.db_utils import execute_sql, execute_sql_stream, to_numbered_placeholders, transaction
+
+# ログ設定: 標準エラーに出力。INFOレベル以上を表示。
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------------
+# 必要な定数
+# ----------------------------------------------------------------------
+# マイグレーションファイルの置き場所（NNNN_説明.sql）
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{4})_(.+)\.sql$")
+
+# 同時に複数プロセスがマイグレーションしないためのアドバイザリロックのキー
+MIGRATION_LOCK_KEY = 20240401
+
+# EXPLAIN チェックで「大きいテーブル」とみなす行数（pg_class.reltuples）
+LARGE_TABLE_ROWS = int(os.getenv("EXPLAIN_LARGE_TABLE_ROWS", "10000"))
+
+PG_CLASS_ROWS_SQL = "SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')"
+
+SCHEMA_VERSION_SQL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# ----------------------------------------------------------------------
+# マイグレーションファイルの一覧
+# ----------------------------------------------------------------------
+def list_migrations() -> List[Tuple[int, str, str]]:
+    """(バージョン, 名前, ファイルパス) をバージョン順に返す。"""
+    migrations = []
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_PATTERN.match(file_name)
+        if match:
+            migrations.append(
+                (int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, file_name))
+            )
+    return migrations
+
+
+def applied_versions():
+    """適用済みのバージョン番号の集合を返す。DBエラー時は None。"""
+    result = execute_sql(SCHEMA_VERSION_SQL)
+    if "error" in result:
+        return None
+    rows = execute_sql("SELECT version FROM schema_version", fetch=True)
+    if "error" in rows:
+        return None
+    return {row["version"] for row in rows}
+
+
+# ----------------------------------------------------------------------
+# 未適用のマイグレーションを順に適用
+# ----------------------------------------------------------------------
+def migrate(target=None):
+    """未適用のマイグレーションを1ファイル1トランザクションで適用する。"""
+    applied = applied_versions()
+    if applied is None:
+        logger.error("FATAL: schema_version を読み込めませんでした。DATABASE_URL を確認してください。")
+        return False
+
+    for version, name, path in list_migrations():
+        if version in applied or (target is not None and version > target):
+            continue
+
+        with open(path, mode='r', encoding='utf-8') as f:
+            migration_sql = f.read()
+
+        logger.info(f"適用中: {version:04d}_{name}")
+        try:
+            with transaction() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                # ロック待ちの間に別プロセスが適用していたらスキップ
+                cursor.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+                if cursor.fetchone():
+                    continue
+                cursor.execute(migration_sql)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+        except Exception as e:
+            logger.error(f"FATAL: {version:04d}_{name} の適用に失敗しました（ロールバック済み）: {e}")
+            return False
+
+    logger.info("マイグレーション完了。")
+    return True
+
+
+def status():
+    """各マイグレーションの適用状況を表示する。"""
+    applied = applied_versions()
+    if applied is None:
+        logger.error("FATAL: schema_version を読み込めませんでした。")
+        return False
+    for version, name, _ in list_migrations():
+        mark = "applied" if version in applied else "pending"
+        print(f"{version:04d}_{name}: {mark}")
+    return True
+
+
+# ----------------------------------------------------------------------
+# EXPLAIN チェック（大きいテーブルのシーケンシャルスキャンを検出）
+# ----------------------------------------------------------------------
+def _seq_scans(plan):
+    """実行計画ツリーから Seq Scan しているテーブル名を集める。"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def explain_queries():
+    """
+    EXPLAIN チェックの対象 (名前, SQL) のリスト。SQL は書き写さず、アプリの定義から集める。
+    - register_statement() で登録されたステートメント（db_utils.STATEMENTS）すべて
+    - 登録していないがよく実行するクエリの SQL 定数
+    """
+    # アプリのモジュールを読み込むと、各モジュールの register_statement() で STATEMENTS が埋まる
+    import app  # noqa: F401
+    from utils.catalog import HOLIDAYS_SQL, PRODUCTS_SQL
+    from utils.db_utils import STATEMENTS
+    from utils.order_cache import CANCEL_ORDER_SQL
+    from utils.orders import USER_IDS_SQL
+
+    queries = [(name, statement["sql"]) for name, statement in sorted(STATEMENTS.items())]
+    queries += [
+        ("catalog_products", PRODUCTS_SQL),
+        ("catalog_holidays", HOLIDAYS_SQL),
+        ("cancel_order", CANCEL_ORDER_SQL),
+        # IN (...) は件数分のプレースホルダになるため、1件分で見る
+        ("order_user_ids", USER_IDS_SQL.format(placeholders="%s")),
+    ]
+    return queries
+
+
+def _explain(name, sql):
+    """
+    パラメータの値に左右されない実行計画（generic plan）を JSON で返す。
+    PREPARE したものを plan_cache_mode = force_generic_plan で EXPLAIN EXECUTE する（引数は NULL）。
+    """
+    prepared_sql, param_count = to_numbered_placeholders(sql.strip().rstrip(";"))
+    statement = f"explain_{name}"
+    args = f" ({', '.join(['NULL'] * param_count)})" if param_count else ""
+    with transaction() as cursor:
+        cursor.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+        cursor.execute(f"PREPARE {statement} AS {prepared_sql}")
+        # PREPARE はロールバックしても残るため、EXPLAIN が失敗しても必ず DEALLOCATE する
+        try:
+            cursor.execute("SAVEPOINT explain")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) EXECUTE {statement}{args}")
+            plan = cursor.fetchone()[0]
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain")
+            raise
+        finally:
+            cursor.execute(f"DEALLOCATE {statement}")
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def explain_check(queries=None):
+    """
+    各クエリを EXPLAIN し、LARGE_TABLE_ROWS 行以上のテーブルを
+    Seq Scan しているものを警告する。問題がなければ True。
+    """
+    # pg_class は行数が多いので、タプルのまま少しずつ読んで辞書にする
+    table_rows = {}
+    for rows in execute_sql_stream(PG_CLASS_ROWS_SQL, row_type="tuple", error_dict=True):
+        if "error" in rows:
+            logger.error("FATAL: pg_class を読み込めませんでした。")
+            return False
+        table_rows.update(rows)
+
+    ok = True
+    for name, sql in queries or explain_queries():
+        try:
+            plan = _explain(name, sql)
+        except Exception as e:
+            logger.error(f"EXPLAIN 失敗: {name}: {e}")
+            ok = False
+            continue
+
+        for table in _seq_scans(plan[0]["Plan"]):
+            if table_rows.get(table, 0) >= LARGE_TABLE_ROWS:
+                logger.warning(f"SEQ SCAN: {name} が {table}（約{int(table_rows[table])}行）を全件走査しています。")
+                ok = False
+
+    if ok:
+        logger.info("EXPLAIN チェック: 大きいテーブルのシーケンシャルスキャンはありません。")
+    return ok
+
+
+# ----------------------------------------------------------------------
+# スクリプトとして直接実行された場合の処理
+#   python migrate.py [up|status|explain]
+# ----------------------------------------------------------------------
+COMMANDS = {
+    "up": migrate,
+    "status": status,
+    "explain": explain_check,
+}
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if command not in COMMANDS:
+        print(f"usage: python migrate.py [{'|'.join(COMMANDS)}]", file=sys.stderr)
+        sys.exit(2)
+    sys.exit(0 if COMMANDS[command]() else 1)
@@ -0,0 +1,20 @@
+-- よく使う（使う予定の）検索条件向けのインデックス
+-- ※ 既存の本番DBは `sql` のDDLで作成済みの前提。新規環境も `sql` を流してから migrate.py を実行する。
+
+-- 日別レポート: 論理削除されていない注文を order_date で絞り込む
+CREATE INDEX IF NOT EXISTS idx_orders_order_date_live
+    ON orders (order_date)
+    WHERE order_deleted_at IS NULL;
+
+-- ユーザー別の注文確認・キャンセル: user_id + order_date（論理削除されていない行のみ）
+CREATE INDEX IF NOT EXISTS idx_orders_user_id_order_date_live
+    ON orders (user_id, order_date)
+    WHERE order_deleted_at IS NULL;
+
+-- 注文とオプションの結合（外部キーには自動でインデックスが付かないため）
+CREATE INDEX IF NOT EXISTS idx_option_details_order_id
+    ON option_details (order_id);
+
+-- 期限切れトークンの掃除
+CREATE INDEX IF NOT EXISTS idx_auth_tokens_expires_at
+    ON auth_tokens (expires_at);
@@ -0,0 +1,140 @@
+-- orders / option_details を order_date の月単位でレンジパーティション化する
+-- 既存テーブルを *_legacy に退避し、パーティションテーブルへ移し替えてから削除する。
+-- ※ パーティションキーを含める必要があるため、主キーは (id, order_date) になる。
+--   option_details にも order_date を持たせ、(order_id, order_date) で orders を参照する。
+
+-- ----------------------------------------------------------------------
+-- 1. 既存テーブルの退避（インデックス・制約名を空ける）
+-- ----------------------------------------------------------------------
+DROP INDEX IF EXISTS idx_orders_order_date_live;
+DROP INDEX IF EXISTS idx_orders_user_id_order_date_live;
+DROP INDEX IF EXISTS idx_option_details_order_id;
+
+ALTER TABLE option_details RENAME TO option_details_legacy;
+ALTER TABLE option_details_legacy RENAME CONSTRAINT option_details_pkey TO option_details_legacy_pkey;
+ALTER TABLE orders RENAME TO orders_legacy;
+ALTER TABLE orders_legacy RENAME CONSTRAINT orders_pkey TO orders_legacy_pkey;
+
+-- ----------------------------------------------------------------------
+-- 2. パーティションテーブル（親）
+-- ----------------------------------------------------------------------
+CREATE TABLE orders (
+    order_id INTEGER NOT NULL DEFAULT nextval('orders_order_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES users(user_id),
+
+    product_id VARCHAR(50) NOT NULL,
+    product_name VARCHAR(255) NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    unit_price INTEGER NOT NULL,
+    has_options BOOLEAN NOT NULL DEFAULT FALSE,
+
+    option_total_amount INTEGER NOT NULL DEFAULT 0, -- option_detailsの合計
+    total_amount INTEGER NOT NULL DEFAULT 0,        -- 注文全体の確定総額
+
+    order_date DATE NOT NULL,
+    order_received_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    order_updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    order_deleted_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (order_id, order_date)
+) PARTITION BY RANGE (order_date);
+
+CREATE TABLE option_details (
+    option_detail_id INTEGER NOT NULL DEFAULT nextval('option_details_option_detail_id_seq'),
+    order_id INTEGER NOT NULL,
+    order_date DATE NOT NULL,
+    option_name VARCHAR(100) NOT NULL,
+    option_value VARCHAR(100) NOT NULL,
+    price INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (option_detail_id, order_date),
+    FOREIGN KEY (order_id, order_date) REFERENCES orders (order_id, order_date) ON DELETE CASCADE
+) PARTITION BY RANGE (order_date);
+
+-- 月パーティションが未作成の日付の受け皿
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+CREATE TABLE option_details_default PARTITION OF option_details DEFAULT;
+
+-- 連番は新しいテーブルの所有にする（旧テーブル削除で消えないように）
+ALTER SEQUENCE orders_order_id_seq OWNED BY orders.order_id;
+ALTER SEQUENCE option_details_option_detail_id_seq OWNED BY option_details.option_detail_id;
+
+-- ----------------------------------------------------------------------
+-- 3. 月パーティション作成関数（tasks.py の manage_order_partitions からも呼ぶ）
+--    デフォルトパーティションに入ってしまった該当月の行は新パーティションへ移す。
+-- ----------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION ensure_order_partitions(p_month DATE) RETURNS VOID AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::DATE;
+    v_suffix TEXT := to_char(v_start, '"y"YYYY"m"MM');
+    v_orders TEXT := 'orders_' || v_suffix;
+    v_options TEXT := 'option_details_' || v_suffix;
+BEGIN
+    IF to_regclass(v_orders) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE orders INCLUDING DEFAULTS)', v_orders);
+    EXECUTE format('CREATE TABLE %I (LIKE option_details INCLUDING DEFAULTS)', v_options);
+
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM option_details_default WHERE order_date >= $1 AND order_date < $2 RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved', v_options) USING v_start, v_end;
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM orders_default WHERE order_date >= $1 AND order_date < $2 RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved', v_orders) USING v_start, v_end;
+
+    EXECUTE format('ALTER TABLE orders ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_orders, v_start, v_end);
+    EXECUTE format('ALTER TABLE option_details ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_options, v_start, v_end);
+END;
+$$ LANGUAGE plpgsql;
+
+-- 既存データの範囲 + 3か月先までのパーティションを作る
+DO $$
+DECLARE
+    v_month DATE;
+    v_last DATE := (date_trunc('month', CURRENT_DATE) + INTERVAL '3 months')::DATE;
+BEGIN
+    SELECT date_trunc('month', LEAST(COALESCE(MIN(order_date), CURRENT_DATE), CURRENT_DATE))::DATE
+      INTO v_month FROM orders_legacy;
+    WHILE v_month <= v_last LOOP
+        PERFORM ensure_order_partitions(v_month);
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+END;
+$$;
+
+-- ----------------------------------------------------------------------
+-- 4. データの移し替えと旧テーブルの削除
+-- ----------------------------------------------------------------------
+INSERT INTO orders (
+    order_id, user_id, product_id, product_name, quantity, unit_price, has_options,
+    option_total_amount, total_amount, order_date,
+    order_received_at, order_updated_at, order_deleted_at
+)
+SELECT
+    order_id, user_id, product_id, product_name, quantity, unit_price, has_options,
+    option_total_amount, total_amount, order_date,
+    order_received_at, order_updated_at, order_deleted_at
+FROM orders_legacy;
+
+INSERT INTO option_details (option_detail_id, order_id, order_date, option_name, option_value, price)
+SELECT od.option_detail_id, od.order_id, o.order_date, od.option_name, od.option_value, od.price
+FROM option_details_legacy od
+JOIN orders_legacy o ON o.order_id = od.order_id;
+
+DROP TABLE option_details_legacy;
+DROP TABLE orders_legacy;
+
+-- ----------------------------------------------------------------------
+-- 5. 0001 のインデックスを親テーブルに作り直す（各パーティションに伝播する）
+-- ----------------------------------------------------------------------
+CREATE INDEX idx_orders_order_date_live
+    ON orders (order_date)
+    WHERE order_deleted_at IS NULL;
+
+CREATE INDEX idx_orders_user_id_order_date_live
+    ON orders (user_id, order_date)
+    WHERE order_deleted_at IS NULL;
+
+CREATE INDEX idx_option_details_order_id
+    ON option_details (order_id, order_date);
@@ -0,0 +1,38 @@
+-- 月次請求のスナップショット
+-- 行は更新・削除しない。注文が変わった利用者だけ、再計算時に新しい版（snapshot_version）を追加する。
+CREATE TABLE invoice_snapshots (
+    invoice_snapshot_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,            -- 卒業生をアーカイブしても請求履歴は残すため外部キーは張らない
+    billing_month DATE NOT NULL,         -- 請求月の1日
+    snapshot_version INTEGER NOT NULL,
+
+    order_count INTEGER NOT NULL,
+    subtotal INTEGER NOT NULL,           -- orders.total_amount の合計（税抜）
+    tax_rate NUMERIC(5, 4) NOT NULL,
+    tax_amount INTEGER NOT NULL,         -- 1円未満切り捨て
+    total_amount INTEGER NOT NULL,
+
+    source_watermark TIMESTAMP WITH TIME ZONE,  -- 集計対象の注文の最終変更時刻
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, billing_month, snapshot_version)
+);
+
+CREATE INDEX idx_invoice_snapshots_billing_month
+    ON invoice_snapshots (billing_month);
+
+-- 利用者・月ごとの最新版
+CREATE VIEW latest_invoices AS
+SELECT DISTINCT ON (user_id, billing_month) *
+FROM invoice_snapshots
+ORDER BY user_id, billing_month, snapshot_version DESC;
+
+-- スナップショットは不変
+CREATE OR REPLACE FUNCTION forbid_invoice_snapshot_change() RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'invoice_snapshots は変更できません（再計算は新しい版を追加してください）';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER invoice_snapshots_immutable
+    BEFORE UPDATE OR DELETE ON invoice_snapshots
+    FOR EACH ROW EXECUTE FUNCTION forbid_invoice_snapshot_change();
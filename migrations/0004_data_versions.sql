@@ -0,0 +1,23 @@
+-- マスタデータのバージョン管理（キャッシュや ETag の判定に使う）
+-- 対象テーブルが変更されるたびにトリガーで version が1つ進む。
+CREATE TABLE data_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO data_versions (name, version) VALUES (TG_ARGV[0], 1)
+    ON CONFLICT (name) DO UPDATE
+    SET version = data_versions.version + 1, updated_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 休日カレンダー
+INSERT INTO data_versions (name) VALUES ('holidays');
+
+CREATE TRIGGER holidays_bump_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON holidays
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('holidays');
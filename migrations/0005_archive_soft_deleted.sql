@@ -0,0 +1,39 @@
+-- 論理削除された行（卒業生の users、キャンセルされた orders）の保管先
+-- tasks.py の archive_soft_deleted が保持期間を過ぎた行を少しずつ移す。
+-- 列の並びは元テーブルと同じで、最後に archived_at を足している（restore で元に戻すため）。
+-- ※ 月パーティションを切り離した orders_yYYYYmMM も同じ archive スキーマに置かれる。
+CREATE SCHEMA IF NOT EXISTS archive;
+
+CREATE TABLE archive.users (LIKE users);
+ALTER TABLE archive.users ADD COLUMN archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE archive.users ADD PRIMARY KEY (user_id);
+
+CREATE TABLE archive.orders (LIKE orders);
+ALTER TABLE archive.orders ADD COLUMN archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE archive.orders ADD PRIMARY KEY (order_id, order_date);
+CREATE INDEX idx_archive_orders_user_id ON archive.orders (user_id, order_date);
+
+CREATE TABLE archive.option_details (LIKE option_details);
+ALTER TABLE archive.option_details ADD COLUMN archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE archive.option_details ADD PRIMARY KEY (option_detail_id, order_date);
+CREATE INDEX idx_archive_option_details_order_id ON archive.option_details (order_id, order_date);
+
+-- アーカイブ対象を探すためのインデックス（論理削除された行だけ）
+CREATE INDEX idx_users_deleted_at ON users (user_deleted_at) WHERE user_deleted_at IS NOT NULL;
+CREATE INDEX idx_orders_deleted_at ON orders (order_deleted_at) WHERE order_deleted_at IS NOT NULL;
+
+-- 監査用: 現行データとアーカイブをまとめて見る（archived_at が NULL なら現行テーブルの行）
+CREATE VIEW audit_users AS
+SELECT u.*, NULL::TIMESTAMP WITH TIME ZONE AS archived_at FROM users u
+UNION ALL
+SELECT * FROM archive.users;
+
+CREATE VIEW audit_orders AS
+SELECT o.*, NULL::TIMESTAMP WITH TIME ZONE AS archived_at FROM orders o
+UNION ALL
+SELECT * FROM archive.orders;
+
+CREATE VIEW audit_option_details AS
+SELECT od.*, NULL::TIMESTAMP WITH TIME ZONE AS archived_at FROM option_details od
+UNION ALL
+SELECT * FROM archive.option_details;
@@ -0,0 +1,7 @@
+-- 商品マスタもバージョン管理する（注文の検証・メニューのキャッシュが変更を検知するため）
+INSERT INTO data_versions (name) VALUES ('products')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE TRIGGER products_bump_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('products');
@@ -0,0 +1,10 @@
+-- 復元した注文の記録
+-- キャンセル済みの注文は復元しても order_deleted_at を残す（請求・監査のため取り消しにはしない）。
+-- そのままでは次のアーカイブで即座に戻されてしまうため、復元時刻を記録し、
+-- 復元から保持期間が過ぎるまではアーカイブの対象にしない。
+CREATE TABLE archive.restored_orders (
+    order_id INTEGER NOT NULL,
+    order_date DATE NOT NULL,
+    restored_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (order_id, order_date)
+);
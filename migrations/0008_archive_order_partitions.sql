@@ -0,0 +1,48 @@
+-- 切り離した月パーティションも監査ビューから見えるようにする
+-- tasks.py の manage_order_partitions は保持期間を過ぎた orders_yYYYYmMM / option_details_yYYYYmMM を
+-- archive スキーマへ移すが、0005 の audit_orders / audit_option_details は archive.orders などしか見ていなかった。
+-- 移したパーティションは archive.*_by_month（月のレンジパーティションの親）にぶら下げ、ビューで合わせて見る。
+-- 列は archive.orders / archive.option_details と同じ（最後に archived_at）。
+
+CREATE TABLE archive.orders_by_month (LIKE archive.orders) PARTITION BY RANGE (order_date);
+CREATE TABLE archive.option_details_by_month (LIKE archive.option_details) PARTITION BY RANGE (order_date);
+
+-- すでに archive スキーマへ移してあるパーティションをぶら下げる
+DO $$
+DECLARE
+    v_table RECORD;
+    v_start DATE;
+BEGIN
+    FOR v_table IN
+        SELECT c.relname, substring(c.relname FROM '^(orders|option_details)_y') AS parent
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'archive'
+          AND c.relkind = 'r'
+          AND c.relname ~ '^(orders|option_details)_y\d{4}m\d{2}$'
+          AND NOT c.relispartition
+    LOOP
+        v_start := to_date(substring(v_table.relname FROM 'y(\d{4}m\d{2})$'), 'YYYY"m"MM');
+        EXECUTE format(
+            'ALTER TABLE archive.%I ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP',
+            v_table.relname);
+        EXECUTE format(
+            'ALTER TABLE archive.%I ATTACH PARTITION archive.%I FOR VALUES FROM (%L) TO (%L)',
+            v_table.parent || '_by_month', v_table.relname, v_start, (v_start + INTERVAL '1 month')::DATE);
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE VIEW audit_orders AS
+SELECT o.*, NULL::TIMESTAMP WITH TIME ZONE AS archived_at FROM orders o
+UNION ALL
+SELECT * FROM archive.orders
+UNION ALL
+SELECT * FROM archive.orders_by_month;
+
+CREATE OR REPLACE VIEW audit_option_details AS
+SELECT od.*, NULL::TIMESTAMP WITH TIME ZONE AS archived_at FROM option_details od
+UNION ALL
+SELECT * FROM archive.option_details
+UNION ALL
+SELECT * FROM archive.option_details_by_month;
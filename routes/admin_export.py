@@ -0,0 +1,164 @@
+from flask import Blueprint, request, Response
+from linebot.models import TextSendMessage
+from utils.db_utils import execute_prepared_stream, execute_sql, register_statement
+from utils.token_utils import create_token, check_admin_token
+from utils.config import get_config
+from utils.line_utils import get_line_bot_api
+from utils.date_utils import today_jst
+from datetime import datetime
+import csv
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+admin_export_bp = Blueprint("admin_export", __name__)
+
+# 1回のフェッチで取り出す行数（メモリ使用量はこの行数分で一定）
+EXPORT_BATCH_SIZE = 2000
+
+# 厨房用の注文表（学年・クラス・氏名順）
+ORDER_SHEET_SQL = """
+    SELECT
+        o.order_date, u.user_grade, u.user_class,
+        u.user_last_name, u.user_first_name,
+        o.product_name, o.quantity, o.total_amount,
+        COALESCE(opt.options, '') AS options
+    FROM orders o
+    JOIN users u ON u.user_id = o.user_id
+    LEFT JOIN LATERAL (
+        SELECT string_agg(od.option_name || ':' || od.option_value, ' / '
+                          ORDER BY od.option_detail_id) AS options
+        FROM option_details od
+        WHERE od.order_id = o.order_id AND od.order_date = o.order_date
+    ) opt ON TRUE
+    WHERE o.order_date BETWEEN %s AND %s
+      AND o.order_deleted_at IS NULL
+    ORDER BY o.order_date, u.user_grade, u.user_class,
+             u.user_last_name, u.user_first_name, o.order_id
+"""
+
+# SQLite には LATERAL と ORDER BY 付きの string_agg がないため、並べた副問い合わせを group_concat でつなぐ
+ORDER_SHEET_SQLITE_SQL = """
+    SELECT
+        o.order_date, u.user_grade, u.user_class,
+        u.user_last_name, u.user_first_name,
+        o.product_name, o.quantity, o.total_amount,
+        COALESCE((
+            SELECT group_concat(opt.option_text, ' / ')
+            FROM (
+                SELECT od.option_name || ':' || od.option_value AS option_text
+                FROM option_details od
+                WHERE od.order_id = o.order_id AND od.order_date = o.order_date
+                ORDER BY od.option_detail_id
+            ) opt
+        ), '') AS options
+    FROM orders o
+    JOIN users u ON u.user_id = o.user_id
+    WHERE o.order_date BETWEEN %s AND %s
+      AND o.order_deleted_at IS NULL
+    ORDER BY o.order_date, u.user_grade, u.user_class,
+             u.user_last_name, u.user_first_name, o.order_id
+"""
+
+register_statement("order_sheet", ORDER_SHEET_SQL, sqlite_sql=ORDER_SHEET_SQLITE_SQL)
+
+CSV_HEADER = ["日付", "学年", "クラス", "姓", "名", "商品名", "数量", "オプション", "金額"]
+
+
+# ---------------------------------------
+# 管理者に注文表ダウンロードURLを送る
+# ---------------------------------------
+def send_order_sheet_link(event, line_user_id):
+    line_bot_api = get_line_bot_api()
+
+    sql = "SELECT admin_id FROM admins WHERE admin_line_id = %s"
+    rows = execute_sql(sql, (line_user_id,), fetch=True)
+
+    if not rows:
+        reply = TextSendMessage(text="管理者として登録されていません。")
+        line_bot_api.reply_message(event.reply_token, reply)
+        return
+
+    token = create_token(admin_id=rows[0]["admin_id"], ttl_minutes=10)
+    if not token:
+        reply = TextSendMessage(text="トークン生成に失敗しました。")
+        line_bot_api.reply_message(event.reply_token, reply)
+        return
+
+    url = f"{get_config()['HOST_URL']}/admin/export/orders.csv?token={token}"
+    reply = TextSendMessage(text=f"本日の注文表（CSV）はこちら：\n{url}\n期間指定は &from=YYYY-MM-DD&to=YYYY-MM-DD を付けてください。")
+    line_bot_api.reply_message(event.reply_token, reply)
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+# 注文表CSV（ストリーミング）
+@admin_export_bp.route("/admin/export/orders.csv", methods=["GET"])
+def admin_export_orders():
+    token = request.args.get("token")
+
+    # トークン検証（同じセッションで検証済みならDBは見ない）
+    check = check_admin_token(token)
+    if "error" in check:
+        return check["error"], 400
+
+    # 期間: date=1日分 / from,to=期間 / 指定なし=今日
+    try:
+        if request.args.get("date"):
+            date_from = date_to = _parse_date(request.args["date"])
+        else:
+            today = today_jst()
+            date_from = _parse_date(request.args["from"]) if request.args.get("from") else today
+            date_to = _parse_date(request.args["to"]) if request.args.get("to") else date_from
+    except ValueError:
+        return "日付は YYYY-MM-DD 形式で指定してください。", 400
+
+    if date_from > date_to:
+        return "開始日が終了日より後になっています。", 400
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # Excel で文字化けしないよう BOM を付ける
+        writer.writerow(CSV_HEADER)
+        yield "\ufeff" + buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+        try:
+            # 行は CSV に書くだけなので、行ごとの辞書を持たない compact 形式で読む
+            for rows in execute_prepared_stream(
+                "order_sheet", (date_from, date_to),
+                batch_size=EXPORT_BATCH_SIZE, row_type="compact",
+            ):
+                for row in rows:
+                    writer.writerow([
+                        row["order_date"].strftime("%Y-%m-%d"),
+                        row["user_grade"],
+                        row["user_class"],
+                        row["user_last_name"],
+                        row["user_first_name"],
+                        row["product_name"],
+                        row["quantity"],
+                        row["options"],
+                        row["total_amount"],
+                    ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        except Exception as e:
+            # ヘッダー送信後はステータスを変えられないため、ログに残して打ち切る
+            logger.error("注文表のエクスポート中にエラーが発生しました: %s", e, exc_info=True)
+
+    file_name = f"orders_{date_from:%Y%m%d}_{date_to:%Y%m%d}.csv"
+    return Response(
+        generate(),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename={file_name}",
+            "Cache-Control": "no-store",
+        },
+    )
@@ -1,28 +1,24 @@
-from flask import Blueprint, request, render_template, redirect, url_for, current_app, jsonify
-from linebot.models import TemplateSendMessage, ConfirmTemplate, MessageAction, TextSendMessage
-from utils.db_utils import execute_sql
-from utils.token_utils import create_token
-from linebot import LineBotApi
-from datetime import datetime, timedelta, timezone
-import os
-from dotenv import load_dotenv
+from flask import Blueprint, request, render_template, current_app, jsonify
+from linebot.models import TextSendMessage
+from utils.db_utils import execute_sql, transaction
+from utils.token_utils import create_token, check_admin_token, revoke_admin_token
+from utils.config import get_config
+from utils.line_utils import get_line_bot_api
+from utils.data_versions import get_data_version
+from utils.date_utils import holiday_window
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
-load_dotenv()
 admin_holiday_bp = Blueprint("admin_holiday", __name__)
-HOST_URL = os.getenv("HOST_URL")
-
-LINE_CHANNEL_ACCESS_TOKEN = os.environ.get("LINE_CHANNEL_ACCESS_TOKEN")
-line_bot_api = LineBotApi(LINE_CHANNEL_ACCESS_TOKEN)
 
 
 # ---------------------------------------
 # 1. 最初の質問
 # ---------------------------------------
 def register_store_holiday_form(event, line_user_id):
+    line_bot_api = get_line_bot_api()
 
     sql = "SELECT admin_id FROM admins WHERE admin_line_id = %s"
     rows = execute_sql(sql, (line_user_id,), fetch=True)
@@ -35,14 +31,14 @@ def register_store_holiday_form(event, line_user_id):
     admin_id = rows[0]["admin_id"]
 
     token = create_token(admin_id=admin_id, ttl_minutes=10)
-    current_app.logger.debug(f"DEBUG: token generated: {token}")
+    logger.debug("token generated: %s", token)
 
     if not token:
         reply = TextSendMessage(text="トークン生成に失敗しました。")
         line_bot_api.reply_message(event.reply_token, reply)
         return
 
-    url = f"{HOST_URL}/admin/holiday?token={token}"
+    url = f"{get_config()['HOST_URL']}/admin/holiday?token={token}"
 
     reply = TextSendMessage(text=f"休日登録フォームはこちら：\n{url}")
     line_bot_api.reply_message(event.reply_token, reply)
@@ -51,52 +47,92 @@ def register_store_holiday_form(event, line_user_id):
 @admin_holiday_bp.route("/admin/holiday", methods=["GET"])
 def admin_holiday_form():
     token = request.args.get("token")
-    print("DEBUG: token from URL:", token)
-    logger.debug(f"DEBUG: token from URL: {token}")
+    logger.debug("token from URL: %s", token)
 
     if not token:
         return "トークンがありません。アクセスできません。", 400
 
-    # トークンが有効か確認
-    sql = """
-        SELECT expires_at 
-        FROM auth_tokens 
-        WHERE token = %s
-    """
-    result = execute_sql(sql, (token,), fetch=True)
-    logger.debug(f"DEBUG: result from DB: {result}")
-
-    # トークン存在確認
-    if not result:
-        return "無効なトークンです。", 400
-
-    expires_at = result[0]["expires_at"]
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-
-    # 有効期限チェック（UTC-awareで比較）
-    now_utc = datetime.now(timezone.utc)
-    if now_utc > expires_at:
-       execute_sql("DELETE FROM auth_tokens WHERE token = %s", (token,))
-       return "トークンの有効期限が切れています。", 400
+    # トークンが有効か確認（同じセッションで検証済みならDBは見ない）
+    check = check_admin_token(token)
+    if "error" in check:
+        return check["error"], 400
 
-    # 1. 休日データをDBから取得する（既存の execute_sql を使用）
-    sql = "SELECT holiday_date FROM holidays ORDER BY holiday_date ASC"
-    holiday_rows = execute_sql(sql, fetch=True)
-
-    # 2. datetimeオブジェクトをJinjaに渡すために文字列に変換（Pythonのリストに格納）
-    # (例: '2025-12-25')
-    existing_holidays = [row["holiday_date"].strftime("%Y-%m-%d") for row in holiday_rows]
+    # 休日データはページ表示後に /admin/holiday/api から期間を指定して読み込む
+    # ?from=&to= で表示期間を絞れる（登録できる期間の外は切り詰める）
+    window_start, window_end = holiday_window()
+    try:
+        date_from, date_to = _parse_window(request.args)
+    except ValueError:
+        return "日付は YYYY-MM-DD 形式で指定してください。", 400
+    date_from, date_to = max(date_from, window_start), min(date_to, window_end)
+    if date_from > date_to:
+        return "登録できる期間の外です。", 400
 
     # HTML表示
     return render_template(
         "admin_holiday_form.html", 
         token=token,
-        # 🚨 修正: テンプレートが必要としている変数を渡す
-        existing_holidays=existing_holidays 
+        window_from=date_from.strftime("%Y-%m-%d"),
+        window_to=date_to.strftime("%Y-%m-%d"),
     )
 
 
+def _parse_window(args):
+    """?from=&to= を日付に変換する。省略時は登録できる期間（今日〜次の学期の終わり）。"""
+    window_start, window_end = holiday_window()
+    date_from = datetime.strptime(args["from"], "%Y-%m-%d").date() if args.get("from") else window_start
+    date_to = datetime.strptime(args["to"], "%Y-%m-%d").date() if args.get("to") else window_end
+    return date_from, date_to
+
+
+# 休日データ（期間指定・JSON）
+#   カレンダーのバージョンから ETag を作り、変更がなければ 304 を返す
+@admin_holiday_bp.route("/admin/holiday/api", methods=["GET"])
+def admin_holiday_api():
+    check = check_admin_token(request.args.get("token"))
+    if "error" in check:
+        return jsonify({"success": False, "message": check["error"]}), 400
+
+    try:
+        date_from, date_to = _parse_window(request.args)
+    except ValueError:
+        return jsonify({"success": False, "message": "日付は YYYY-MM-DD 形式で指定してください。"}), 400
+    if date_from > date_to:
+        return jsonify({"success": False, "message": "開始日が終了日より後になっています。"}), 400
+
+    version = get_data_version("holidays")
+    etag = f"holidays-{version}-{date_from:%Y%m%d}-{date_to:%Y%m%d}"
+    if version is not None and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    sql = """
+        SELECT holiday_date, note FROM holidays
+        WHERE holiday_date BETWEEN %s AND %s
+        ORDER BY holiday_date ASC
+    """
+    rows = execute_sql(sql, (date_from, date_to), fetch=True)
+    if "error" in rows:
+        return jsonify({"success": False, "message": "休日データの取得に失敗しました。"}), 500
+
+    response = jsonify({
+        "success": True,
+        "from": date_from.strftime("%Y-%m-%d"),
+        "to": date_to.strftime("%Y-%m-%d"),
+        "version": version,
+        "holidays": [
+            {"date": row["holiday_date"].strftime("%Y-%m-%d"), "note": row["note"]}
+            for row in rows
+        ],
+    })
+    if version is not None:
+        response.set_etag(etag)
+    # 毎回再検証させる（変更がなければ 304 で本文は送らない）
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 # フォーム送信処理
 @admin_holiday_bp.route("/admin/holiday/submit", methods=["POST"])
 def admin_holiday_submit():
@@ -106,58 +142,62 @@ def admin_holiday_submit():
     token = data.get("token")
     dates_array = data.get("dates", []) # 🚨 3. 'dates'キーから日付リストを取得
     
-    current_app.logger.info(f"INFO: 休日登録リクエスト受信。選択日: {dates_array}")
+    logger.info("休日登録リクエスト受信。選択日: %s", dates_array)
 
     if not token:
         # 成功/失敗にかかわらず、JavaScriptがJSON応答を期待しているためjsonifyで返す
         return jsonify({"success": False, "message": "トークンがありません。"}), 400
 
-    # --- トークン再チェック ---
-    sql = "SELECT expires_at FROM auth_tokens WHERE token = %s"
-    # execute_sql の呼び出しは元のコードの通り
-    result = execute_sql(sql, (token,), fetch=True)
-
-    if not result:
-        return jsonify({"success": False, "message": "無効なトークンです。"}), 400
-
-    expires_at = result[0]["expires_at"]
-    
-    # タイムゾーン処理は元のコードの通り
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    
-    # 有効期限チェック（UTC-awareで比較）
-    now_utc = datetime.now(timezone.utc)
-    if now_utc > expires_at:
-        execute_sql("DELETE FROM auth_tokens WHERE token = %s", (token,))
-        return jsonify({"success": False, "message": "トークンの有効期限が切れています。"}), 400
+    # --- トークン再チェック（フォーム表示時に検証済みならセッションで通す） ---
+    check = check_admin_token(token)
+    if "error" in check:
+        return jsonify({"success": False, "message": check["error"]}), 400
     # --- トークン検証 終了 ---
     
     try:
         # 🚨 4. DB操作ロジックの変更（複数日対応）
-        
-        # 4-1. 今日の日付より未来の休日を一旦全て削除（上書き登録の準備）
-        # HTML側で過去日は選択不可になっているため、今日以降のデータを全てクリアします。
-        today_date_str = datetime.now().strftime("%Y-%m-%d")
-        execute_sql("DELETE FROM holidays WHERE holiday_date >= %s", (today_date_str,))
 
-        # 4-2. 選択された日付を全て INSERT
+        # 4-1. 置き換える（DELETE する）期間を決める
+        # HTML側で過去日は選択不可になっているため、今日以降のデータだけを置き換えます。
+        # フォームが表示していた期間（from/to）が送られてきた場合は、その期間内だけを置き換えます。
+        # どちらの場合も登録できる期間（次の学期の終わりまで）を超えては削除しません。
+        # 選択された日付はこの期間の外でも登録します（期間の外の既存の休日は消さない）。
+        window_from, window_end = holiday_window()
+        if data.get("from"):
+            window_from = max(window_from, datetime.strptime(data["from"], "%Y-%m-%d").date())
+        window_to = window_end
+        if data.get("to"):
+            window_to = min(window_end, datetime.strptime(data["to"], "%Y-%m-%d").date())
+
+        try:
+            date_values = sorted({datetime.strptime(date_str, "%Y-%m-%d").date() for date_str in dates_array})
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "日付は YYYY-MM-DD 形式で指定してください。"}), 400
+
+        # 4-2. 削除と INSERT を1トランザクションで行う（INSERT は1文にまとめる）
         # note はこのフォームでは入力されていないため、空欄で登録します
-        insert_sql = "INSERT INTO holidays (holiday_date, note) VALUES (%s, %s)"
-        
-        # 日付文字列をdatetimeオブジェクトに変換し、note(空)とペアにする
-        for date_str in dates_array:
-             date_value = datetime.strptime(date_str, "%Y-%m-%d")
-             execute_sql(insert_sql, (date_value, "")) 
+        with transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM holidays WHERE holiday_date BETWEEN %s AND %s",
+                (window_from, window_to),
+            )
+            if date_values:
+                # 削除しなかった期間の外の日付はすでに登録済みのことがある
+                values_sql = ", ".join(["(%s, '')"] * len(date_values))
+                cursor.execute(
+                    f"INSERT INTO holidays (holiday_date, note) VALUES {values_sql} "
+                    "ON CONFLICT (holiday_date) DO NOTHING",
+                    date_values,
+                )
              
         # 4-3. トークン削除（1回だけ有効）
-        execute_sql("DELETE FROM auth_tokens WHERE token = %s", (token,))
+        revoke_admin_token(token)
 
         return jsonify({
             "success": True, 
-            "message": f"{len(dates_array)}件の休業日リストの登録と更新が完了しました。"
+            "message": f"{len(date_values)}件の休業日リストの登録と更新が完了しました。"
         }), 200 
         
     except Exception as e:
-        current_app.logger.error(f"FATAL ERROR: 休日登録処理中にデータベースエラーが発生しました: {e}", exc_info=True)
+        logger.error("FATAL ERROR: 休日登録処理中にデータベースエラーが発生しました: %s", e, exc_info=True)
         return jsonify({"success": False, "message": f"登録中にサーバーエラーが発生しました: {e}"}), 500
\ No newline at end of file
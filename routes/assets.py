@@ -0,0 +1,37 @@
+from flask import Blueprint, request, send_file, abort
+from utils.assets import resolve_asset
+from utils.config import get_config
+import mimetypes
+import os
+
+assets_bp = Blueprint("assets", __name__)
+
+
+# ハッシュ付きの静的ファイル
+#   内容が変わればURLも変わるため、長期間キャッシュさせる（immutable）。
+#   圧縮済みの .br / .gz があれば Accept-Encoding に応じてそちらを返す。
+@assets_bp.route("/assets/<path:filename>", methods=["GET"])
+def asset(filename):
+    resolved = resolve_asset(filename)
+    if resolved is None:
+        abort(404)
+    path, rel_path = resolved
+
+    # text/* と JavaScript の charset=utf-8 は Werkzeug が付ける
+    mimetype = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+
+    encoding = None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[candidate] and os.path.exists(path + suffix):
+            path += suffix
+            encoding = candidate
+            break
+
+    max_age = get_config()["ASSET_MAX_AGE"]
+    response = send_file(path, mimetype=mimetype, max_age=max_age, conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,22 @@
+from flask import Blueprint, request, current_app, jsonify
+from utils.config import get_config
+from utils.load_shed import get_load_shedder
+from utils.order_buffer import get_order_buffer
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+# 運用メトリクス（JSON）
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    metrics_token = get_config()["METRICS_TOKEN"]
+    if metrics_token and request.args.get("token") != metrics_token:
+        return jsonify({"success": False, "message": "トークンが不正です。"}), 403
+
+    order_buffer = get_order_buffer()
+    return jsonify({
+        "startup": current_app.config.get("STARTUP_METRICS"),
+        "load_shed": get_load_shedder().snapshot(),
+        # ORDER_BUFFER=1 で最初の注文を書き込むまでは null
+        "order_buffer": order_buffer.snapshot() if order_buffer else None,
+    })
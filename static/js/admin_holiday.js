@@ -0,0 +1,115 @@
+// 休業日登録フォーム（templates/admin_holiday_form.html）
+// トークンと表示期間は .container の data 属性から受け取る
+const form = document.querySelector(".container").dataset;
+const TOKEN = form.token;
+const WINDOW_FROM = form.windowFrom;
+const WINDOW_TO = form.windowTo;
+const selected = new Set();
+
+// YYYY-MM-DD（ローカル日付）
+function formatDate(d) {
+    const m = String(d.getMonth() + 1).padStart(2, "0");
+    const day = String(d.getDate()).padStart(2, "0");
+    return `${d.getFullYear()}-${m}-${day}`;
+}
+
+function parseDate(text) {
+    const [y, m, d] = text.split("-").map(Number);
+    return new Date(y, m - 1, d);
+}
+
+// 期間内の日付を月ごとにカレンダー表示する（期間外・過去日は選択不可）
+function renderCalendar() {
+    const calendar = document.getElementById("calendar");
+    calendar.innerHTML = "";
+    const start = parseDate(WINDOW_FROM);
+    const end = parseDate(WINDOW_TO);
+    const today = formatDate(new Date());
+
+    let cursor = new Date(start.getFullYear(), start.getMonth(), 1);
+    while (cursor <= end) {
+        const month = document.createElement("div");
+        month.className = "month";
+        month.innerHTML = `<h3>${cursor.getFullYear()}年${cursor.getMonth() + 1}月</h3>`;
+        const days = document.createElement("div");
+        days.className = "days";
+
+        for (let i = 0; i < cursor.getDay(); i++) {
+            const blank = document.createElement("div");
+            blank.className = "day blank";
+            days.appendChild(blank);
+        }
+
+        const last = new Date(cursor.getFullYear(), cursor.getMonth() + 1, 0).getDate();
+        for (let n = 1; n <= last; n++) {
+            const date = formatDate(new Date(cursor.getFullYear(), cursor.getMonth(), n));
+            const cell = document.createElement("div");
+            cell.className = "day";
+            cell.textContent = n;
+            if (date < WINDOW_FROM || date > WINDOW_TO || date < today) {
+                cell.classList.add("disabled");
+            } else {
+                if (selected.has(date)) {
+                    cell.classList.add("selected");
+                }
+                cell.addEventListener("click", () => {
+                    if (selected.has(date)) {
+                        selected.delete(date);
+                    } else {
+                        selected.add(date);
+                    }
+                    cell.classList.toggle("selected");
+                });
+            }
+            days.appendChild(cell);
+        }
+
+        month.appendChild(days);
+        calendar.appendChild(month);
+        cursor = new Date(cursor.getFullYear(), cursor.getMonth() + 1, 1);
+    }
+}
+
+// 登録済みの休業日を読み込む（ブラウザのHTTPキャッシュを使い、変更がなければ 304）
+async function loadHolidays() {
+    const params = new URLSearchParams({ token: TOKEN, from: WINDOW_FROM, to: WINDOW_TO });
+    try {
+        const res = await fetch(`/admin/holiday/api?${params}`, { cache: "no-cache" });
+        const data = await res.json();
+        if (!data.success) {
+            document.getElementById("message").textContent = data.message;
+            return;
+        }
+        data.holidays.forEach((h) => selected.add(h.date));
+        renderCalendar();
+        document.getElementById("submit").disabled = false;
+    } catch (e) {
+        document.getElementById("message").textContent = "休業日の読み込みに失敗しました。";
+    }
+}
+
+document.getElementById("submit").addEventListener("click", async () => {
+    const button = document.getElementById("submit");
+    const message = document.getElementById("message");
+    const today = formatDate(new Date());
+    const dates = Array.from(selected).filter((d) => d >= today).sort();
+
+    button.disabled = true;
+    try {
+        const res = await fetch("/admin/holiday/submit", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ token: TOKEN, dates: dates, from: WINDOW_FROM, to: WINDOW_TO }),
+        });
+        const data = await res.json();
+        message.textContent = data.message;
+        if (!data.success) {
+            button.disabled = false;
+        }
+    } catch (e) {
+        message.textContent = "送信に失敗しました。";
+        button.disabled = false;
+    }
+});
+
+loadHolidays();
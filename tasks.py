@@ -2,6 +2,25 @@
 
 import datetime
 import os
+import re
+import sys
+
+from utils.archive import archive_soft_deleted, restore_order, restore_user
+from utils.assets import build_assets
+from utils.billing import run_monthly_billing
+from utils.date_utils import today_jst
+from utils.db_utils import execute_sql, transaction
+from utils.menu import prewarm_menus
+
+# 注文パーティションを何か月先まで作っておくか
+PARTITION_MONTHS_AHEAD = int(os.environ.get("ORDER_PARTITION_MONTHS_AHEAD", "3"))
+
+# 何か月より古い注文パーティションを切り離すか（未設定なら切り離さない）
+PARTITION_RETENTION_MONTHS = os.environ.get("ORDER_PARTITION_RETENTION_MONTHS")
+
+# 論理削除から何日経った行を archive スキーマへ移すか / 1トランザクションで移す行数
+ARCHIVE_RETENTION_DAYS = int(os.environ.get("ARCHIVE_RETENTION_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
 
 # ログファイルは /tmp ディレクトリに書き出します
 # 環境によっては書き込み権限がない場合もあるため、権限エラーの確認も必要です
@@ -9,11 +28,17 @@ OUTPUT_FILE = "/tmp/cron_tasks_log.txt"
 
 def cleanup_expired_sessions():
     """
-    クリーンアップDB接続ロジックの代わりに、ファイルに実行時刻を記録します。
+    期限切れのセッション行を削除し、ファイルに実行時刻を記録します。
     """
     now = datetime.datetime.now()
     timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
 
+    # sessions テーブルの期限切れ行を削除（DbSessionInterface が書き込む）
+    result = execute_sql("DELETE FROM sessions WHERE expires_at < NOW()")
+    ok = "error" not in result
+    if not ok:
+        print("DB Error: session cleanup failed: {}".format(result["error"]), flush=True)
+
     # ログメッセージを組み立て (f-stringではなく、.format() を使用し互換性を確保)
     log_message = "Tasks script executed successfully at: {}\n".format(timestamp)
 
@@ -29,13 +54,211 @@ def cleanup_expired_sessions():
     except IOError as e:
         # ファイルI/Oのエラーを特定 (Permission deniedなど)
         print("IOError: File writing failed: {} Check permissions or path.".format(e), flush=True)
+        return False
     except Exception as e:
         # その他の予期せぬエラー
         print("General Error: {}".format(e), flush=True)
+        return False
+
+    return ok
+
+
+def _add_months(month_start, months):
+    """月初の日付に月数を足した月初の日付を返す。"""
+    total = month_start.year * 12 + (month_start.month - 1) + months
+    return datetime.date(total // 12, total % 12 + 1, 1)
+
+
+def manage_order_partitions(months_ahead=None, retention_months=None, drop=False):
+    """
+    orders / option_details の月パーティションを管理します。
+    - 今月から months_ahead か月先までのパーティションを事前に作成
+    - retention_months か月より古いパーティションを切り離し、archive スキーマへ移動
+      （archive.orders_by_month などにぶら下げるので audit_orders ビューから見える。
+      drop=True の場合は削除）
+    """
+    # コマンドラインから渡された場合は文字列
+    months_ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else int(months_ahead)
+    if retention_months is None and PARTITION_RETENTION_MONTHS:
+        retention_months = PARTITION_RETENTION_MONTHS
+    retention_months = int(retention_months) if retention_months else None
+    if isinstance(drop, str):
+        drop = drop == "drop"
+
+    # 月の切り替わりは日本時間で判定する（サーバーは UTC のことがある）
+    this_month = today_jst().replace(day=1)
+
+    # 1. 先のパーティションを作成（ensure_order_partitions は作成済みなら何もしない）
+    for i in range(months_ahead + 1):
+        month = _add_months(this_month, i)
+        result = execute_sql("SELECT ensure_order_partitions(%s)", (month,))
+        if "error" in result:
+            print("DB Error: partition {} failed: {}".format(month, result["error"]), flush=True)
+            return False
+
+    if not retention_months:
+        print("Partitions ensured up to {}.".format(_add_months(this_month, months_ahead)))
+        return True
+
+    # 2. 保持期間より古いパーティションを切り離す
+    cutoff = _add_months(this_month, -retention_months)
+    rows = execute_sql(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'orders'
+        """,
+        fetch=True,
+    )
+    if "error" in rows:
+        print("DB Error: listing partitions failed: {}".format(rows["error"]), flush=True)
+        return False
+
+    for row in rows:
+        match = re.match(r"^orders_y(\d{4})m(\d{2})$", row["relname"])
+        if not match:
+            continue
+        month = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+        if month >= cutoff:
+            continue
+
+        suffix = "y{:04d}m{:02d}".format(month.year, month.month)
+        try:
+            with transaction() as cursor:
+                # option_details は orders を参照しているため先に切り離す
+                for parent in ("option_details", "orders"):
+                    partition = "{}_{}".format(parent, suffix)
+                    cursor.execute("ALTER TABLE {} DETACH PARTITION {}".format(parent, partition))
+                    if drop:
+                        cursor.execute("DROP TABLE {}".format(partition))
+                        continue
+                    # archive.*_by_month と列をそろえてからぶら下げる（0008 を参照）
+                    cursor.execute(
+                        "ALTER TABLE {} ADD COLUMN archived_at TIMESTAMP WITH TIME ZONE "
+                        "NOT NULL DEFAULT CURRENT_TIMESTAMP".format(partition)
+                    )
+                    cursor.execute("ALTER TABLE {} SET SCHEMA archive".format(partition))
+                    cursor.execute(
+                        "ALTER TABLE archive.{}_by_month ATTACH PARTITION archive.{} "
+                        "FOR VALUES FROM (%s) TO (%s)".format(parent, partition),
+                        (month, _add_months(month, 1)),
+                    )
+            print("Partition {} {}.".format(suffix, "dropped" if drop else "archived"))
+        except Exception as e:
+            print("DB Error: detaching {} failed: {}".format(suffix, e), flush=True)
+            return False
+
+    return True
+
+
+def run_billing(month=None):
+    """
+    月次請求のスナップショットを作成します（month は "YYYY-MM"、省略時は先月）。
+    再実行すると、前回から注文が変わった利用者の分だけ新しい版が追加されます。
+    """
+    if month:
+        year, month_num = (int(part) for part in month.split("-"))
+    else:
+        last_month = _add_months(today_jst().replace(day=1), -1)
+        year, month_num = last_month.year, last_month.month
+
+    result = run_monthly_billing(year, month_num)
+    if "error" in result:
+        print("DB Error: billing {}-{:02d} failed: {}".format(year, month_num, result["error"]), flush=True)
+        return False
+    print("Billing {}-{:02d}: {} invoice snapshots written.".format(year, month_num, result["updated"]))
+    return True
+
+
+def run_archive(retention_days=None, batch_size=None):
+    """
+    論理削除された注文（order_deleted_at）と利用者（user_deleted_at）のうち、
+    保持期間を過ぎたものを option_details ごと archive スキーマへ移します。
+    監査には audit_users / audit_orders / audit_option_details ビューを使ってください。
+    """
+    retention_days = ARCHIVE_RETENTION_DAYS if retention_days is None else int(retention_days)
+    batch_size = ARCHIVE_BATCH_SIZE if batch_size is None else int(batch_size)
+
+    result = archive_soft_deleted(retention_days, batch_size)
+    if "error" in result:
+        print("DB Error: archive failed: {}".format(result["error"]), flush=True)
+        return False
+    print("Archived {} orders and {} users (older than {} days).".format(
+        result["orders"], result["users"], retention_days))
+    return True
+
+
+def run_restore(kind, record_id):
+    """
+    アーカイブした行を現行テーブルに戻します。
+      python tasks.py restore user 123   -> 利用者と、その注文・オプション
+      python tasks.py restore order 456  -> 注文とオプション
+    """
+    restore = {"user": restore_user, "order": restore_order}.get(kind)
+    if restore is None:
+        print("usage: python tasks.py restore [user|order] ID", file=sys.stderr)
+        return False
+
+    result = restore(int(record_id))
+    if "error" in result:
+        print("Restore failed: {}".format(result["error"]), flush=True)
+        return False
+    print("Restored {} users and {} orders.".format(result["users"], result["orders"]))
+    return True
+
+
+def run_build_assets():
+    """
+    static/ の CSS/JS をハッシュ付きの名前で static/dist/ に書き出します（デプロイ時に実行）。
+    gzip / brotli で圧縮済みの版も作成します。
+    """
+    manifest = build_assets()
+    for rel_path, hashed_path in sorted(manifest.items()):
+        print("{} -> {}".format(rel_path, hashed_path))
+    return True
+
+
+def run_prewarm_menus(days=None):
+    """
+    この先の営業日（既定は MENU_PREWARM_DAYS 日分）のメニューを作り、MENU_CACHE_DIR に書き出します。
+    商品マスタ・休日を変更した後や毎朝の締め切り後に実行します。
+    gunicorn の全ワーカーと同じ MENU_CACHE_DIR を見る環境（同じホスト、または共有ボリューム）で実行してください。
+    """
+    warmed = prewarm_menus(int(days) if days else None)
+    if isinstance(warmed, dict):
+        print("DB Error: menu prewarm failed: {}".format(warmed["error"]), flush=True)
+        return False
+    for day in warmed:
+        print("menu prewarmed: {}".format(day.isoformat()))
+    return True
 
 
 # ----------------------------------------------------------------------
 # スクリプトとして直接実行された場合の処理 (Cron用)
+#   python tasks.py                      -> cleanup_expired_sessions
+#   python tasks.py manage_partitions [先の月数] [保持月数] [drop] -> manage_order_partitions
+#   python tasks.py billing [YYYY-MM]    -> run_billing
+#   python tasks.py archive              -> run_archive
+#   python tasks.py restore user|order ID -> run_restore
+#   python tasks.py build_assets         -> run_build_assets（デプロイ時）
+#   python tasks.py prewarm_menus [N]    -> run_prewarm_menus
 # ----------------------------------------------------------------------
+TASKS = {
+    "cleanup_expired_sessions": cleanup_expired_sessions,
+    "manage_partitions": manage_order_partitions,
+    "billing": run_billing,
+    "archive": run_archive,
+    "restore": run_restore,
+    "build_assets": run_build_assets,
+    "prewarm_menus": run_prewarm_menus,
+}
+
 if __name__ == "__main__":
-    cleanup_expired_sessions()
\ No newline at end of file
+    task_name = sys.argv[1] if len(sys.argv) > 1 else "cleanup_expired_sessions"
+    if task_name not in TASKS:
+        print("usage: python tasks.py [{}]".format("|".join(TASKS)), file=sys.stderr)
+        sys.exit(2)
+    # 失敗したタスクは終了コード 1 にする（cron・監視で検知できるように）
+    sys.exit(0 if TASKS[task_name](*sys.argv[2:]) else 1)
@@ -0,0 +1,23 @@
+# テスト共通のフィクスチャ
+import pytest
+
+import utils.config
+import utils.db_utils
+import utils.db_utils.sqlite
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch):
+    """
+    メモリ上の SQLite（sql と sqlite_schema.sql を流したもの）を DATABASE_URL にする。
+    テストごとに新しいDBを作り、設定とバックエンドの選択も読み直す。
+    """
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///:memory:")
+    monkeypatch.delenv("DATABASE_REPLICA_URL", raising=False)
+    monkeypatch.delenv("DATABASE_SEED_FILE", raising=False)
+    monkeypatch.setattr(utils.config, "_config", None)
+    monkeypatch.setattr(utils.db_utils, "_backend", None)
+    monkeypatch.setattr(utils.db_utils.sqlite, "_conn", None)
+    yield utils.db_utils
+    if utils.db_utils.sqlite._conn is not None:
+        utils.db_utils.sqlite._conn.close()
@@ -0,0 +1,133 @@
+# utils.load_shed.LoadShedder（トークンバケット・連投・同時処理数・再送）のテスト
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils import load_shed
+from utils.load_shed import ADMIT, DUPLICATE, OVERLOADED, RATE_LIMITED, STALE_REDELIVERY, LoadShedder
+
+
+class Clock:
+    """time.monotonic の代わり（進めたい分だけ advance する）。"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(load_shed.time, "monotonic", clock)
+    return clock
+
+
+def make_shedder(rate=1.0, burst=3, max_concurrency=100, dedupe_seconds=0.0, redelivery_max_age=60):
+    return LoadShedder(rate, burst, max_concurrency, dedupe_seconds, redelivery_max_age)
+
+
+def make_event(text, user_id="U1", redelivery=False, age=0.0):
+    return SimpleNamespace(
+        source=SimpleNamespace(user_id=user_id),
+        message=SimpleNamespace(text=text),
+        timestamp=(time.time() - age) * 1000,
+        delivery_context=SimpleNamespace(is_redelivery=redelivery),
+    )
+
+
+def admit_and_release(shedder, event):
+    result = shedder.admit(event)
+    if result == ADMIT:
+        shedder.release()
+    return result
+
+
+def test_burst_then_rate_limited(clock):
+    shedder = make_shedder(rate=1.0, burst=3)
+    results = [admit_and_release(shedder, make_event(f"注文 {i}")) for i in range(4)]
+    assert results == [ADMIT, ADMIT, ADMIT, RATE_LIMITED]
+    assert shedder.counters[RATE_LIMITED] == 1
+
+
+def test_tokens_refill_at_rate(clock):
+    shedder = make_shedder(rate=2.0, burst=1)
+    assert admit_and_release(shedder, make_event("a")) == ADMIT
+    assert admit_and_release(shedder, make_event("b")) == RATE_LIMITED
+    clock.advance(0.5)  # 2個/秒 -> 0.5秒で1個
+    assert admit_and_release(shedder, make_event("c")) == ADMIT
+
+
+def test_refill_never_exceeds_burst(clock):
+    shedder = make_shedder(rate=1.0, burst=2)
+    admit_and_release(shedder, make_event("a"))
+    clock.advance(3600)
+    results = [admit_and_release(shedder, make_event(f"b{i}")) for i in range(3)]
+    assert results == [ADMIT, ADMIT, RATE_LIMITED]
+
+
+def test_buckets_are_per_user(clock):
+    shedder = make_shedder(rate=0.0, burst=1)
+    assert admit_and_release(shedder, make_event("a", user_id="U1")) == ADMIT
+    assert admit_and_release(shedder, make_event("a", user_id="U1")) == RATE_LIMITED
+    assert admit_and_release(shedder, make_event("a", user_id="U2")) == ADMIT
+
+
+def test_duplicate_text_is_dropped_without_spending_a_token(clock):
+    shedder = make_shedder(rate=0.0, burst=2, dedupe_seconds=5.0)
+    assert admit_and_release(shedder, make_event("確認")) == ADMIT
+    clock.advance(1)
+    assert admit_and_release(shedder, make_event("確認")) == DUPLICATE
+    # 連投の間は時刻が更新され続ける
+    clock.advance(4.5)
+    assert admit_and_release(shedder, make_event("確認")) == DUPLICATE
+    clock.advance(6)
+    assert admit_and_release(shedder, make_event("確認")) == ADMIT
+    assert admit_and_release(shedder, make_event("注文")) == RATE_LIMITED
+
+
+def test_overloaded_when_no_slot_is_free(clock):
+    shedder = make_shedder(burst=10, max_concurrency=1)
+    assert shedder.admit(make_event("a", user_id="U1")) == ADMIT
+    assert shedder.admit(make_event("a", user_id="U2")) == OVERLOADED
+    shedder.release()
+    assert admit_and_release(shedder, make_event("a", user_id="U2")) == ADMIT
+
+
+def test_overloaded_does_not_spend_a_token(clock):
+    shedder = make_shedder(rate=0.0, burst=1, max_concurrency=1)
+    assert shedder.admit(make_event("a", user_id="U1")) == ADMIT
+    assert shedder.admit(make_event("a", user_id="U2")) == OVERLOADED
+    shedder.release()
+    assert admit_and_release(shedder, make_event("a", user_id="U2")) == ADMIT
+
+
+def test_stale_redelivery_is_dropped(clock):
+    shedder = make_shedder(redelivery_max_age=60)
+    assert shedder.admit(make_event("a", redelivery=True, age=120)) == STALE_REDELIVERY
+    assert admit_and_release(shedder, make_event("a", redelivery=True, age=10)) == ADMIT
+    # 再送でなければ古くても受け付ける
+    assert admit_and_release(shedder, make_event("b", age=120)) == ADMIT
+
+
+def test_should_reply_once_per_dedupe_window(clock):
+    shedder = make_shedder(rate=0.0, burst=0, dedupe_seconds=10.0)
+    event = make_event("a")
+    assert shedder.admit(event) == RATE_LIMITED
+    assert shedder.should_reply(event, RATE_LIMITED)
+    assert not shedder.should_reply(event, RATE_LIMITED)
+    clock.advance(11)
+    assert shedder.should_reply(event, RATE_LIMITED)
+    assert not shedder.should_reply(event, DUPLICATE)
+
+
+def test_tracked_users_are_bounded(clock):
+    shedder = LoadShedder(1.0, 1, 100, 0.0, 60, max_users=2)
+    for user_id in ("U1", "U2", "U3"):
+        admit_and_release(shedder, make_event("a", user_id=user_id))
+    assert shedder.snapshot()["tracked_users"] == 2
@@ -0,0 +1,36 @@
+# utils.log_utils の構造化ログ（JSON の1行と log_context の項目）のテスト
+import json
+import logging
+
+from utils.log_utils import ContextFilter, JsonFormatter, RedactingFilter, log_context
+
+
+def format_record(message, *args, **extra):
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, message, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    ContextFilter().filter(record)
+    RedactingFilter().filter(record)
+    return json.loads(JsonFormatter().format(record))
+
+
+def test_context_fields_are_added():
+    with log_context(request_id="req-1"):
+        with log_context(event_type="message"):
+            entry = format_record("event handled", latency_ms=1.5)
+    assert entry["msg"] == "event handled"
+    assert entry["request_id"] == "req-1"
+    assert entry["event_type"] == "message"
+    assert entry["latency_ms"] == 1.5
+
+
+def test_context_is_cleared_after_with():
+    with log_context(request_id="req-1"):
+        pass
+    entry = format_record("after")
+    assert "request_id" not in entry
+
+
+def test_message_is_redacted():
+    entry = format_record("user %s", "U" + "a" * 32)
+    assert entry["msg"] == "user U***aaaa"
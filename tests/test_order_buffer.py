@@ -0,0 +1,150 @@
+# utils.order_buffer.OrderWriteBuffer（注文のグループコミット）のテスト
+import threading
+import time
+
+from utils.order_buffer import DB_ERROR, TIMEOUT_ERROR, OrderWriteBuffer
+
+
+class FakeWriter:
+    """
+    write_batch の代わり。呼ばれた依頼のまとまりを記録し、依頼ごとに {"success": line_user_id} を返す。
+    gate を閉じておくと、開くまで書き込み（=最初のまとめ書き込み）を止めておける。
+    """
+
+    def __init__(self, fail=None):
+        self.batches = []
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = fail or (lambda requests: False)
+
+    def __call__(self, requests):
+        self.calls += 1
+        self.gate.wait()
+        self.batches.append([line_user_id for line_user_id, _ in requests])
+        if self.fail(requests):
+            raise RuntimeError("write failed")
+        return [{"success": line_user_id} for line_user_id, _ in requests]
+
+
+def submit_all(buffer, line_user_ids, items=("item",)):
+    """各依頼を別スレッドで submit し、{line_user_id: 結果} を返すスレッドを起動する。"""
+    results = {}
+
+    def worker(line_user_id):
+        results[line_user_id] = buffer.submit(line_user_id, list(items))
+
+    threads = [threading.Thread(target=worker, args=(line_user_id,)) for line_user_id in line_user_ids]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def hold_first_flush(buffer, writer):
+    """1件目の書き込みを止め、その間に来た依頼がキューに溜まるようにする。"""
+    writer.gate.clear()
+    threads, results = submit_all(buffer, ["first"])
+    wait_until(lambda: writer.calls == 1)
+    return threads, results
+
+
+def test_single_request_is_written_and_answered():
+    writer = FakeWriter()
+    buffer = OrderWriteBuffer(writer, max_wait=0.001)
+    assert buffer.submit("U1", ["item"]) == {"success": "U1"}
+    assert writer.batches == [["U1"]]
+
+
+def test_queued_requests_share_one_transaction():
+    writer = FakeWriter()
+    buffer = OrderWriteBuffer(writer, max_batch=50, max_wait=0.001)
+    first_threads, first_results = hold_first_flush(buffer, writer)
+
+    users = [f"U{i}" for i in range(5)]
+    threads, results = submit_all(buffer, users)
+    wait_until(lambda: buffer.queue_size() == len(users))
+    writer.gate.set()
+    for thread in first_threads + threads:
+        thread.join(2)
+
+    assert writer.batches[0] == ["first"]
+    assert sorted(writer.batches[1]) == users
+    # 結果は依頼した本人に返る
+    assert first_results == {"first": {"success": "first"}}
+    assert results == {user: {"success": user} for user in users}
+
+
+def test_batches_are_capped_at_max_batch():
+    writer = FakeWriter()
+    buffer = OrderWriteBuffer(writer, max_batch=3, max_wait=0.001)
+    first_threads, _ = hold_first_flush(buffer, writer)
+
+    users = [f"U{i}" for i in range(7)]
+    threads, results = submit_all(buffer, users)
+    wait_until(lambda: buffer.queue_size() == len(users))
+    writer.gate.set()
+    for thread in first_threads + threads:
+        thread.join(2)
+
+    assert [len(batch) for batch in writer.batches] == [1, 3, 3, 1]
+    assert len(results) == len(users)
+
+
+def test_failed_batch_falls_back_to_one_by_one():
+    # まとめて書くと失敗し、U_bad だけは1件でも失敗する
+    writer = FakeWriter(fail=lambda requests: len(requests) > 1 or requests[0][0] == "U_bad")
+    buffer = OrderWriteBuffer(writer, max_wait=0.001)
+    first_threads, _ = hold_first_flush(buffer, writer)
+
+    users = ["U1", "U_bad", "U2"]
+    threads, results = submit_all(buffer, users)
+    wait_until(lambda: buffer.queue_size() == len(users))
+    writer.gate.set()
+    for thread in first_threads + threads:
+        thread.join(2)
+
+    assert results == {"U1": {"success": "U1"}, "U_bad": {"error": DB_ERROR}, "U2": {"success": "U2"}}
+    assert buffer.snapshot()["fallbacks"] == 1
+
+
+def test_caller_gives_up_after_timeout():
+    writer = FakeWriter()
+    buffer = OrderWriteBuffer(writer, max_wait=0.001, timeout=0.05)
+    writer.gate.clear()
+    try:
+        assert buffer.submit("U1", ["item"]) == {"error": TIMEOUT_ERROR}
+        assert buffer.snapshot()["timeouts"] == 1
+    finally:
+        writer.gate.set()
+
+
+def test_unexpected_error_answers_every_caller_and_keeps_running():
+    writer = FakeWriter()
+    # 結果のリストを返さない（想定外の戻り値）-> 書き込みスレッドの例外処理で DB_ERROR を返す
+    buffer = OrderWriteBuffer(lambda requests: None, max_wait=0.001, timeout=1.0)
+    assert buffer.submit("U1", ["item"]) == {"error": DB_ERROR}
+    # 書き込みスレッドは止まらない
+    buffer.write_batch = writer
+    assert buffer.submit("U2", ["item"]) == {"success": "U2"}
+
+
+def test_snapshot_metrics():
+    writer = FakeWriter()
+    buffer = OrderWriteBuffer(writer, max_wait=0.001)
+    buffer.submit("U1", ["a", "b"])
+    buffer.submit("U2", ["c"])
+    metrics = buffer.snapshot()
+    assert metrics["flushes"] == 2
+    assert metrics["requests"] == 2
+    assert metrics["orders"] == 3
+    assert metrics["batch_size"]["le_1"] == 2
+    assert metrics["batch_size_avg"] == 1.0
+    assert metrics["queued"] == 0
+    assert "flush_ms_total" not in metrics
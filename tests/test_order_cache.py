@@ -0,0 +1,127 @@
+# utils.order_cache.UpcomingOrderCache（確認・キャンセル）のテスト（メモリ上の SQLite を使う）
+from datetime import datetime, time, timedelta
+
+import pytest
+
+import constants
+from utils.date_utils import JST, today_jst
+from utils.order_cache import UpcomingOrderCache
+
+USER = "U" + "1" * 32
+OTHER_USER = "U" + "2" * 32
+
+
+def add_user(db, line_user_id):
+    db.execute_sql("INSERT INTO users (user_line_id) VALUES (%s)", (line_user_id,))
+    return db.execute_sql(
+        "SELECT user_id FROM users WHERE user_line_id = %s", (line_user_id,), fetch=True
+    )[0]["user_id"]
+
+
+def add_order(db, user_id, order_date, product_name="幕の内弁当"):
+    rows = db.execute_sql(
+        """
+        INSERT INTO orders (user_id, product_id, product_name, quantity, unit_price, total_amount, order_date)
+        VALUES (%s, '1', %s, 1, 500, 500, %s)
+        RETURNING order_id
+        """,
+        (user_id, product_name, order_date),
+        fetch=True,
+    )
+    return rows[0]["order_id"]
+
+
+def is_cancelled(db, order_id):
+    rows = db.execute_sql(
+        "SELECT order_deleted_at FROM orders WHERE order_id = %s", (order_id,), fetch=True
+    )
+    return rows[0]["order_deleted_at"] is not None
+
+
+@pytest.fixture
+def orders(sqlite_db):
+    """USER に明日・3日後の注文、OTHER_USER に明日の注文を入れる。"""
+    user_id = add_user(sqlite_db, USER)
+    other_id = add_user(sqlite_db, OTHER_USER)
+    tomorrow = today_jst() + timedelta(days=1)
+    return {
+        "later": add_order(sqlite_db, user_id, tomorrow + timedelta(days=2), "ハンバーグ丼"),
+        "tomorrow": add_order(sqlite_db, user_id, tomorrow),
+        "other": add_order(sqlite_db, other_id, tomorrow),
+        "user_id": user_id,
+    }
+
+
+def test_get_returns_upcoming_orders_in_date_order(sqlite_db, orders):
+    cache = UpcomingOrderCache()
+    result = cache.get(USER)
+    assert [order["order_id"] for order in result] == [orders["tomorrow"], orders["later"]]
+    assert result[0]["product_name"] == "幕の内弁当"
+    assert result[0]["options"] == ""
+
+
+def test_get_is_served_from_cache_until_invalidated(sqlite_db, orders):
+    cache = UpcomingOrderCache()
+    assert len(cache.get(USER)) == 2
+
+    new_id = add_order(sqlite_db, orders["user_id"], today_jst() + timedelta(days=5))
+    assert len(cache.get(USER)) == 2
+
+    cache.invalidate(USER)
+    assert [order["order_id"] for order in cache.get(USER)][-1] == new_id
+
+
+def test_cancel_by_order_id(sqlite_db, orders):
+    cache = UpcomingOrderCache()
+    cache.get(USER)
+
+    result = cache.cancel(USER, orders["later"])
+    assert result["success"]
+    assert result["order"]["order_id"] == orders["later"]
+    assert is_cancelled(sqlite_db, orders["later"])
+    assert not is_cancelled(sqlite_db, orders["tomorrow"])
+    # キャッシュからもその場で外れる
+    assert [order["order_id"] for order in cache.get(USER)] == [orders["tomorrow"]]
+
+
+def test_cancel_finds_order_written_after_cache_was_loaded(sqlite_db, orders):
+    # 他のワーカーで注文した直後など、キャッシュにない注文番号は読み直して探す
+    cache = UpcomingOrderCache()
+    cache.get(USER)
+    new_id = add_order(sqlite_db, orders["user_id"], today_jst() + timedelta(days=4))
+
+    assert cache.cancel(USER, new_id)["success"]
+    assert is_cancelled(sqlite_db, new_id)
+
+
+def test_cancel_unknown_or_other_users_order(sqlite_db, orders):
+    cache = UpcomingOrderCache()
+    assert "見つかりません" in cache.cancel(USER, 999999)["error"]
+    assert "見つかりません" in cache.cancel(USER, orders["other"])["error"]
+    assert not is_cancelled(sqlite_db, orders["other"])
+
+
+def test_cancel_already_cancelled_elsewhere(sqlite_db, orders):
+    cache = UpcomingOrderCache()
+    cache.get(USER)
+    # 別のワーカーでキャンセルされた（このワーカーのキャッシュは古い）
+    sqlite_db.execute_sql(
+        "UPDATE orders SET order_deleted_at = NOW() WHERE order_id = %s", (orders["tomorrow"],)
+    )
+
+    assert "すでにキャンセル" in cache.cancel(USER, orders["tomorrow"])["error"]
+    assert [order["order_id"] for order in cache.get(USER)] == [orders["later"]]
+
+
+def test_cancel_respects_order_deadline(sqlite_db, orders):
+    today = today_jst()
+    todays_order = add_order(sqlite_db, orders["user_id"], today)
+    before_deadline = datetime.combine(today, time(constants.ORDER_DEADLINE_HOUR - 1), JST)
+    after_deadline = datetime.combine(today, time(constants.ORDER_DEADLINE_HOUR), JST)
+    cache = UpcomingOrderCache()
+
+    assert "締め切り" in cache.cancel(USER, todays_order, now=after_deadline)["error"]
+    assert not is_cancelled(sqlite_db, todays_order)
+
+    assert cache.cancel(USER, todays_order, now=before_deadline)["success"]
+    assert is_cancelled(sqlite_db, todays_order)
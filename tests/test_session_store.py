@@ -0,0 +1,108 @@
+# utils.session_store.DbSessionInterface（保存・有効期限・遅延延長）のテスト（メモリ上の SQLite を使う）
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask, session
+
+from utils.session_store import DbSessionInterface
+
+LIFETIME_MINUTES = 60
+
+
+@pytest.fixture
+def app(sqlite_db):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    # キャッシュを効かせずに毎回 sessions テーブルを読む
+    app.session_interface = DbSessionInterface(lifetime_minutes=LIFETIME_MINUTES, cache_ttl=-1)
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        session["value"] = value
+        return "ok"
+
+    @app.route("/get")
+    def get_value():
+        return session.get("value", "")
+
+    @app.route("/clear")
+    def clear():
+        session.clear()
+        return "ok"
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def session_rows(db):
+    return db.execute_sql("SELECT session_id, expires_at FROM sessions", fetch=True)
+
+
+def set_expires_at(db, session_id, expires_at):
+    db.execute_sql(
+        "UPDATE sessions SET expires_at = %s WHERE session_id = %s", (expires_at, session_id)
+    )
+
+
+def cookie_value(client, app):
+    cookie = client.get_cookie(app.config["SESSION_COOKIE_NAME"])
+    return cookie.value if cookie else None
+
+
+def test_new_session_is_stored_and_read_back(sqlite_db, app, client):
+    response = client.get("/set/hello")
+    assert "Set-Cookie" in response.headers
+
+    rows = session_rows(sqlite_db)
+    assert len(rows) == 1
+    assert rows[0]["session_id"] == cookie_value(client, app)
+    assert client.get("/get").get_data(as_text=True) == "hello"
+
+
+def test_untouched_session_does_not_create_row_or_cookie(sqlite_db, client):
+    response = client.get("/get")
+    assert "Set-Cookie" not in response.headers
+    assert session_rows(sqlite_db) == []
+
+
+def test_expired_session_is_not_loaded(sqlite_db, app, client):
+    client.get("/set/hello")
+    session_id = cookie_value(client, app)
+    set_expires_at(sqlite_db, session_id, datetime.now(timezone.utc) - timedelta(minutes=1))
+
+    assert client.get("/get").get_data(as_text=True) == ""
+
+
+def test_expiry_is_not_extended_while_more_than_half_remains(sqlite_db, client):
+    client.get("/set/hello")
+    before = session_rows(sqlite_db)[0]["expires_at"]
+
+    response = client.get("/get")
+    assert "Set-Cookie" not in response.headers
+    assert session_rows(sqlite_db)[0]["expires_at"] == before
+
+
+def test_expiry_is_extended_when_less_than_half_remains(sqlite_db, app, client):
+    client.get("/set/hello")
+    session_id = cookie_value(client, app)
+    soon = datetime.now(timezone.utc) + timedelta(minutes=LIFETIME_MINUTES // 2 - 5)
+    set_expires_at(sqlite_db, session_id, soon)
+
+    response = client.get("/get")
+    assert "Set-Cookie" in response.headers
+    extended = session_rows(sqlite_db)[0]["expires_at"]
+    assert extended - soon > timedelta(minutes=5)
+    assert cookie_value(client, app) == session_id
+
+
+def test_cleared_session_deletes_row_and_cookie(sqlite_db, app, client):
+    client.get("/set/hello")
+    assert len(session_rows(sqlite_db)) == 1
+
+    client.get("/clear")
+    assert session_rows(sqlite_db) == []
+    assert cookie_value(client, app) is None
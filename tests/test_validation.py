@@ -0,0 +1,159 @@
+# utils.validation.parse_and_validate_order_text（複数日まとめての注文メッセージ）のテスト
+from datetime import date, datetime
+
+import pytest
+
+import constants
+from utils.catalog import Catalog
+from utils.date_utils import JST
+from utils.validation import parse_and_validate_order_text
+
+# 2026-10-19 は月曜日。締め切り（9時）前なので今日から注文できる
+BEFORE_DEADLINE = datetime(2026, 10, 19, 8, 0, tzinfo=JST)
+AFTER_DEADLINE = datetime(2026, 10, 19, 10, 0, tzinfo=JST)
+
+
+def product(product_id, name, price, schedule_type=constants.SCHEDULE_TYPE_DAILY, schedule_day=None):
+    return {
+        "product_id": product_id,
+        "product_name": name,
+        "price": price,
+        "schedule_type": schedule_type,
+        "schedule_day": schedule_day,
+    }
+
+
+@pytest.fixture
+def catalog():
+    return Catalog(
+        products=[
+            product(1, "幕の内弁当", 600),
+            product(2, "幕の内ミニ", 450),
+            product(3, "日替わり弁当", 500),
+            product(4, "ハンバーグ丼", 550, constants.SCHEDULE_TYPE_WEEKLY, constants.SCHEDULE_TUE),
+        ],
+        holidays=frozenset({date(2026, 10, 21)}),
+        versions={"products": 1, "holidays": 1},
+    )
+
+
+def parse(text, catalog, now=BEFORE_DEADLINE):
+    return parse_and_validate_order_text(text, catalog, now=now)
+
+
+def summary(result):
+    assert "error" not in result, result
+    return [(item["order_date"], item["product_id"], item["quantity"]) for item in result["data"]]
+
+
+# ---------------------------------------
+# 日付（曜日・M/D）
+# ---------------------------------------
+def test_weekday_resolves_to_next_occurrence(catalog):
+    assert summary(parse("注文 月 日替わり弁当", catalog)) == [(date(2026, 10, 19), 3, 1)]
+    assert summary(parse("注文 木 日替わり弁当", catalog)) == [(date(2026, 10, 22), 3, 1)]
+
+
+def test_weekday_after_deadline_skips_today(catalog):
+    result = parse("注文 月 日替わり弁当", catalog, now=AFTER_DEADLINE)
+    assert summary(result) == [(date(2026, 10, 26), 3, 1)]
+
+
+def test_weekday_with_suffix(catalog):
+    assert summary(parse("注文 火曜日 ハンバーグ丼", catalog)) == [(date(2026, 10, 20), 4, 1)]
+    assert summary(parse("注文 金曜 日替わり弁当", catalog)) == [(date(2026, 10, 23), 3, 1)]
+
+
+def test_month_day(catalog):
+    assert summary(parse("注文 10/22 日替わり弁当", catalog)) == [(date(2026, 10, 22), 3, 1)]
+
+
+def test_month_day_rolls_over_the_year(catalog):
+    now = datetime(2026, 12, 28, 8, 0, tzinfo=JST)
+    assert summary(parse("注文 1/5 日替わり弁当", catalog, now=now)) == [(date(2027, 1, 5), 3, 1)]
+
+
+@pytest.mark.parametrize("day_text", ["12/1", "10/18", "2/30", "あした"])
+def test_day_outside_window_or_unknown(catalog, day_text):
+    result = parse(f"注文 {day_text} 日替わり弁当", catalog)
+    assert "注文できる日ではありません" in result["error"]
+
+
+def test_holiday_and_weekend(catalog):
+    assert "お休み" in parse("注文 水 日替わり弁当", catalog)["error"]
+    assert "商品がありません" in parse("注文 土 日替わり弁当", catalog)["error"]
+
+
+# ---------------------------------------
+# 複数日（「/」・改行区切り）
+# ---------------------------------------
+def test_multiple_days_are_sorted(catalog):
+    result = parse("注文 木 幕の内弁当 / 火 ハンバーグ丼 2\n月 日替わり弁当", catalog)
+    assert summary(result) == [
+        (date(2026, 10, 19), 3, 1),
+        (date(2026, 10, 20), 4, 2),
+        (date(2026, 10, 22), 1, 1),
+    ]
+
+
+def test_month_day_slash_is_not_a_separator(catalog):
+    result = parse("注文 10/22 日替わり弁当 / 10/23 幕の内弁当", catalog)
+    assert summary(result) == [(date(2026, 10, 22), 3, 1), (date(2026, 10, 23), 1, 1)]
+
+
+def test_same_day_twice(catalog):
+    result = parse("注文 月 日替わり弁当 / 10/19 幕の内弁当", catalog)
+    assert summary(result) == [(date(2026, 10, 19), 3, 1), (date(2026, 10, 19), 1, 1)]
+
+
+@pytest.mark.parametrize("text", ["注文", "注文 月", "注文 月 日替わり弁当 1 個"])
+def test_malformed_segment(catalog, text):
+    assert "error" in parse(text, catalog)
+
+
+# ---------------------------------------
+# 商品名（完全一致 -> 前方一致 -> 部分一致）
+# ---------------------------------------
+def test_prefix_match(catalog):
+    assert summary(parse("注文 月 日替", catalog)) == [(date(2026, 10, 19), 3, 1)]
+
+
+def test_partial_match(catalog):
+    assert summary(parse("注文 月 ミニ", catalog)) == [(date(2026, 10, 19), 2, 1)]
+
+
+def test_exact_match_wins_over_prefix(catalog):
+    assert summary(parse("注文 月 幕の内弁当", catalog)) == [(date(2026, 10, 19), 1, 1)]
+
+
+def test_ambiguous_prefix(catalog):
+    error = parse("注文 月 幕の内", catalog)["error"]
+    assert "複数あります" in error
+    assert "幕の内弁当" in error and "幕の内ミニ" in error
+
+
+def test_product_not_sold_that_day(catalog):
+    assert "販売していません" in parse("注文 月 ハンバーグ丼", catalog)["error"]
+
+
+def test_price_and_name_come_from_catalog(catalog):
+    item = parse("注文 火 ハンバーグ", catalog)["data"][0]
+    assert item["product_name"] == "ハンバーグ丼"
+    assert item["unit_price"] == 550
+
+
+# ---------------------------------------
+# 個数
+# ---------------------------------------
+@pytest.mark.parametrize("quantity_text, quantity", [("2", 2), ("×3", 3), ("x4", 4), ("5個", 5), ("２", 2)])
+def test_quantity(catalog, quantity_text, quantity):
+    assert summary(parse(f"注文 月 日替わり弁当 {quantity_text}", catalog)) == [(date(2026, 10, 19), 3, quantity)]
+
+
+@pytest.mark.parametrize("quantity_text", ["0", "6", "たくさん", "-1"])
+def test_invalid_quantity(catalog, quantity_text):
+    assert "個数は1から5" in parse(f"注文 月 日替わり弁当 {quantity_text}", catalog)["error"]
+
+
+def test_fullwidth_input_is_normalized(catalog):
+    assert summary(parse("注文　１０／２２　日替わり弁当", catalog)) == [(date(2026, 10, 22), 3, 1)]
@@ -0,0 +1,229 @@
+# 論理削除された行のアーカイブ（archive スキーマへの移動）と復元用ファイル
+#   1バッチ = 1トランザクション。FOR UPDATE SKIP LOCKED で対象を batch_size 行ずつ取り、
+#   option_details -> orders -> users の順に archive.* へ移す。
+import logging
+
+from utils.db_utils import transaction
+
+logger = logging.getLogger(__name__)
+
+# 元テーブルの列（restore で archived_at を除いて戻すため明示する）
+USER_COLUMNS = (
+    "user_id, user_line_id, user_email, user_password_hash, user_type, "
+    "user_grade, user_class, user_last_name, user_first_name, user_line_name, "
+    "user_email_verified_at, user_registered_at, user_updated_at, "
+    "user_notification_stopped_at, user_deleted_at"
+)
+ORDER_COLUMNS = (
+    "order_id, user_id, product_id, product_name, quantity, unit_price, has_options, "
+    "option_total_amount, total_amount, order_date, "
+    "order_received_at, order_updated_at, order_deleted_at"
+)
+OPTION_COLUMNS = "option_detail_id, order_id, order_date, option_name, option_value, price"
+
+# ---------------------------------------------------------
+# アーカイブ（保持期間を過ぎた論理削除行）
+# ---------------------------------------------------------
+# キャンセルされた注文とそのオプション
+ARCHIVE_ORDERS_SQL = f"""
+WITH batch AS (
+    SELECT o.order_id, o.order_date FROM orders o
+    WHERE o.order_deleted_at < NOW() - make_interval(days => %(retention_days)s)
+      -- 復元した注文は、復元から保持期間が過ぎるまで戻さない
+      AND NOT EXISTS (
+          SELECT 1 FROM archive.restored_orders r
+          WHERE r.order_id = o.order_id AND r.order_date = o.order_date
+            AND r.restored_at >= NOW() - make_interval(days => %(retention_days)s)
+      )
+    ORDER BY o.order_deleted_at
+    LIMIT %(batch_size)s
+    FOR UPDATE SKIP LOCKED
+),
+forgotten_restores AS (
+    DELETE FROM archive.restored_orders r USING batch b
+    WHERE r.order_id = b.order_id AND r.order_date = b.order_date
+),
+moved_options AS (
+    DELETE FROM option_details od USING batch b
+    WHERE od.order_id = b.order_id AND od.order_date = b.order_date
+    RETURNING {", ".join("od." + c for c in OPTION_COLUMNS.split(", "))}
+),
+archived_options AS (
+    INSERT INTO archive.option_details ({OPTION_COLUMNS})
+    SELECT {OPTION_COLUMNS} FROM moved_options
+),
+moved AS (
+    DELETE FROM orders o USING batch b
+    WHERE o.order_id = b.order_id AND o.order_date = b.order_date
+    RETURNING {", ".join("o." + c for c in ORDER_COLUMNS.split(", "))}
+),
+archived AS (
+    INSERT INTO archive.orders ({ORDER_COLUMNS})
+    SELECT {ORDER_COLUMNS} FROM moved
+    RETURNING 1
+)
+SELECT COUNT(*) FROM archived
+"""
+
+# 削除された利用者（卒業生など）は、注文（キャンセルされていないものも含む）ごと移す
+ARCHIVE_USERS_SQL = f"""
+WITH batch AS (
+    SELECT user_id FROM users
+    WHERE user_deleted_at < NOW() - make_interval(days => %(retention_days)s)
+    ORDER BY user_deleted_at
+    LIMIT %(batch_size)s
+    FOR UPDATE SKIP LOCKED
+),
+moved_options AS (
+    DELETE FROM option_details od USING orders o, batch b
+    WHERE o.user_id = b.user_id
+      AND od.order_id = o.order_id AND od.order_date = o.order_date
+    RETURNING {", ".join("od." + c for c in OPTION_COLUMNS.split(", "))}
+),
+archived_options AS (
+    INSERT INTO archive.option_details ({OPTION_COLUMNS})
+    SELECT {OPTION_COLUMNS} FROM moved_options
+),
+moved_orders AS (
+    DELETE FROM orders o USING batch b
+    WHERE o.user_id = b.user_id
+    RETURNING {", ".join("o." + c for c in ORDER_COLUMNS.split(", "))}
+),
+archived_orders AS (
+    INSERT INTO archive.orders ({ORDER_COLUMNS})
+    SELECT {ORDER_COLUMNS} FROM moved_orders
+),
+deleted_tokens AS (
+    DELETE FROM auth_tokens t USING batch b WHERE t.user_id = b.user_id
+),
+moved AS (
+    DELETE FROM users u USING batch b
+    WHERE u.user_id = b.user_id
+    RETURNING {", ".join("u." + c for c in USER_COLUMNS.split(", "))}
+),
+archived AS (
+    INSERT INTO archive.users ({USER_COLUMNS})
+    SELECT {USER_COLUMNS} FROM moved
+    RETURNING 1
+)
+SELECT COUNT(*) FROM archived
+"""
+
+
+def _archive_batches(sql, retention_days, batch_size, max_batches):
+    """1バッチ1トランザクションで、対象がなくなる（batch_size 未満になる）まで繰り返す。"""
+    total = 0
+    for _ in range(max_batches):
+        with transaction() as cursor:
+            cursor.execute(sql, {"retention_days": retention_days, "batch_size": batch_size})
+            moved = cursor.fetchone()[0]
+        total += moved
+        if moved < batch_size:
+            break
+    return total
+
+
+def archive_soft_deleted(retention_days=365, batch_size=500, max_batches=1000):
+    """
+    論理削除から retention_days 日を過ぎた注文・利用者を archive スキーマへ移す。
+    戻り値: {"success": True, "orders": 件数, "users": 件数} または {"error": ...}
+    途中で失敗した場合も、それまでにコミットしたバッチは移動済みのまま残る。
+    """
+    try:
+        orders = _archive_batches(ARCHIVE_ORDERS_SQL, retention_days, batch_size, max_batches)
+        users = _archive_batches(ARCHIVE_USERS_SQL, retention_days, batch_size, max_batches)
+    except Exception as e:
+        logger.error("!!! アーカイブ処理に失敗しました: %s !!!", e)
+        return {"error": str(e)}
+    return {"success": True, "orders": orders, "users": users}
+
+
+# ---------------------------------------------------------
+# 復元（archive スキーマから現行テーブルへ戻す）
+# ---------------------------------------------------------
+# 利用者は削除を取り消して戻す（user_deleted_at を NULL にするので、次のアーカイブでは移らない）
+RESTORE_USER_SQL = f"""
+WITH moved AS (
+    DELETE FROM archive.users WHERE user_id = %s RETURNING {USER_COLUMNS}
+)
+INSERT INTO users ({USER_COLUMNS})
+SELECT
+    user_id, user_line_id, user_email, user_password_hash, user_type,
+    user_grade, user_class, user_last_name, user_first_name, user_line_name,
+    user_email_verified_at, user_registered_at, NOW(),
+    user_notification_stopped_at, NULL
+FROM moved
+"""
+
+# 注文はキャンセル（order_deleted_at）を残したまま戻し、キャンセル済みのものは復元時刻を記録する
+RESTORE_ORDERS_SQL = f"""
+WITH moved AS (
+    DELETE FROM archive.orders WHERE {{where}} RETURNING {ORDER_COLUMNS}
+),
+restored AS (
+    INSERT INTO orders ({ORDER_COLUMNS}) SELECT {ORDER_COLUMNS} FROM moved
+    RETURNING order_id, order_date, order_deleted_at
+),
+stamped AS (
+    INSERT INTO archive.restored_orders (order_id, order_date)
+    SELECT order_id, order_date FROM restored WHERE order_deleted_at IS NOT NULL
+    ON CONFLICT (order_id, order_date) DO UPDATE SET restored_at = NOW()
+)
+SELECT order_id, order_date FROM restored
+"""
+
+RESTORE_OPTIONS_SQL = f"""
+WITH moved AS (
+    DELETE FROM archive.option_details od
+    WHERE (od.order_id, od.order_date) IN (SELECT * FROM unnest(%s::INTEGER[], %s::DATE[]))
+    RETURNING {", ".join("od." + c for c in OPTION_COLUMNS.split(", "))}
+)
+INSERT INTO option_details ({OPTION_COLUMNS}) SELECT {OPTION_COLUMNS} FROM moved
+"""
+
+
+def _restore_orders(cursor, where, params):
+    cursor.execute(RESTORE_ORDERS_SQL.format(where=where), params)
+    keys = cursor.fetchall()
+    if keys:
+        # option_details は orders を参照しているため、注文を戻してから戻す
+        cursor.execute(
+            RESTORE_OPTIONS_SQL,
+            ([key[0] for key in keys], [key[1] for key in keys]),
+        )
+    return len(keys)
+
+
+def restore_user(user_id):
+    """
+    アーカイブされた利用者と、その注文・オプションを現行テーブルに戻す。
+    利用者は削除を取り消す（user_deleted_at を NULL にする）。注文は restore_order() と同じ扱い。
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute(RESTORE_USER_SQL, (user_id,))
+            if cursor.rowcount == 0:
+                return {"error": f"user_id={user_id} はアーカイブにありません。"}
+            orders = _restore_orders(cursor, "user_id = %s", (user_id,))
+    except Exception as e:
+        # user_line_id が再登録で使われている場合など
+        logger.error("!!! 利用者の復元に失敗しました: %s !!!", e)
+        return {"error": str(e)}
+    return {"success": True, "users": 1, "orders": orders}
+
+
+def restore_order(order_id):
+    """
+    アーカイブされた注文（とオプション）を現行テーブルに戻す。利用者は現行テーブルに必要。
+    キャンセルは取り消さない（order_deleted_at はそのまま）。代わりに復元時刻を
+    archive.restored_orders に記録し、復元から保持期間が過ぎるまではアーカイブしない。
+    """
+    try:
+        with transaction() as cursor:
+            orders = _restore_orders(cursor, "order_id = %s", (order_id,))
+            if orders == 0:
+                return {"error": f"order_id={order_id} はアーカイブにありません。"}
+    except Exception as e:
+        logger.error("!!! 注文の復元に失敗しました: %s !!!", e)
+        return {"error": str(e)}
+    return {"success": True, "users": 0, "orders": orders}
@@ -0,0 +1,142 @@
+# 静的ファイル（CSS/JS）の配信準備用ファイル
+#   static/ の各ファイルに内容のハッシュを付けた名前で static/dist/ に書き出し、
+#   gzip / brotli で圧縮済みの版も一緒に置いておく（python tasks.py build_assets）。
+#   ファイル名が内容で変わるため、ブラウザには長期間キャッシュさせてよい。
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:  # brotli は任意（無ければ gzip のみ）
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+# 圧縮しておく拡張子（画像などはすでに圧縮済みなので対象外）
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt")
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _fingerprinted_name(rel_path, digest):
+    base, ext = os.path.splitext(rel_path)
+    return f"{base}.{digest}{ext}"
+
+
+def _source_files():
+    """static/ 以下の元ファイル（dist/ を除く）を static/ からの相対パスで返す。"""
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != DIST_DIR]
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            yield os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+
+
+def _scan_sources():
+    """ビルドしていない環境向けに、元ファイルのハッシュだけでマニフェストを作る。"""
+    manifest = {}
+    for rel_path in _source_files():
+        with open(os.path.join(STATIC_DIR, rel_path), "rb") as f:
+            manifest[rel_path] = _fingerprinted_name(rel_path, _fingerprint(f.read()))
+    return manifest
+
+
+# ---------------------------------------
+# ビルド（デプロイ時に1回）
+# ---------------------------------------
+def build_assets():
+    """
+    static/dist/ を作り直し、ハッシュ付きのファイルと .gz / .br、
+    manifest.json（元のパス -> ハッシュ付きのパス）を書き出す。
+    """
+    global _manifest
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    manifest = {}
+    for rel_path in _source_files():
+        with open(os.path.join(STATIC_DIR, rel_path), "rb") as f:
+            data = f.read()
+
+        hashed_path = _fingerprinted_name(rel_path, _fingerprint(data))
+        dest = os.path.join(DIST_DIR, hashed_path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "wb") as f:
+            f.write(data)
+
+        if rel_path.endswith(COMPRESSIBLE_EXTENSIONS):
+            # mtime=0 にして、同じ内容なら同じ .gz になるようにする
+            with open(dest + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(dest + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+
+        manifest[rel_path] = hashed_path
+
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    with _manifest_lock:
+        _manifest = manifest
+    if brotli is None:
+        logger.info("brotli がインストールされていないため .br は作成しませんでした。")
+    return manifest
+
+
+# ---------------------------------------
+# 参照（テンプレートから）
+# ---------------------------------------
+def get_manifest():
+    """manifest.json を一度だけ読み込む。無ければ元ファイルのハッシュから作る。"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                if os.path.exists(MANIFEST_PATH):
+                    with open(MANIFEST_PATH, encoding="utf-8") as f:
+                        _manifest = json.load(f)
+                else:
+                    logger.warning(
+                        "static/dist/manifest.json がありません。python tasks.py build_assets を実行してください。"
+                    )
+                    _manifest = _scan_sources()
+    return _manifest
+
+
+def resolve_asset(hashed_path):
+    """
+    ハッシュ付きのパスに対応するファイルを返す。
+    (ファイルパス, 元のパス) / 見つからなければ None。
+    """
+    for rel_path, candidate in get_manifest().items():
+        if candidate == hashed_path:
+            built = os.path.join(DIST_DIR, hashed_path)
+            if os.path.exists(built):
+                return built, rel_path
+            return os.path.join(STATIC_DIR, rel_path), rel_path
+    return None
+
+
+def asset_url(rel_path):
+    """テンプレート用: {{ asset_url('css/form.css') }} -> /assets/css/form.<hash>.css"""
+    hashed_path = get_manifest().get(rel_path)
+    if hashed_path is None:
+        return url_for("static", filename=rel_path)
+    return url_for("assets.asset", filename=hashed_path)
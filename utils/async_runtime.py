@@ -0,0 +1,36 @@
+# 非同期処理用のイベントループ（プロセスごとに1つ、専用スレッドで動かす）
+import asyncio
+import os
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _reset_loop_after_fork():
+    # 親プロセスのループのスレッドは子プロセスには存在しない
+    global _loop, _loop_lock
+    _loop = None
+    _loop_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_loop_after_fork)
+
+
+def get_loop():
+    """バックグラウンドのイベントループを初回利用時に起動して返す。"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="async-loop", daemon=True
+                ).start()
+                _loop = loop
+    return _loop
+
+
+def submit(coro):
+    """コルーチンをバックグラウンドのループに投入し、concurrent.futures.Future を返す。"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
@@ -0,0 +1,132 @@
+# 月次請求用ファイル
+import logging
+from datetime import date
+from decimal import Decimal
+
+import constants
+from utils.date_utils import today_jst
+from utils.db_utils import execute_prepared, register_statement, transaction
+
+logger = logging.getLogger(__name__)
+
+# 同時に複数の請求処理が走らないためのアドバイザリロックのキー
+BILLING_LOCK_KEY = 20240402
+
+# =========================================================
+# 利用者ごとの月次合計を1回の SQL で集計し、変わった利用者だけ新しい版を追加する
+#   - キャンセル（order_deleted_at）された注文は請求しないが、変更検知には使う
+#   - 前回の版と件数・小計・最終変更時刻のいずれかが違えば再計算対象
+# =========================================================
+BILLING_RUN_SQL = """
+WITH agg AS (
+    SELECT
+        o.user_id,
+        COUNT(*) FILTER (WHERE o.order_deleted_at IS NULL) AS order_count,
+        COALESCE(SUM(o.total_amount) FILTER (WHERE o.order_deleted_at IS NULL), 0) AS subtotal,
+        MAX(GREATEST(o.order_received_at, o.order_updated_at, o.order_deleted_at)) AS source_watermark
+    FROM orders o
+    WHERE o.order_date >= %(month_start)s AND o.order_date < %(month_end)s
+    GROUP BY o.user_id
+),
+latest AS (
+    SELECT DISTINCT ON (user_id)
+        user_id, snapshot_version, order_count, subtotal, source_watermark
+    FROM invoice_snapshots
+    WHERE billing_month = %(month_start)s
+    ORDER BY user_id, snapshot_version DESC
+)
+INSERT INTO invoice_snapshots (
+    user_id, billing_month, snapshot_version, order_count, subtotal,
+    tax_rate, tax_amount, total_amount, source_watermark
+)
+SELECT
+    a.user_id,
+    %(month_start)s,
+    COALESCE(l.snapshot_version, 0) + 1,
+    a.order_count,
+    a.subtotal,
+    %(tax_rate)s,
+    FLOOR(a.subtotal * %(tax_rate)s)::INTEGER,
+    a.subtotal + FLOOR(a.subtotal * %(tax_rate)s)::INTEGER,
+    a.source_watermark
+FROM agg a
+LEFT JOIN latest l ON l.user_id = a.user_id
+WHERE l.user_id IS NULL
+   OR a.order_count <> l.order_count
+   OR a.subtotal <> l.subtotal
+   OR a.source_watermark > COALESCE(l.source_watermark, '-infinity')
+RETURNING user_id
+"""
+
+# 「確認」や管理者の照会は集計し直さず、最新のスナップショットを読む
+# 「確認」では前月・今月の2か月分を1回の問い合わせで読む
+RECENT_INVOICES_SQL = """
+SELECT billing_month, order_count, subtotal, tax_amount, total_amount, snapshot_version
+FROM latest_invoices
+WHERE user_id = %s AND billing_month IN (%s, %s)
+ORDER BY billing_month
+"""
+register_statement("recent_invoices", RECENT_INVOICES_SQL)
+
+MONTH_INVOICES_SQL = """
+SELECT i.user_id, u.user_grade, u.user_class, u.user_last_name, u.user_first_name,
+       i.order_count, i.subtotal, i.tax_amount, i.total_amount, i.snapshot_version
+FROM latest_invoices i
+LEFT JOIN audit_users u ON u.user_id = i.user_id  -- アーカイブ済みの卒業生も名前を出す
+WHERE i.billing_month = %s
+ORDER BY u.user_grade, u.user_class, u.user_last_name, u.user_first_name
+"""
+
+
+def month_range(year, month):
+    """請求月の (1日, 翌月1日) を返す。"""
+    month_start = date(year, month, 1)
+    month_end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return month_start, month_end
+
+
+def run_monthly_billing(year, month):
+    """
+    指定月の請求スナップショットを作成する。
+    戻り値: {"success": True, "updated": 新しい版を作った利用者数} または {"error": "..."}
+    """
+    month_start, month_end = month_range(year, month)
+    params = {
+        "month_start": month_start,
+        "month_end": month_end,
+        "tax_rate": Decimal(str(constants.TAX_RATE)),
+    }
+    try:
+        with transaction() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (BILLING_LOCK_KEY,))
+            cursor.execute(BILLING_RUN_SQL, params)
+            updated = cursor.rowcount
+    except Exception as e:
+        logger.error("請求処理に失敗しました（%s）: %s", month_start, e)
+        return {"error": str(e)}
+
+    logger.info("請求処理完了: %s 更新 %d 件", month_start, updated)
+    return {"success": True, "updated": updated}
+
+
+def get_recent_invoices(user_id, today=None):
+    """
+    利用者の前月・今月の最新スナップショット（古い順）。請求処理がまだの月は含まれない。
+    """
+    months = [date(year, month, 1) for year, month in recent_billing_months(today)]
+    return execute_prepared("recent_invoices", (user_id, *months))
+
+
+def get_month_invoices(year, month):
+    """指定月の全利用者の最新スナップショット（管理者向け照会）。"""
+    return execute_prepared("month_invoices", (date(year, month, 1),))
+
+
+def recent_billing_months(today=None):
+    """「確認」で請求額を見せる月（前月・今月の (年, 月)、古い順）。"""
+    today = today or today_jst()
+    previous = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+    return [previous, (today.year, today.month)]
+
+
+register_statement("month_invoices", MONTH_INVOICES_SQL)
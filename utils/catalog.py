@@ -0,0 +1,114 @@
+# 商品マスタと休日のメモリ上のスナップショット（注文の検証用）
+#   products / holidays を丸ごと読み込み、data_versions のバージョンが変わったときだけ読み直す。
+#   バージョンの確認も CATALOG_CHECK_SECONDS 秒に1回まで（それまでは前回のスナップショットを使う）。
+import threading
+import time
+
+import constants
+from utils.config import get_config
+from utils.data_versions import get_data_versions
+from utils.date_utils import today_jst
+from utils.db_utils import execute_sql
+
+PRODUCTS_SQL = """
+    SELECT product_id, product_name, price, schedule_type, schedule_day
+    FROM products
+    WHERE is_deleted IS NOT TRUE
+    ORDER BY product_id
+"""
+
+# 今日より前の休日は検証に使わない
+HOLIDAYS_SQL = "SELECT holiday_date FROM holidays WHERE holiday_date >= %s"
+
+# date.weekday() -> products.schedule_day
+SCHEDULE_DAYS = (
+    constants.SCHEDULE_MON,
+    constants.SCHEDULE_TUE,
+    constants.SCHEDULE_WED,
+    constants.SCHEDULE_THU,
+    constants.SCHEDULE_FRI,
+    None,
+    None,
+)
+
+
+class Catalog:
+    """ある時点の商品一覧と休日の集合（読み取り専用）。"""
+
+    def __init__(self, products, holidays, versions):
+        self.products = products
+        self.holidays = holidays
+        self.versions = versions
+        # 曜日ごとの販売商品を先に分けておく
+        self._by_weekday = [
+            tuple(
+                p for p in products
+                if p["schedule_type"] == constants.SCHEDULE_TYPE_DAILY
+                or (p["schedule_type"] == constants.SCHEDULE_TYPE_WEEKLY and p["schedule_day"] == day)
+            ) if day else ()
+            for day in SCHEDULE_DAYS
+        ]
+
+    def is_holiday(self, day):
+        return day in self.holidays
+
+    def products_for(self, day):
+        """その日に注文できる商品（休日・土日は空）。"""
+        if self.is_holiday(day):
+            return ()
+        return self._by_weekday[day.weekday()]
+
+
+_catalog = None
+_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _load(versions):
+    products = execute_sql(PRODUCTS_SQL, fetch=True)
+    if "error" in products:
+        return products
+    holidays = execute_sql(HOLIDAYS_SQL, (today_jst(),), fetch=True)
+    if "error" in holidays:
+        return holidays
+    return Catalog(
+        products=[
+            {
+                "product_id": row["product_id"],
+                "product_name": row["product_name"],
+                "price": row["price"],
+                "schedule_type": row["schedule_type"],
+                "schedule_day": row["schedule_day"],
+            }
+            for row in products
+        ],
+        holidays=frozenset(row["holiday_date"] for row in holidays),
+        versions=versions,
+    )
+
+
+def get_catalog():
+    """
+    最新の Catalog を返す。DBエラー時は前回のスナップショット、それもなければ {"error": ...}。
+    """
+    global _catalog, _checked_at
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and now - _checked_at < get_config()["CATALOG_CHECK_SECONDS"]:
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is not None and now - _checked_at < get_config()["CATALOG_CHECK_SECONDS"]:
+            return _catalog
+        versions = get_data_versions()
+        if _catalog is not None and versions is not None and versions == _catalog.versions:
+            _checked_at = now
+            return _catalog
+
+        loaded = _load(versions)
+        if isinstance(loaded, dict):  # {"error": ...}
+            return _catalog if _catalog is not None else loaded
+        # バージョンが取れない（data_versions が無い）場合は毎回読み直す
+        _catalog = loaded
+        _checked_at = now if versions is not None else 0.0
+        return _catalog
@@ -0,0 +1,96 @@
+# 設定読み込み用ファイル
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+_config = None
+
+
+def get_config():
+    """
+    環境変数（.env を含む）を一度だけ読み込み、設定を dict で返す。
+    import 時には読み込まず、最初に必要になった時点で読み込む。
+    """
+    global _config
+    if _config is None:
+        load_dotenv()
+        _config = {
+            "SECRET_KEY": os.environ.get("SECRET_KEY"),
+            "LINE_CHANNEL_ACCESS_TOKEN": os.environ.get("LINE_CHANNEL_ACCESS_TOKEN"),
+            "LINE_CHANNEL_SECRET": os.environ.get("LINE_CHANNEL_SECRET"),
+            # postgres://...（本番）または sqlite:///:memory: / sqlite:///パス（DBサーバーなし）
+            "DATABASE_URL": os.environ.get("DATABASE_URL"),
+            # SQLite のDBを新しく作ったときに流す初期データ（例: insert）
+            "DATABASE_SEED_FILE": os.environ.get("DATABASE_SEED_FILE"),
+            "HOST_URL": os.environ.get("HOST_URL"),
+            # コネクションプールの大きさ（gunicorn のスレッド数以上にする）
+            "DB_POOL_MIN": int(os.environ.get("DB_POOL_MIN", "1")),
+            "DB_POOL_MAX": int(os.environ.get("DB_POOL_MAX", "10")),
+            "DB_CONNECT_TIMEOUT": int(os.environ.get("DB_CONNECT_TIMEOUT", "5")),
+            # プールの接続がすべて使用中のとき、返却を待つ秒数（SHED_MAX_CONCURRENCY > DB_POOL_MAX でも落ちない）
+            "DB_POOL_TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", "5")),
+            # リードレプリカ（未設定ならすべてプライマリ）
+            "DATABASE_REPLICA_URL": os.environ.get("DATABASE_REPLICA_URL"),
+            "REPLICA_STICKY_SECONDS": float(
+                os.environ.get("REPLICA_STICKY_SECONDS", "5")
+            ),
+            # 書き込み直後の印（ファイル）を置く場所。同じホストの全ワーカーで同じパスにする
+            "REPLICA_STICKY_DIR": os.environ.get(
+                "REPLICA_STICKY_DIR",
+                os.path.join(tempfile.gettempdir(), "benriya_replica_sticky"),
+            ),
+            "REPLICA_MAX_LAG_SECONDS": float(
+                os.environ.get("REPLICA_MAX_LAG_SECONDS", "2")
+            ),
+            "REPLICA_LAG_CHECK_INTERVAL": float(
+                os.environ.get("REPLICA_LAG_CHECK_INTERVAL", "5")
+            ),
+            "REPLICA_RETRY_SECONDS": float(os.environ.get("REPLICA_RETRY_SECONDS", "30")),
+            # 非同期 Webhook（1 のとき /webhook はイベントを非同期ループに渡してすぐ返す）
+            "WEBHOOK_ASYNC": os.environ.get("WEBHOOK_ASYNC", "0") == "1",
+            "ASYNC_DB_POOL_MIN": int(os.environ.get("ASYNC_DB_POOL_MIN", "1")),
+            "ASYNC_DB_POOL_MAX": int(os.environ.get("ASYNC_DB_POOL_MAX", "20")),
+            # 過負荷対策（/webhook）
+            "SHED_USER_RATE": float(os.environ.get("SHED_USER_RATE", "0.5")),  # 個/秒
+            "SHED_USER_BURST": int(os.environ.get("SHED_USER_BURST", "5")),
+            "SHED_MAX_CONCURRENCY": int(os.environ.get("SHED_MAX_CONCURRENCY", "32")),
+            "SHED_DEDUPE_SECONDS": float(os.environ.get("SHED_DEDUPE_SECONDS", "10")),
+            "SHED_REDELIVERY_MAX_AGE": float(
+                os.environ.get("SHED_REDELIVERY_MAX_AGE", "300")
+            ),
+            # "reply": 混雑時に定型文を返す / "drop": 何も返さない
+            "SHED_REPLY_MODE": os.environ.get("SHED_REPLY_MODE", "reply"),
+            # /metrics の保護（設定した場合は ?token= が一致するときだけ返す）
+            "METRICS_TOKEN": os.environ.get("METRICS_TOKEN"),
+            # サーバーサイドセッション（sessions テーブル）
+            "SESSION_LIFETIME_MINUTES": int(
+                os.environ.get("SESSION_LIFETIME_MINUTES", "60")
+            ),
+            "SESSION_CACHE_TTL": float(os.environ.get("SESSION_CACHE_TTL", "5")),
+            # ユーザーごとの今後の注文のキャッシュ（確認・キャンセル）
+            "ORDER_CACHE_SIZE": int(os.environ.get("ORDER_CACHE_SIZE", "1000")),
+            "ORDER_CACHE_TTL": float(os.environ.get("ORDER_CACHE_TTL", "60")),
+            # 注文のまとめ書き込み（グループコミット）。締め切り前の混雑時に ORDER_BUFFER=1 にする
+            "ORDER_BUFFER": os.environ.get("ORDER_BUFFER", "0") == "1",
+            "ORDER_BUFFER_MAX_BATCH": int(os.environ.get("ORDER_BUFFER_MAX_BATCH", "50")),
+            "ORDER_BUFFER_MAX_WAIT_MS": float(os.environ.get("ORDER_BUFFER_MAX_WAIT_MS", "5")),
+            "ORDER_BUFFER_TIMEOUT": float(os.environ.get("ORDER_BUFFER_TIMEOUT", "10")),
+            # 商品マスタ・休日のバージョンを確認する間隔（秒）
+            "CATALOG_CHECK_SECONDS": float(os.environ.get("CATALOG_CHECK_SECONDS", "5")),
+            # 日付ごとのメニュー（シリアライズ済み）のキャッシュ。
+            # MENU_CACHE_DIR は全ワーカーと tasks.py prewarm_menus で同じ場所にする
+            "MENU_CACHE_SIZE": int(os.environ.get("MENU_CACHE_SIZE", "32")),
+            "MENU_CACHE_DIR": os.environ.get(
+                "MENU_CACHE_DIR", os.path.join(tempfile.gettempdir(), "benriya_menu_cache")
+            ),
+            # tasks.py prewarm_menus で先に作っておく営業日数
+            "MENU_PREWARM_DAYS": int(os.environ.get("MENU_PREWARM_DAYS", "5")),
+            # テンプレートのバイトコードキャッシュ置き場
+            "JINJA_CACHE_DIR": os.environ.get(
+                "JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "benriya_jinja_cache")
+            ),
+            # ハッシュ付き静的ファイルのキャッシュ期間（秒、既定は1年）
+            "ASSET_MAX_AGE": int(os.environ.get("ASSET_MAX_AGE", str(365 * 24 * 3600))),
+        }
+    return _config
@@ -0,0 +1,24 @@
+# マスタデータのバージョン（data_versions テーブル）参照用ファイル
+from utils.db_utils import execute_prepared, register_statement
+
+DATA_VERSION_SQL = "SELECT version FROM data_versions WHERE name = %s"
+register_statement("data_version", DATA_VERSION_SQL)
+
+
+def get_data_version(name):
+    """テーブル名に対応するバージョン番号を返す。取得できない場合は None。"""
+    rows = execute_prepared("data_version", (name,))
+    if not rows or "error" in rows:
+        return None
+    return rows[0]["version"]
+
+DATA_VERSIONS_ALL_SQL = "SELECT name, version FROM data_versions"
+register_statement("data_versions_all", DATA_VERSIONS_ALL_SQL)
+
+
+def get_data_versions():
+    """{テーブル名: バージョン番号} を1回の問い合わせで返す。取得できない場合は None。"""
+    rows = execute_prepared("data_versions_all")
+    if "error" in rows:
+        return None
+    return {row["name"]: row["version"] for row in rows}
@@ -0,0 +1,51 @@
+# 日付計算用ファイル
+from datetime import date, datetime, timedelta, timezone
+
+import constants
+
+# 日本時間
+JST = timezone(timedelta(hours=9))
+
+
+def today_jst():
+    """日本時間の今日の日付を返す。"""
+    return datetime.now(JST).date()
+
+
+def current_term(today=None):
+    """
+    today を含む学期の (開始日, 終了日) を返す。
+    1学期: 4/1〜8/31、2学期: 9/1〜12/31、3学期: 1/1〜3/31
+    """
+    today = today or today_jst()
+    if 4 <= today.month <= 8:
+        return date(today.year, 4, 1), date(today.year, 8, 31)
+    if today.month >= 9:
+        return date(today.year, 9, 1), date(today.year, 12, 31)
+    return date(today.year, 1, 1), date(today.year, 3, 31)
+
+
+def next_term(today=None):
+    """today を含む学期の次の学期の (開始日, 終了日) を返す。"""
+    _, term_end = current_term(today)
+    return current_term(term_end + timedelta(days=1))
+
+
+def holiday_window(today=None):
+    """
+    休日を登録できる期間 (今日, 次の学期の終了日) を返す。
+    学期末に次の学期の休日を先に登録できるよう、次の学期までを含める。
+    """
+    today = today or today_jst()
+    return today, next_term(today)[1]
+
+
+def order_window(now=None):
+    """
+    注文できる期間 (最初の日, 最後の日) を返す。
+    当日分は ORDER_DEADLINE_HOUR 時まで、先は ORDER_MAX_DAYS_AHEAD 日後まで。
+    """
+    now = now or datetime.now(JST)
+    today = now.date()
+    first_day = today if now.hour < constants.ORDER_DEADLINE_HOUR else today + timedelta(days=1)
+    return first_day, today + timedelta(days=constants.ORDER_MAX_DAYS_AHEAD)
@@ -0,0 +1,94 @@
+# 非同期DBアクセス用ファイル（asyncpg）
+import asyncio
+import logging
+import os
+
+from utils.config import get_config
+from utils.db_utils import (
+    STATEMENTS,
+    backend_name,
+    execute_prepared,
+    execute_sql,
+    mark_write,
+    to_numbered_placeholders,
+)
+
+# asyncpg は非同期 Webhook（WEBHOOK_ASYNC=1）を使う場合だけ必要
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# =========================================================
+# 非同期用コネクションプール（utils.async_runtime のループ上で生成）
+# =========================================================
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+def _reset_pool_after_fork():
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = asyncio.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+async def _get_pool():
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                config = get_config()
+                # asyncpg は接続ごとにステートメントを自動で PREPARE・キャッシュする
+                _pool = await asyncpg.create_pool(
+                    dsn=config["DATABASE_URL"],
+                    min_size=config["ASYNC_DB_POOL_MIN"],
+                    max_size=config["ASYNC_DB_POOL_MAX"],
+                    timeout=config["DB_CONNECT_TIMEOUT"],
+                )
+    return _pool
+
+
+# =========================================================
+# execute_sql の非同期版（SQL・パラメータ・戻り値の形は execute_sql と同じ）
+#   fetch=True なら行のリスト（row["列名"] / row.get("列名") で参照可）
+#   fetch=False なら {"success": True}、失敗時は {"error": "..."}
+#   asyncpg はプライマリにだけつなぐ。sticky_key を渡すと、書き込み後はそのキーの
+#   同期版の読み込み（他のワーカーを含む）もしばらくプライマリに向ける。
+# =========================================================
+async def execute_sql_async(sql_query, params=None, fetch=False, sticky_key=None):
+    # 組み込み SQLite では asyncpg を使わず、同期版をスレッドで実行する
+    if backend_name() == "sqlite":
+        return await asyncio.to_thread(execute_sql, sql_query, params, fetch, sticky_key)
+    if asyncpg is None:
+        return {"error": "asyncpg がインストールされていません。"}
+    if not get_config()["DATABASE_URL"]:
+        return {"error": "DATABASE_URLが設定されていません。"}
+
+    numbered_sql, _ = to_numbered_placeholders(sql_query)
+    try:
+        pool = await _get_pool()
+        if fetch:
+            return await pool.fetch(numbered_sql, *(params or ()))
+        await pool.execute(numbered_sql, *(params or ()))
+        mark_write(sticky_key)
+        return {"success": True}
+
+    except Exception as e:
+        logger.error("!!! データベースエラーが発生しました: %s !!!", e)
+        logger.error("!!! 実行失敗クエリ: %s", sql_query)
+        return {"error": str(e)}
+
+
+async def execute_prepared_async(name, params=None, fetch=True, sticky_key=None):
+    """
+    execute_prepared の非同期版（register_statement() で登録した名前で実行する）。
+    asyncpg は接続ごとに PREPARE をキャッシュするので、登録済みの SQL をそのまま送る。
+    """
+    if backend_name() == "sqlite":
+        return await asyncio.to_thread(execute_prepared, name, params, fetch, sticky_key)
+    return await execute_sql_async(STATEMENTS[name]["sql"], params, fetch, sticky_key)
@@ -0,0 +1,195 @@
+# DBアクセス用パッケージ
+#   DATABASE_URL の形式でバックエンドを切り替える（呼び出し側は execute_sql などを使うだけ）。
+#     postgres://... / postgresql://...  -> utils.db_utils.postgres（本番）
+#     sqlite:///:memory: / sqlite:///path -> utils.db_utils.sqlite（DBサーバーなしで動かす CI・計測用）
+#   戻り値の約束はどちらも同じ:
+#     fetch=True -> 行のリスト（row["列名"] / row.get() で読める）
+#     fetch=False -> {"success": True}、エラー時 -> {"error": "メッセージ"}
+#   大きな結果は execute_sql_stream() で batch_size 行ずつ読む（行の形式も選べる）。
+import functools
+import importlib
+import itertools
+import logging
+import re
+import threading
+
+from utils.config import get_config
+
+logger = logging.getLogger(__name__)
+
+# =========================================================
+# 名前付きステートメント（頻出クエリ）
+#   register_statement() で名前を付けて一度だけ宣言し、execute_prepared(name, params) で実行する。
+#   PostgreSQL では接続ごとに PREPARE して EXECUTE を送る。
+# =========================================================
+STATEMENTS = {}
+
+
+def to_numbered_placeholders(sql_query):
+    """%s プレースホルダを $1, $2 ... に置き換え、(SQL, パラメータ数) を返す。"""
+    counter = itertools.count(1)
+    numbered_sql = re.sub(r"%s", lambda _: f"${next(counter)}", sql_query)
+    return numbered_sql, next(counter) - 1
+
+
+def register_statement(name, sql_query, sqlite_sql=None):
+    """
+    名前付きステートメントを登録する（%s プレースホルダを $1, $2 ... に変換）。
+    登録した名前は execute_prepared(name, params) で実行できる。
+    sqlite_sql: PostgreSQL 固有の構文（LATERAL・string_agg など）を使う場合の SQLite 用の同じ意味の SQL
+    """
+    prepared_sql, param_count = to_numbered_placeholders(sql_query.strip().rstrip(";"))
+    placeholders = ", ".join(["%s"] * param_count)
+    STATEMENTS[name] = {
+        "sql": sql_query,
+        "sqlite_sql": sqlite_sql or sql_query,
+        "prepare": f"PREPARE {name} AS {prepared_sql}",
+        "execute": f"EXECUTE {name} ({placeholders})" if param_count else f"EXECUTE {name}",
+    }
+    return name
+
+
+# =========================================================
+# 行の形式（execute_sql_stream の row_type）
+#   "dict"    -> row["列名"] / row[0] で読める行（execute_sql と同じ）
+#   "tuple"   -> ただのタプル（列の位置で読む。いちばん軽い）
+#   "compact" -> CompactRow（タプルに列名の索引を共有で持たせたもの。row["列名"] / row.get() も使える）
+# =========================================================
+ROW_TYPES = ("dict", "tuple", "compact")
+
+
+class CompactRow(tuple):
+    """
+    行ごとの辞書やインスタンス属性を持たない（__slots__ = ()）読み取り専用の行。
+    列名 -> 位置の索引はクラス（列の組み合わせごとに1つ）で共有する。
+    """
+
+    __slots__ = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        return [(key, tuple.__getitem__(self, i)) for key, i in self._index.items()]
+
+
+@functools.lru_cache(maxsize=256)
+def compact_row_class(columns):
+    """列名のタプルに対応する CompactRow のサブクラス（同じ列の組み合わせでは使い回す）。"""
+    index = {name: i for i, name in enumerate(columns)}
+    return type("CompactRow", (CompactRow,), {"__slots__": (), "_index": index})
+
+
+def to_compact_rows(description, rows):
+    """cursor.description とタプルの行のリストから CompactRow のリストを作る。"""
+    row_class = compact_row_class(tuple(column[0] for column in description))
+    return [row_class(row) for row in rows]
+
+
+# =========================================================
+# バックエンドの選択（初回利用時。使わない方のドライバは import しない）
+# =========================================================
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend_name(database_url=None):
+    """DATABASE_URL から "postgres" / "sqlite" を返す。"""
+    url = database_url if database_url is not None else get_config()["DATABASE_URL"]
+    if url and url.startswith("sqlite:"):
+        return "sqlite"
+    return "postgres"
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = importlib.import_module(f"utils.db_utils.{backend_name()}")
+    return _backend
+
+
+# =========================================================
+# 公開 API（各バックエンドに委ねる）
+# =========================================================
+def get_connection(role="primary"):
+    """接続を借りるコンテキストマネージャ（autocommit）。"""
+    return get_backend().get_connection(role)
+
+
+def execute_sql(sql_query, params=None, fetch=False, sticky_key=None):
+    return get_backend().execute_sql(sql_query, params, fetch, sticky_key)
+
+
+def execute_prepared(name, params=None, fetch=True, sticky_key=None):
+    """register_statement() で登録したステートメントを実行する。戻り値は execute_sql と同じ。"""
+    return get_backend().execute_prepared(name, params, fetch, sticky_key)
+
+
+def mark_write(sticky_key):
+    """
+    sticky_key の読み込みをしばらくプライマリに向ける（execute_sql の書き込み後と同じ）。
+    execute_sql を通さずに書き込んだ場合（非同期版など）に呼ぶ。
+    """
+    get_backend().mark_write(sticky_key)
+
+
+def transaction(**kwargs):
+    """
+    複数の SQL を1トランザクションで実行するカーソル（with transaction() as cursor:）。
+    例外が出ればロールバック、正常終了ならコミットする。エラーは例外として伝わる。
+    transaction(sticky_key=line_user_id) とすると、コミット後はそのユーザーの読み込みを
+    しばらくプライマリから行う（書き込み直後にレプリカの古い行を読まないため）。
+    """
+    return get_backend().transaction(**kwargs)
+
+
+def execute_sql_stream(sql_query, params=None, batch_size=1000, row_type="dict", error_dict=False):
+    """
+    結果を batch_size 行ずつのリストで返すジェネレータ（全件をメモリに載せない）。
+    PostgreSQL ではサーバーサイドの名前付きカーソルから読む。
+    row_type: "dict" / "tuple" / "compact"（ROW_TYPES を参照）
+    error_dict=False -> エラーは例外として呼び出し元に伝わる
+    error_dict=True  -> エラーは {"error": "メッセージ"} を最後の要素として返して終わる
+                        （for rows in ...: if "error" in rows: ... と execute_sql と同じ書き方で扱える）
+    """
+    if row_type not in ROW_TYPES:
+        raise ValueError(f"row_type は {ROW_TYPES} のいずれかです: {row_type!r}")
+    batches = get_backend().stream_sql(sql_query, params, batch_size, row_type)
+    if not error_dict:
+        return batches
+    return _stream_with_error_dict(batches, sql_query)
+
+
+def execute_prepared_stream(name, params=None, batch_size=1000, row_type="dict", error_dict=False):
+    """
+    register_statement() で登録したステートメントを execute_sql_stream と同じ形で読む。
+    バックエンドに合った SQL（sqlite_sql があればそちら）が使われる。
+    名前付きカーソルは PREPARE 済みの文を開けないため、PostgreSQL でも SQL をそのまま送る。
+    """
+    if row_type not in ROW_TYPES:
+        raise ValueError(f"row_type は {ROW_TYPES} のいずれかです: {row_type!r}")
+    batches = get_backend().stream_prepared(name, params, batch_size, row_type)
+    if not error_dict:
+        return batches
+    return _stream_with_error_dict(batches, STATEMENTS[name]["sql"])
+
+
+def _stream_with_error_dict(batches, sql_query):
+    try:
+        yield from batches
+    except Exception as e:
+        logger.error("!!! データベースエラーが発生しました: %s !!!", e)
+        logger.error("!!! 実行失敗クエリ: %s", sql_query)
+        yield {"error": str(e)}
@@ -0,0 +1,357 @@
+# PostgreSQL バックエンド（DATABASE_URL が postgres:// などの場合）
+import psycopg2
+from psycopg2 import errors, extensions, extras, pool
+from urllib.parse import urlparse
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+from utils.config import get_config
+from utils.db_utils import STATEMENTS, to_compact_rows
+
+logger = logging.getLogger(__name__)
+
+# =========================================================
+# コネクションプール（初回利用時に生成、fork 後は子プロセスで作り直す）
+#   "primary": DATABASE_URL / "replica": DATABASE_REPLICA_URL（任意）
+# =========================================================
+_pools = {}
+_pool_lock = threading.Lock()
+
+# レプリカの状態（プロセス内）
+_replica_down_until = 0.0  # この時刻（monotonic）まではレプリカを使わない
+_replica_lag_ok = True
+_replica_lag_checked_at = 0.0
+_replica_lag_lock = threading.Lock()
+
+# 書き込み直後のユーザー（sticky_key -> この時刻まではプライマリから読む）
+#   プロセス内の dict に加えて REPLICA_STICKY_DIR にもファイル（mtime = 期限）で残し、
+#   同じホストの他のワーカーが受けた次のメッセージでもプライマリから読むようにする。
+#   ホストをまたぐ場合は REPLICA_STICKY_DIR を全ホストで共有するディレクトリにすること。
+_recent_writers = {}
+
+POOL_URL_KEYS = {
+    "primary": "DATABASE_URL",
+    "replica": "DATABASE_REPLICA_URL",
+}
+
+
+class PooledConnection(extensions.connection):
+    """PREPARE 済みのステートメント名を接続ごとに覚えておくための接続クラス。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def _reset_pool_after_fork():
+    # 親プロセスの接続は子プロセスで使わない（閉じずに参照だけ捨てる）
+    global _pools, _pool_lock, _replica_lag_lock, _recent_writers
+    _pools = {}
+    _pool_lock = threading.Lock()
+    _replica_lag_lock = threading.Lock()
+    _recent_writers = {}
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def _get_pool(role="primary"):
+    conn_pool = _pools.get(role)
+    if conn_pool is None:
+        with _pool_lock:
+            conn_pool = _pools.get(role)
+            if conn_pool is None:
+                config = get_config()
+                url = urlparse(config[POOL_URL_KEYS[role]])
+                conn_pool = pool.ThreadedConnectionPool(
+                    config["DB_POOL_MIN"],
+                    config["DB_POOL_MAX"],
+                    dbname=url.path[1:],
+                    user=url.username,
+                    password=url.password,
+                    host=url.hostname or None,
+                    port=url.port or None,
+                    connect_timeout=config["DB_CONNECT_TIMEOUT"],
+                    connection_factory=PooledConnection,
+                )
+                # getconn() はプールが空だと待たずに PoolError を投げるため、
+                # 空き枠を数えるセマフォで DB_POOL_TIMEOUT 秒まで待ってから借りる
+                conn_pool.slots = threading.BoundedSemaphore(config["DB_POOL_MAX"])
+                _pools[role] = conn_pool
+    return conn_pool
+
+
+@contextmanager
+def get_connection(role="primary"):
+    """
+    プールから autocommit の接続を借りて返す。
+    接続が切れていた場合はプールに戻さず破棄する。
+    すべて貸し出し中なら DB_POOL_TIMEOUT 秒まで返却を待ち、それでも空かなければ PoolError。
+    """
+    conn_pool = _get_pool(role)
+    if not conn_pool.slots.acquire(timeout=get_config()["DB_POOL_TIMEOUT"]):
+        raise pool.PoolError(f"接続プール（{role}）の空きを待ちきれませんでした")
+    try:
+        conn = conn_pool.getconn()
+    except Exception:
+        conn_pool.slots.release()
+        raise
+    broken = False
+    try:
+        # ✅ autocommit を有効化し、ロック待ちによるフリーズを回避
+        if not conn.autocommit:
+            conn.autocommit = True
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        try:
+            conn_pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            conn_pool.slots.release()
+
+
+# =========================================================
+# リードレプリカへの振り分け
+# =========================================================
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+    END AS lag_seconds
+"""
+
+
+def _is_read_only(sql_query):
+    return sql_query.lstrip().upper().startswith("SELECT")
+
+
+def _sticky_path(sticky_key):
+    digest = hashlib.sha1(str(sticky_key).encode()).hexdigest()
+    return os.path.join(get_config()["REPLICA_STICKY_DIR"], digest)
+
+
+def _mark_write(sticky_key):
+    """書き込んだユーザーはしばらくプライマリから読む（read-your-writes）。"""
+    config = get_config()
+    if not sticky_key or not config["DATABASE_REPLICA_URL"]:
+        return
+    until = time.time() + config["REPLICA_STICKY_SECONDS"]
+    _recent_writers[sticky_key] = until
+    # 他のワーカーにも見えるよう、期限を mtime にしたファイルを置く
+    path = _sticky_path(sticky_key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a"):
+            pass
+        os.utime(path, (until, until))
+    except OSError as e:
+        logger.warning("書き込み直後の印を保存できませんでした: %s", e)
+    # 期限切れのエントリを時々掃除する
+    if len(_recent_writers) > 1000:
+        now = time.time()
+        for key, expires in list(_recent_writers.items()):
+            if expires < now:
+                _recent_writers.pop(key, None)
+
+
+def mark_write(sticky_key):
+    _mark_write(sticky_key)
+
+
+def _is_recent_writer(sticky_key):
+    """このキーが REPLICA_STICKY_SECONDS 以内に（どのワーカーででも）書き込んだか。"""
+    now = time.time()
+    if _recent_writers.get(sticky_key, 0) > now:
+        return True
+    try:
+        return os.stat(_sticky_path(sticky_key)).st_mtime > now
+    except OSError:
+        return False
+
+
+def _check_replica_lag():
+    """レプリカの遅延を一定間隔で確認し、許容値を超えていれば使わない。"""
+    global _replica_lag_ok, _replica_lag_checked_at
+    config = get_config()
+    if time.monotonic() - _replica_lag_checked_at < config["REPLICA_LAG_CHECK_INTERVAL"]:
+        return _replica_lag_ok
+    # 確認は1スレッドだけが行い、他のスレッドは前回の結果を使う
+    if not _replica_lag_lock.acquire(blocking=False):
+        return _replica_lag_ok
+    try:
+        with get_connection("replica") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_SQL)
+                lag_seconds = cursor.fetchone()[0] or 0
+        _replica_lag_ok = lag_seconds <= config["REPLICA_MAX_LAG_SECONDS"]
+        if not _replica_lag_ok:
+            logger.warning("レプリカの遅延が大きいためプライマリを使います: %.1fs", lag_seconds)
+    finally:
+        _replica_lag_checked_at = time.monotonic()
+        _replica_lag_lock.release()
+    return _replica_lag_ok
+
+
+def _use_replica(sql_query, fetch, sticky_key):
+    if not fetch or not get_config()["DATABASE_REPLICA_URL"]:
+        return False
+    if not _is_read_only(sql_query):
+        return False
+    now = time.monotonic()
+    if now < _replica_down_until:
+        return False
+    if sticky_key and _is_recent_writer(sticky_key):
+        return False
+    return True
+
+
+# =========================================================
+# サーバーサイドのプリペアドステートメント
+#   PREPARE は各接続で初めて使うときに行い、以降は EXECUTE だけを送る。
+# =========================================================
+def _execute_statement(conn, cursor, name, params):
+    statement = STATEMENTS[name]
+    for attempt in range(2):
+        if name not in conn.prepared:
+            try:
+                cursor.execute(statement["prepare"])
+            except errors.DuplicatePreparedStatement:
+                pass
+            conn.prepared.add(name)
+        try:
+            cursor.execute(statement["execute"], params)
+            return
+        except errors.InvalidSqlStatementName:
+            # サーバー側で破棄されていた（DISCARD ALL など）場合は準備し直す
+            conn.prepared.discard(name)
+            if attempt:
+                raise
+
+
+def _execute_on(role, sql_query, params, fetch, statement=None):
+    with get_connection(role) as conn:
+        with conn.cursor(cursor_factory=extras.DictCursor) as cursor:
+            if statement:
+                _execute_statement(conn, cursor, statement, params)
+            else:
+                cursor.execute(sql_query, params)
+
+            if fetch:
+                return cursor.fetchall()
+            return {"success": True}
+
+
+def _run(sql_query, params, fetch, sticky_key, statement=None):
+    global _replica_down_until
+    if not get_config()["DATABASE_URL"]:
+        return {"error": "DATABASE_URLが設定されていません。"}
+
+    if _use_replica(sql_query, fetch, sticky_key):
+        try:
+            if _check_replica_lag():
+                return _execute_on("replica", sql_query, params, fetch, statement)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError) as e:
+            # レプリカが落ちている場合はしばらくプライマリだけを使う
+            logger.warning("レプリカに接続できないためプライマリを使います: %s", e)
+            _replica_down_until = time.monotonic() + get_config()["REPLICA_RETRY_SECONDS"]
+        except Exception as e:
+            logger.error("!!! データベースエラーが発生しました: %s !!!", e)
+            logger.error("!!! 実行失敗クエリ: %s", sql_query)
+            return {"error": str(e)}
+
+    try:
+        result = _execute_on("primary", sql_query, params, fetch, statement)
+        if not _is_read_only(sql_query):
+            _mark_write(sticky_key)
+        return result
+
+    except Exception as e:
+        logger.error("!!! データベースエラーが発生しました: %s !!!", e)
+        logger.error("!!! 実行失敗クエリ: %s", sql_query)
+        return {"error": str(e)}
+
+
+# =========================================================
+# 4. PostgreSQL接続のための汎用関数（省略）
+#   fetch=True の SELECT は DATABASE_REPLICA_URL があればレプリカへ送る。
+#   sticky_key（user_line_id など）を渡すと、そのキーで書き込んだ直後は
+#   REPLICA_STICKY_SECONDS 秒間プライマリから読む。
+# =========================================================
+def execute_sql(sql_query, params=None, fetch=False, sticky_key=None):
+    return _run(sql_query, params, fetch, sticky_key)
+
+
+def execute_prepared(name, params=None, fetch=True, sticky_key=None):
+    return _run(STATEMENTS[name]["sql"], params, fetch, sticky_key, statement=name)
+
+
+# =========================================================
+# 複数の SQL を1トランザクションで実行するためのカーソル
+# =========================================================
+@contextmanager
+def transaction(cursor_factory=extras.DictCursor, sticky_key=None):
+    """
+    例外が出ればロールバック、正常終了ならコミットする。
+    execute_sql と違い、エラーは dict ではなく例外として呼び出し元に伝わる。
+    sticky_key（1つ、またはリスト）を渡すと、コミット後にそのキーの読み込みを
+    REPLICA_STICKY_SECONDS 秒間プライマリに向ける（execute_sql の書き込みと同じ）。
+    """
+    with get_connection() as conn:
+        conn.autocommit = False
+        try:
+            with conn.cursor(cursor_factory=cursor_factory) as cursor:
+                yield cursor
+            conn.commit()
+            sticky_keys = sticky_key if isinstance(sticky_key, (list, tuple, set)) else [sticky_key]
+            for key in sticky_keys:
+                _mark_write(key)
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if not conn.closed:
+                conn.autocommit = True
+
+
+# =========================================================
+# 大きな結果を少しずつ取り出す（サーバーサイドの名前付きカーソル）
+# =========================================================
+def stream_sql(sql_query, params=None, batch_size=1000, row_type="dict"):
+    """
+    結果を batch_size 行ずつのリストで返すジェネレータ（utils.db_utils.execute_sql_stream から呼ばれる）。
+    "tuple" / "compact" では DictRow を作らず、psycopg2 のタプルをそのまま使う。
+    エラーは例外として呼び出し元に伝わる。
+    """
+    cursor_factory = extras.DictCursor if row_type == "dict" else None
+    with get_connection() as conn:
+        # 名前付きカーソルはトランザクション内でしか使えない
+        conn.autocommit = False
+        try:
+            cursor_name = f"stream_{uuid.uuid4().hex}"
+            with conn.cursor(name=cursor_name, cursor_factory=cursor_factory) as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(sql_query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if row_type == "compact":
+                        rows = to_compact_rows(cursor.description, rows)
+                    yield rows
+        finally:
+            # 途中で打ち切られた場合（クライアント切断など）もカーソルを閉じて戻す
+            if not conn.closed:
+                conn.rollback()
+                conn.autocommit = True
+
+
+def stream_prepared(name, params=None, batch_size=1000, row_type="dict"):
+    return stream_sql(STATEMENTS[name]["sql"], params, batch_size, row_type)
@@ -0,0 +1,283 @@
+# 組み込み SQLite バックエンド（DATABASE_URL=sqlite:///:memory: または sqlite:///ファイルパス）
+#   DBサーバーなしで Webhook の流れやベンチマークを動かすためのもの。
+#   - 新しいDBにはリポジトリ直下の sql と sqlite_schema.sql を流してスキーマを作る
+#   - %s / %(name)s プレースホルダは ? / :name に変換し、NOW() は関数として用意する
+#   - 接続は1本をロックで共有する（:memory: のDBをスレッド間で共有するため）
+#   - register_statement(sqlite_sql=...) で SQLite 用の SQL が登録されていればそちらを使う
+#   plpgsql・アドバイザリロック・パーティションを使う処理（請求・アーカイブなど）は PostgreSQL が必要。
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+
+from utils.config import get_config
+from utils.db_utils import STATEMENTS, to_compact_rows
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASE_SCHEMA_PATH = os.path.join(PROJECT_DIR, "sql")
+SQLITE_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sqlite_schema.sql")
+
+_conn = None
+_lock = threading.RLock()
+
+
+# =========================================================
+# 型の変換（PostgreSQL と同じく date / datetime で受け渡す）
+# =========================================================
+def _format_timestamp(value):
+    # 文字列のまま比較されるため、UTC・マイクロ秒付きの同じ形式にそろえる
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f") + "+00:00"
+
+
+def _parse_timestamp(raw):
+    return datetime.fromisoformat(raw.decode())
+
+
+sqlite3.register_adapter(datetime, _format_timestamp)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("TIMESTAMP", _parse_timestamp)
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+
+
+class Row(list):
+    """psycopg2 の DictRow と同じく、row[0] / row["列名"] / row.get("列名") で読める行。"""
+
+    __slots__ = ("_index",)
+
+    def __init__(self, index, values):
+        super().__init__(values)
+        self._index = index
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else super().__getitem__(index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        return [(key, super(Row, self).__getitem__(i)) for key, i in self._index.items()]
+
+
+PLACEHOLDER_PATTERN = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+def _translate(sql_query):
+    """psycopg2 形式のプレースホルダを sqlite3 形式に変換する。"""
+    def replace(match):
+        if match.group(1):
+            return ":" + match.group(1)
+        return "?" if match.group(0) == "%s" else "%"
+    return PLACEHOLDER_PATTERN.sub(replace, sql_query)
+
+
+class Cursor:
+    """psycopg2 のカーソルと同じ使い方（with / execute / fetch*）ができるカーソル。"""
+
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+        self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql_query, params=None):
+        self._cursor.execute(_translate(sql_query), params or ())
+        description = self._cursor.description
+        self._index = (
+            {column[0]: i for i, column in enumerate(description)} if description else None
+        )
+        return self
+
+    def executemany(self, sql_query, params_seq):
+        self._cursor.executemany(_translate(sql_query), params_seq)
+        self._index = None
+
+    def _wrap(self, rows):
+        return [Row(self._index, row) for row in rows]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return None if row is None else Row(self._index, row)
+
+    def fetchmany(self, size):
+        return self._wrap(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._wrap(self._cursor.fetchall())
+
+    def fetchall_tuples(self):
+        # Row に包まない（execute_sql_stream の "tuple" / "compact" 用）
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """get_connection() が返す接続（cursor() の引数は psycopg2 と互換にするため受け取って無視する）。"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.closed = False
+
+    def cursor(self, name=None, cursor_factory=None):
+        return Cursor(self._conn)
+
+
+# =========================================================
+# 接続とスキーマ
+# =========================================================
+def _database_path():
+    url = get_config()["DATABASE_URL"]
+    # sqlite:///:memory: / sqlite:// -> メモリ上、sqlite:///data/app.db -> 相対パス、sqlite:////tmp/app.db -> 絶対パス
+    path = url[len("sqlite:"):].lstrip("/") if url.startswith("sqlite:///") else ""
+    if url.startswith("sqlite:////"):
+        path = "/" + path
+    return path or ":memory:"
+
+
+def _run_script(conn, path):
+    with open(path, mode="r", encoding="utf-8") as f:
+        script = f.read()
+    # 基本スキーマは PostgreSQL 用なので、SQLite で意味が変わる部分だけ置き換える
+    script = script.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+    conn.executescript(script)
+
+
+def _connect():
+    path = _database_path()
+    conn = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        isolation_level=None,  # autocommit（トランザクションは BEGIN で明示する）
+        check_same_thread=False,
+    )
+    conn.create_function("NOW", 0, lambda: _format_timestamp(datetime.now(timezone.utc)))
+    conn.execute("PRAGMA foreign_keys = ON")
+    if path != ":memory:":
+        conn.execute("PRAGMA journal_mode = WAL")
+
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+    ).fetchone()
+    if not exists:
+        _run_script(conn, BASE_SCHEMA_PATH)
+        _run_script(conn, SQLITE_SCHEMA_PATH)
+        seed_path = get_config()["DATABASE_SEED_FILE"]
+        if seed_path:
+            _run_script(conn, seed_path)
+        logger.info("SQLite のスキーマを作成しました: %s", path)
+    return conn
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        with _lock:
+            if _conn is None:
+                _conn = _connect()
+    return _conn
+
+
+def _reset_after_fork():
+    # :memory: のDBは子プロセスで作り直す（ファイルのDBは開き直す）
+    global _conn, _lock
+    _conn = None
+    _lock = threading.RLock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def get_connection(role="primary"):
+    conn = _get_conn()
+    with _lock:
+        yield Connection(conn)
+
+
+# =========================================================
+# 公開 API（utils.db_utils から呼ばれる）
+# =========================================================
+def execute_sql(sql_query, params=None, fetch=False, sticky_key=None):
+    if not get_config()["DATABASE_URL"]:
+        return {"error": "DATABASE_URLが設定されていません。"}
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql_query, params)
+                if fetch:
+                    return cursor.fetchall()
+                return {"success": True}
+    except Exception as e:
+        logger.error("!!! データベースエラーが発生しました: %s !!!", e)
+        logger.error("!!! 実行失敗クエリ: %s", sql_query)
+        return {"error": str(e)}
+
+
+def execute_prepared(name, params=None, fetch=True, sticky_key=None):
+    # sqlite3 は同じ SQL 文字列のコンパイル結果を接続ごとにキャッシュする
+    return execute_sql(STATEMENTS[name]["sqlite_sql"], params, fetch, sticky_key)
+
+
+def mark_write(sticky_key):
+    # レプリカがないため何もしない
+    pass
+
+
+@contextmanager
+def transaction(cursor_factory=None, sticky_key=None):
+    # レプリカがないため sticky_key は受け取るだけ
+    with get_connection() as conn:
+        raw = conn._conn
+        raw.execute("BEGIN")
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            raw.execute("COMMIT")
+        except Exception:
+            raw.execute("ROLLBACK")
+            raise
+
+
+def stream_sql(sql_query, params=None, batch_size=1000, row_type="dict"):
+    # ロックを持ったまま呼び出し側に制御を返さないよう、先に全件を取り出してから分けて返す
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql_query, params)
+            if row_type == "dict":
+                rows = cursor.fetchall()
+            else:
+                rows = cursor.fetchall_tuples()
+                if row_type == "compact":
+                    rows = to_compact_rows(cursor.description, rows)
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def stream_prepared(name, params=None, batch_size=1000, row_type="dict"):
+    return stream_sql(STATEMENTS[name]["sqlite_sql"], params, batch_size, row_type)
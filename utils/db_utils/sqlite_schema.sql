@@ -0,0 +1,89 @@
+-- SQLite バックエンド用: リポジトリ直下の sql（基本スキーマ）の後に実行する追加分。
+-- migrations/ のうち、アプリの同期処理（Webhook・休日・セッション）が使う部分だけを SQLite の書き方で再現する。
+-- パーティション・plpgsql 関数・アーカイブ・請求スナップショットの作成（集計）は PostgreSQL でのみ使える。
+-- 請求スナップショットの読み出し（「確認」「請求」）は SQLite でも動く。
+
+-- 0001: よく使う検索のインデックス
+CREATE INDEX idx_orders_order_date_live ON orders (order_date) WHERE order_deleted_at IS NULL;
+CREATE INDEX idx_orders_user_id_order_date_live ON orders (user_id, order_date) WHERE order_deleted_at IS NULL;
+CREATE INDEX idx_auth_tokens_expires_at ON auth_tokens (expires_at);
+
+-- 0002: option_details は order_date も持つ
+ALTER TABLE option_details ADD COLUMN order_date DATE;
+CREATE INDEX idx_option_details_order_id ON option_details (order_id, order_date);
+
+-- 0003: 月次請求のスナップショット（読み出し用。作成は PostgreSQL の請求処理で行う）
+CREATE TABLE invoice_snapshots (
+    invoice_snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    billing_month DATE NOT NULL,
+    snapshot_version INTEGER NOT NULL,
+    order_count INTEGER NOT NULL,
+    subtotal INTEGER NOT NULL,
+    tax_rate NUMERIC(5, 4) NOT NULL,
+    tax_amount INTEGER NOT NULL,
+    total_amount INTEGER NOT NULL,
+    source_watermark TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, billing_month, snapshot_version)
+);
+CREATE INDEX idx_invoice_snapshots_billing_month ON invoice_snapshots (billing_month);
+
+-- DISTINCT ON の代わりに「より新しい版がない行」を最新版とする
+CREATE VIEW latest_invoices AS
+SELECT i.* FROM invoice_snapshots i
+WHERE NOT EXISTS (
+    SELECT 1 FROM invoice_snapshots n
+    WHERE n.user_id = i.user_id AND n.billing_month = i.billing_month
+      AND n.snapshot_version > i.snapshot_version
+);
+
+CREATE TRIGGER invoice_snapshots_immutable_update BEFORE UPDATE ON invoice_snapshots
+BEGIN
+    SELECT RAISE(ABORT, 'invoice_snapshots は変更できません（再計算は新しい版を追加してください）');
+END;
+CREATE TRIGGER invoice_snapshots_immutable_delete BEFORE DELETE ON invoice_snapshots
+BEGIN
+    SELECT RAISE(ABORT, 'invoice_snapshots は変更できません（再計算は新しい版を追加してください）');
+END;
+
+-- 0004: マスタデータのバージョン（SQLite のトリガーは行単位）
+CREATE TABLE data_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO data_versions (name) VALUES ('holidays');
+
+CREATE TRIGGER holidays_bump_version_insert AFTER INSERT ON holidays
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = 'holidays';
+END;
+CREATE TRIGGER holidays_bump_version_update AFTER UPDATE ON holidays
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = 'holidays';
+END;
+CREATE TRIGGER holidays_bump_version_delete AFTER DELETE ON holidays
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = 'holidays';
+END;
+
+-- 0006: 商品マスタのバージョン
+INSERT INTO data_versions (name) VALUES ('products');
+
+CREATE TRIGGER products_bump_version_insert AFTER INSERT ON products
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = 'products';
+END;
+CREATE TRIGGER products_bump_version_update AFTER UPDATE ON products
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = 'products';
+END;
+CREATE TRIGGER products_bump_version_delete AFTER DELETE ON products
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = NOW() WHERE name = 'products';
+END;
+
+-- 0005: 監査用ビュー（SQLite にはアーカイブがないため現行の行だけ）
+CREATE VIEW audit_users AS
+SELECT u.*, NULL AS archived_at FROM users u;
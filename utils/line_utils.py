@@ -0,0 +1,65 @@
+# LINE SDK クライアント用ファイル
+import requests
+from linebot import LineBotApi
+
+from utils.config import get_config
+
+LINE_API_ENDPOINT = "https://api.line.me"
+
+# Messaging API への HTTP タイムアウト（秒、LineBotApi の既定と同じ）
+LINE_API_TIMEOUT = 5
+
+_line_bot_api = None
+_http_session = None
+
+
+def get_line_bot_api():
+    """LineBotApi を初回利用時に生成して使い回す（gunicorn の fork 後に生成される）。"""
+    global _line_bot_api
+    if _line_bot_api is None:
+        _line_bot_api = LineBotApi(get_config()["LINE_CHANNEL_ACCESS_TOKEN"])
+    return _line_bot_api
+
+
+def post_json(path, body):
+    """
+    シリアライズ済みの JSON（bytes）を Messaging API に POST する。
+    SDK のモデルを経由しないので、キャッシュした bytes をそのまま送れる。
+    失敗時は requests.HTTPError などの例外（reply_message と同じく呼び出し側でログを取る）。
+    """
+    global _http_session
+    if _http_session is None:
+        # 接続を使い回す（fork 後の子プロセスで初めて作られる）
+        _http_session = requests.Session()
+    response = _http_session.post(
+        LINE_API_ENDPOINT + path,
+        data=body,
+        headers={
+            "Authorization": "Bearer " + get_config()["LINE_CHANNEL_ACCESS_TOKEN"],
+            "Content-Type": "application/json",
+        },
+        timeout=LINE_API_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response
+
+
+_async_line_bot_api = None
+
+
+async def get_async_line_bot_api():
+    """
+    AsyncLineBotApi を初回利用時に生成する。
+    aiohttp のセッションはループに紐づくため、utils.async_runtime のループ上で呼ぶこと。
+    """
+    global _async_line_bot_api
+    if _async_line_bot_api is None:
+        import aiohttp
+        from linebot import AsyncLineBotApi
+        from linebot.aiohttp_async_http_client import AiohttpAsyncHttpClient
+
+        session = aiohttp.ClientSession()
+        _async_line_bot_api = AsyncLineBotApi(
+            get_config()["LINE_CHANNEL_ACCESS_TOKEN"], AiohttpAsyncHttpClient(session)
+        )
+    return _async_line_bot_api
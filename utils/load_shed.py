@@ -0,0 +1,138 @@
+# 過負荷対策（負荷遮断・ユーザーごとのレート制限）用ファイル
+import threading
+import time
+from collections import OrderedDict
+
+from utils.config import get_config
+
+# 判定結果
+ADMIT = "admitted"
+RATE_LIMITED = "rate_limited"      # ユーザーごとのトークンバケットが空
+DUPLICATE = "duplicate"            # 同じユーザーの同じ文面が短時間に連続
+OVERLOADED = "overloaded"          # プロセス全体の同時処理数が上限
+STALE_REDELIVERY = "stale_redelivery"  # LINE が再送してきた古いイベント
+
+# 丁寧に返信する判定（それ以外は黙って捨てる）
+REPLY_REASONS = (RATE_LIMITED, OVERLOADED)
+
+
+class LoadShedder:
+    """
+    DB に触れる前にイベントを受け付けるかを決める。
+    - ユーザーごとのトークンバケット（rate 個/秒、最大 burst 個）
+    - 同じ文面の連投はまとめて1回だけ処理する
+    - プロセス全体の同時処理数の上限（超えたら待たずに断る）
+    """
+
+    def __init__(self, rate, burst, max_concurrency, dedupe_seconds,
+                 redelivery_max_age, max_users=10000):
+        self.rate = rate
+        self.burst = burst
+        self.dedupe_seconds = dedupe_seconds
+        self.redelivery_max_age = redelivery_max_age
+        self.max_users = max_users
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        # user_line_id -> [残りトークン, 最終更新時刻, 最後の文面, 最後の文面の時刻, 最後に断りを返した時刻]
+        self._users = OrderedDict()
+        self.counters = {
+            ADMIT: 0,
+            RATE_LIMITED: 0,
+            DUPLICATE: 0,
+            OVERLOADED: 0,
+            STALE_REDELIVERY: 0,
+            "replied": 0,
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def admit(self, event):
+        """受け付けるなら ADMIT を返し、同時処理枠を1つ確保する（release() で返す）。"""
+        # 再送された古いイベントは処理しても手遅れなので捨てる
+        delivery_context = getattr(event, "delivery_context", None)
+        if delivery_context is not None and getattr(delivery_context, "is_redelivery", False):
+            age = time.time() - event.timestamp / 1000
+            if age > self.redelivery_max_age:
+                self._count(STALE_REDELIVERY)
+                return STALE_REDELIVERY
+
+        user_id = event.source.user_id
+        text = event.message.text
+        now = time.monotonic()
+
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                state = [float(self.burst), now, None, 0.0, 0.0]
+                self._users[user_id] = state
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+
+            # 同じ文面の連投（受け付けた文面と同じものが続いた場合だけ）
+            if text == state[2] and now - state[3] < self.dedupe_seconds:
+                state[3] = now
+                self.counters[DUPLICATE] += 1
+                return DUPLICATE
+
+            # トークンバケット
+            state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if state[0] < 1:
+                self.counters[RATE_LIMITED] += 1
+                return RATE_LIMITED
+
+        # プロセス全体の同時処理数
+        if not self._slots.acquire(blocking=False):
+            self._count(OVERLOADED)
+            return OVERLOADED
+
+        with self._lock:
+            state[0] -= 1
+            state[2], state[3] = text, now
+            self.counters[ADMIT] += 1
+        return ADMIT
+
+    def release(self):
+        self._slots.release()
+
+    def should_reply(self, event, reason):
+        """断りの返信は同じユーザーに対して dedupe_seconds に1回まで。"""
+        if reason not in REPLY_REASONS:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            state = self._users.get(event.source.user_id)
+            if state is not None and now - state[4] < self.dedupe_seconds:
+                return False
+            if state is not None:
+                state[4] = now
+            self.counters["replied"] += 1
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters, tracked_users=len(self._users))
+
+
+_load_shedder = None
+_load_shedder_lock = threading.Lock()
+
+
+def get_load_shedder():
+    global _load_shedder
+    if _load_shedder is None:
+        with _load_shedder_lock:
+            if _load_shedder is None:
+                config = get_config()
+                _load_shedder = LoadShedder(
+                    rate=config["SHED_USER_RATE"],
+                    burst=config["SHED_USER_BURST"],
+                    max_concurrency=config["SHED_MAX_CONCURRENCY"],
+                    dedupe_seconds=config["SHED_DEDUPE_SECONDS"],
+                    redelivery_max_age=config["SHED_REDELIVERY_MAX_AGE"],
+                )
+    return _load_shedder
@@ -0,0 +1,178 @@
+# ログ設定用ファイル
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+# =========================================================
+# 構造化ロギング（リクエストスレッドで I/O しない）
+# =========================================================
+# リクエストスレッドは QueueHandler にレコードを積むだけで、
+# 実際の書き出し（とマスキング・整形）は QueueListener のスレッドで行う。
+# 1行は JSON（LOG_STYLE=json、既定）で、request_id・event_type・latency_ms などの項目を持つ。
+# LOG_STYLE=text なら従来の1行テキスト。
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# JSON に載せるレコードの項目（log_context() で付けたもの、または extra= で渡したもの）
+STRUCTURED_FIELDS = ("request_id", "event_id", "event_type", "latency_ms")
+
+_listener = None
+
+# 処理中のリクエスト・イベントの項目。リスナースレッドからは見えないため、
+# QueueHandler に積む時点（リクエストスレッド側）で ContextFilter がレコードに写す。
+_log_context = contextvars.ContextVar("log_context", default={})
+
+
+def _mask_line_id(match):
+    # 突き合わせできるように末尾4文字だけ残す
+    return f"U***{match.group(0)[-4:]}"
+
+
+# マスキング対象（上から順に適用）
+REDACT_PATTERNS = [
+    # Webhook ボディ中の replyToken
+    (re.compile(r'("replyToken"\s*:\s*")[^"]+'), r"\1***"),
+    # URL クエリや key=value 形式のトークン
+    (re.compile(r"(token[=:]\s*)[0-9A-Za-z_\-]+", re.IGNORECASE), r"\1***"),
+    # auth_tokens のトークン（secrets.token_hex(32)）
+    (re.compile(r"\b[0-9a-f]{64}\b"), "***"),
+    # LINE のユーザーID
+    (re.compile(r"\bU[0-9a-f]{32}\b"), _mask_line_id),
+]
+
+
+def redact(text):
+    """文字列からトークン・LINEユーザーIDをマスクする。"""
+    for pattern, repl in REDACT_PATTERNS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+class RedactingFilter(logging.Filter):
+    """整形済みメッセージにマスキングをかけるフィルタ（リスナースレッド側で実行）。"""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        return True
+
+
+class ContextFilter(logging.Filter):
+    """log_context() の項目をレコードの属性にする（QueueHandler に付け、リクエストスレッド側で実行）。"""
+
+    def filter(self, record):
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコードを1行の JSON にする（ts / level / logger / msg と STRUCTURED_FIELDS のうち値のあるもの）。"""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in STRUCTURED_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+@contextmanager
+def log_context(**fields):
+    """with の中で出したログに fields（request_id など）を付ける。入れ子にすると項目は足される。"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+@contextmanager
+def log_event(logger, **fields):
+    """
+    イベント1件の処理を囲む。中のログに fields を付け、終わったら latency_ms 付きで1行出す。
+    例: with log_event(logger, event_id=..., event_type="message"): handle_message(event)
+    """
+    started = time.perf_counter()
+    with log_context(**fields):
+        try:
+            yield
+        finally:
+            logger.info(
+                "event handled",
+                extra={"latency_ms": round((time.perf_counter() - started) * 1000, 1)},
+            )
+
+
+def _start_listener(handlers):
+    """新しいキューと QueueListener を作り、ルートロガーをそのキューにつなぐ。"""
+    global _listener
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    logging.getLogger().handlers = [queue_handler]
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener_after_fork():
+    # リスナーのスレッドは fork 先に引き継がれないため、子プロセス（gunicorn のワーカー）で作り直す
+    if _listener is not None:
+        _start_listener(_listener.handlers)
+
+
+def setup_logging(level=None):
+    """
+    ルートロガーに QueueHandler を設定する。二回目以降の呼び出しは何もしない。
+    レベルは引数 > 環境変数 LOG_LEVEL > INFO の順で決まる。
+    形式は環境変数 LOG_STYLE（json（既定）/ text）。
+    fork した子プロセスでは、リスナーのスレッドを自動で起動し直す。
+    """
+    if _listener is not None:
+        return
+
+    level = level or os.environ.get("LOG_LEVEL", "INFO").upper()
+    style = os.environ.get("LOG_STYLE", "json").lower()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(
+        logging.Formatter(LOG_FORMAT) if style == "text" else JsonFormatter()
+    )
+    stream_handler.addFilter(RedactingFilter())
+
+    logging.getLogger().setLevel(level)
+    _start_listener([stream_handler])
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def should_log_body():
+    """Webhook ボディをログに出すかをサンプリング率 LOG_BODY_SAMPLE_RATE で決める。"""
+    try:
+        rate = float(os.environ.get("LOG_BODY_SAMPLE_RATE", "0.01"))
+    except ValueError:
+        rate = 0.0
+    return rate > 0 and random.random() < rate
@@ -0,0 +1,215 @@
+# 日付ごとのメニュー（Flex Message）の組み立てとキャッシュ用ファイル
+#   メニューは (日付, 商品マスタ・休日のバージョン) が同じなら誰に送っても同じなので、
+#   シリアライズ済みの JSON（bytes）を一度だけ作って使い回す。
+#   - プロセス内: 件数に上限のある LRU（MENU_CACHE_SIZE）
+#   - ディスク: MENU_CACHE_DIR（python tasks.py prewarm_menus で先の営業日分を作っておく）
+#     全ワーカーと prewarm_menus は同じ MENU_CACHE_DIR を見ること（別ホスト・別コンテナなら共有ボリュームにする）。
+#     共有していなくても各ワーカーが初回に作るので動きはするが、先に作っておく効果はなくなる。
+#   返信は SDK のモデルを組み立て直さず、キャッシュした bytes をそのまま reply API に送る。
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from utils.catalog import get_catalog
+from utils.config import get_config
+from utils.date_utils import order_window
+from utils.line_utils import post_json
+
+logger = logging.getLogger(__name__)
+
+REPLY_PATH = "/v2/bot/message/reply"
+
+WEEKDAYS_JA = "月火水木金土日"
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _day_label(day):
+    return f"{day.month}/{day.day}({WEEKDAYS_JA[day.weekday()]})"
+
+
+def _version_key(catalog):
+    versions = catalog.versions or {}
+    return f"h{versions.get('holidays', 0)}-p{versions.get('products', 0)}"
+
+
+def serialize_message(message):
+    """LINE のメッセージ（dict）を reply API にそのまま埋め込める bytes にする。"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ---------------------------------------
+# 組み立て（キャッシュがないときだけ）
+# ---------------------------------------
+def build_menu_message(day, products):
+    """その日の商品一覧の Flex Message（dict）を作る。"""
+    label = _day_label(day)
+    rows = [
+        {
+            "type": "box",
+            "layout": "horizontal",
+            "contents": [
+                {"type": "text", "text": p["product_name"], "size": "sm", "wrap": True, "flex": 4},
+                {"type": "text", "text": f"{p['price']}円", "size": "sm", "align": "end", "flex": 2},
+            ],
+        }
+        for p in products
+    ]
+    return {
+        "type": "flex",
+        "altText": f"{label}のメニュー",
+        "contents": {
+            "type": "bubble",
+            "header": {
+                "type": "box",
+                "layout": "vertical",
+                "contents": [{"type": "text", "text": f"{label}のメニュー", "weight": "bold", "size": "lg"}],
+            },
+            "body": {"type": "box", "layout": "vertical", "spacing": "sm", "contents": rows},
+            "footer": {
+                "type": "box",
+                "layout": "vertical",
+                "contents": [
+                    {
+                        "type": "text",
+                        "text": f"例: 注文 {day.month}/{day.day} {products[0]['product_name']}",
+                        "size": "xs",
+                        "color": "#888888",
+                        "wrap": True,
+                    }
+                ],
+            },
+        },
+    }
+
+
+# ---------------------------------------
+# キャッシュ（メモリ -> ディスク -> 組み立て）
+# ---------------------------------------
+def _cache_path(day, version_key):
+    return os.path.join(get_config()["MENU_CACHE_DIR"], f"menu-{day.isoformat()}-{version_key}.json")
+
+
+def _read_disk(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_disk(path, payload):
+    # 書きかけのファイルを読まれないよう、一時ファイルに書いてから置き換える
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("メニューのキャッシュを書き込めませんでした: %s", e)
+
+
+def get_menu_payload(day, catalog=None):
+    """
+    その日のメニューのシリアライズ済み bytes を返す。
+    注文できる商品がない日（休日・土日）は None。カタログが読めない場合は {"error": ...}。
+    """
+    catalog = catalog or get_catalog()
+    if isinstance(catalog, dict):
+        return catalog
+
+    key = (day, _version_key(catalog))
+    with _cache_lock:
+        payload = _cache.get(key)
+        if payload is not None:
+            _cache.move_to_end(key)
+            return payload
+
+    products = catalog.products_for(day)
+    if not products:
+        return None
+
+    path = _cache_path(day, key[1])
+    payload = _read_disk(path)
+    if payload is None:
+        payload = serialize_message(build_menu_message(day, products))
+        _write_disk(path, payload)
+
+    with _cache_lock:
+        _cache[key] = payload
+        _cache.move_to_end(key)
+        while len(_cache) > get_config()["MENU_CACHE_SIZE"]:
+            _cache.popitem(last=False)
+    return payload
+
+
+def next_menu_days(count, catalog=None, now=None):
+    """注文期間内で、注文できる商品がある日を先頭から count 日分返す。"""
+    catalog = catalog or get_catalog()
+    if isinstance(catalog, dict):
+        return []
+    first_day, last_day = order_window(now)
+    days = []
+    day = first_day
+    while day <= last_day and len(days) < count:
+        if catalog.products_for(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _prune_disk(version_key, first_day):
+    # 過去の日付・古いバージョンのファイルを消す（ファイル名は menu-YYYY-MM-DD-バージョン.json）
+    cache_dir = get_config()["MENU_CACHE_DIR"]
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        if not (name.startswith("menu-") and name.endswith(".json")):
+            continue
+        stem = name[len("menu-"):-len(".json")]
+        day_text, file_version = stem[:10], stem[11:]
+        if file_version != version_key or day_text < first_day.isoformat():
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def prewarm_menus(days=None):
+    """先の営業日のメニューを作ってディスクに置く（tasks.py から実行）。作った日付のリストを返す。"""
+    catalog = get_catalog()
+    if isinstance(catalog, dict):
+        return catalog
+    count = get_config()["MENU_PREWARM_DAYS"] if days is None else days
+    first_day, _ = order_window()
+    _prune_disk(_version_key(catalog), first_day)
+    warmed = next_menu_days(count, catalog)
+    for day in warmed:
+        get_menu_payload(day, catalog)
+    return warmed
+
+
+# ---------------------------------------
+# 返信（キャッシュした bytes をそのまま送る）
+# ---------------------------------------
+def reply_raw(reply_token, payloads):
+    """シリアライズ済みのメッセージ（bytes のリスト、最大5件）で返信する。"""
+    body = b"".join(
+        [
+            b'{"replyToken":',
+            json.dumps(reply_token).encode("utf-8"),
+            b',"messages":[',
+            b",".join(payloads),
+            b"]}",
+        ]
+    )
+    # LineBotApi.reply_message() は SDK のモデルしか受け取らないため、reply API に直接送る
+    post_json(REPLY_PATH, body)
@@ -0,0 +1,211 @@
+# 注文の書き込みバッファ（グループコミット）用ファイル
+#   締め切り前の混雑時に、1件ずつのトランザクション（接続の取り合い・コミットごとの fsync）を減らす。
+#   submit() された注文依頼をキューに溜め、専用スレッドが max_wait 秒ごと・max_batch 件ごとに
+#   1トランザクション（複数行 INSERT は1回）でまとめて書き込む。
+#   呼び出し側は自分の依頼のコミットが終わるまで待つので、「注文を受け付けました」はコミット後に返る。
+#   ORDER_BUFFER=1 のときだけ utils.orders.place_orders から使われる。
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from utils.config import get_config
+
+logger = logging.getLogger(__name__)
+
+# 1回のまとめ書き込みの件数（依頼数）の区切り
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+# まとめ書き込み1回の所要時間（ミリ秒）の区切り
+FLUSH_MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000)
+
+TIMEOUT_ERROR = "注文の登録結果を確認できませんでした。「確認」と送って注文状況を確かめてください。"
+DB_ERROR = "注文の登録中にデータベースエラーが発生しました。"
+
+
+def _bucket_counts(buckets):
+    counts = {f"le_{bound}": 0 for bound in buckets}
+    counts["gt_" + str(buckets[-1])] = 0
+    return counts
+
+
+def _observe(counts, buckets, value):
+    for bound in buckets:
+        if value <= bound:
+            counts[f"le_{bound}"] += 1
+            return
+    counts["gt_" + str(buckets[-1])] += 1
+
+
+class _PendingOrder:
+    __slots__ = ("line_user_id", "items", "future", "enqueued_at")
+
+    def __init__(self, line_user_id, items):
+        self.line_user_id = line_user_id
+        self.items = items
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class OrderWriteBuffer:
+    """
+    write_batch([(line_user_id, items), ...]) を1トランザクションで実行し、
+    依頼と同じ順の結果（{"success": ...} / {"error": ...}）のリストを返す関数を受け取る。
+    まとめ書き込みが例外で失敗した場合は、1件ずつ書き込み直して失敗をその依頼だけに留める。
+    """
+
+    def __init__(self, write_batch, max_batch=50, max_wait=0.005, timeout=10.0):
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "flushes": 0,
+            "requests": 0,
+            "orders": 0,
+            "fallbacks": 0,
+            "timeouts": 0,
+            "batch_size_max": 0,
+            "flush_ms_total": 0.0,
+            "flush_ms_max": 0.0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "batch_size": _bucket_counts(BATCH_SIZE_BUCKETS),
+            "flush_ms": _bucket_counts(FLUSH_MS_BUCKETS),
+        }
+        self._thread = threading.Thread(target=self._run, name="order-write-buffer", daemon=True)
+        self._thread.start()
+
+    # ---------------------------------------
+    # 呼び出し側（Webhook のスレッド）
+    # ---------------------------------------
+    def submit(self, line_user_id, items):
+        """注文依頼をキューに入れ、コミットされるまで待って結果を返す。"""
+        pending = _PendingOrder(line_user_id, items)
+        self._queue.put(pending)
+        try:
+            return pending.future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # まだ書き込まれていないとは限らないため、結果の確認を促す
+            with self._lock:
+                self._metrics["timeouts"] += 1
+            logger.warning("注文のまとめ書き込みの待ち時間が %.1f 秒を超えました: %s", self.timeout, line_user_id)
+            return {"error": TIMEOUT_ERROR}
+
+    def queue_size(self):
+        return self._queue.qsize()
+
+    # ---------------------------------------
+    # 書き込みスレッド
+    # ---------------------------------------
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # スレッドが止まると以降の注文がすべて待たされるため、ここで必ず受け止める
+                logger.exception("注文のまとめ書き込みで予期しないエラーが発生しました: %s", e)
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_result({"error": DB_ERROR})
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        requests = [(pending.line_user_id, pending.items) for pending in batch]
+        fallback = False
+        try:
+            results = self.write_batch(requests)
+        except Exception as e:
+            logger.warning("注文のまとめ書き込みに失敗したため1件ずつ書き込みます（%d件）: %s", len(batch), e)
+            fallback = True
+            results = [self._write_one(request) for request in requests]
+        finished = time.monotonic()
+
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
+
+        flush_ms = (finished - started) * 1000
+        wait_ms = max((started - pending.enqueued_at) * 1000 for pending in batch)
+        with self._lock:
+            metrics = self._metrics
+            metrics["flushes"] += 1
+            metrics["requests"] += len(batch)
+            metrics["orders"] += sum(len(pending.items) for pending in batch)
+            metrics["fallbacks"] += int(fallback)
+            metrics["batch_size_max"] = max(metrics["batch_size_max"], len(batch))
+            metrics["flush_ms_total"] += flush_ms
+            metrics["flush_ms_max"] = max(metrics["flush_ms_max"], flush_ms)
+            metrics["wait_ms_total"] += wait_ms
+            metrics["wait_ms_max"] = max(metrics["wait_ms_max"], wait_ms)
+            _observe(metrics["batch_size"], BATCH_SIZE_BUCKETS, len(batch))
+            _observe(metrics["flush_ms"], FLUSH_MS_BUCKETS, flush_ms)
+
+    def _write_one(self, request):
+        try:
+            return self.write_batch([request])[0]
+        except Exception as e:
+            logger.error("!!! 注文の登録に失敗しました: %s !!!", e)
+            return {"error": DB_ERROR}
+
+    # ---------------------------------------
+    # メトリクス（/metrics）
+    # ---------------------------------------
+    def snapshot(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["batch_size"] = dict(metrics["batch_size"])
+            metrics["flush_ms"] = dict(metrics["flush_ms"])
+        flushes = metrics["flushes"] or 1
+        metrics["batch_size_avg"] = round(metrics["requests"] / flushes, 2)
+        metrics["flush_ms_avg"] = round(metrics.pop("flush_ms_total") / flushes, 2)
+        metrics["wait_ms_avg"] = round(metrics.pop("wait_ms_total") / flushes, 2)
+        metrics["flush_ms_max"] = round(metrics["flush_ms_max"], 2)
+        metrics["wait_ms_max"] = round(metrics["wait_ms_max"], 2)
+        metrics["queued"] = self.queue_size()
+        return metrics
+
+
+_order_buffer = None
+_order_buffer_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # 書き込みスレッドは fork 先に引き継がれないため、子プロセスでは作り直す
+    global _order_buffer, _order_buffer_lock
+    _order_buffer = None
+    _order_buffer_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_order_buffer(write_batch=None):
+    """
+    プロセスで1つの OrderWriteBuffer を返す（初回は write_batch を渡して作る）。
+    まだ作られていない場合に write_batch を省略すると None。
+    """
+    global _order_buffer
+    if _order_buffer is None and write_batch is not None:
+        with _order_buffer_lock:
+            if _order_buffer is None:
+                config = get_config()
+                _order_buffer = OrderWriteBuffer(
+                    write_batch,
+                    max_batch=config["ORDER_BUFFER_MAX_BATCH"],
+                    max_wait=config["ORDER_BUFFER_MAX_WAIT_MS"] / 1000,
+                    timeout=config["ORDER_BUFFER_TIMEOUT"],
+                )
+    return _order_buffer
@@ -0,0 +1,187 @@
+# ユーザーごとの「今後の注文」キャッシュ（確認・キャンセル用）
+#   1回のインデックス検索（idx_orders_user_id_order_date_live）で今日以降の注文を取り出し、
+#   プロセス内に短い TTL で保持する。注文を書き込んだら invalidate() を呼ぶこと。
+#   キャンセル（order_deleted_at を立てる）は cancel() で行い、キャッシュもその場で更新する。
+#   キャッシュはワーカーごとに別なので、注文は一覧の何番目かではなく注文番号（order_id）で指定させる。
+import threading
+import time
+from collections import OrderedDict
+
+from utils.config import get_config
+from utils.date_utils import order_window, today_jst
+from utils.db_utils import execute_prepared, execute_sql, register_statement
+
+UPCOMING_ORDERS_SQL = """
+    SELECT
+        o.order_id, o.order_date, o.product_name, o.quantity, o.total_amount,
+        COALESCE(opt.options, '') AS options
+    FROM users u
+    JOIN orders o ON o.user_id = u.user_id
+    LEFT JOIN LATERAL (
+        SELECT string_agg(od.option_name || ':' || od.option_value, ' / '
+                          ORDER BY od.option_detail_id) AS options
+        FROM option_details od
+        WHERE od.order_id = o.order_id AND od.order_date = o.order_date
+    ) opt ON TRUE
+    WHERE u.user_line_id = %s
+      AND o.order_date >= %s
+      AND o.order_deleted_at IS NULL
+    ORDER BY o.order_date, o.order_id
+"""
+# SQLite には LATERAL と ORDER BY 付きの string_agg がないため、並べた副問い合わせを group_concat でつなぐ
+UPCOMING_ORDERS_SQLITE_SQL = """
+    SELECT
+        o.order_id, o.order_date, o.product_name, o.quantity, o.total_amount,
+        COALESCE((
+            SELECT group_concat(opt.option_text, ' / ')
+            FROM (
+                SELECT od.option_name || ':' || od.option_value AS option_text
+                FROM option_details od
+                WHERE od.order_id = o.order_id AND od.order_date = o.order_date
+                ORDER BY od.option_detail_id
+            ) opt
+        ), '') AS options
+    FROM users u
+    JOIN orders o ON o.user_id = u.user_id
+    WHERE u.user_line_id = %s
+      AND o.order_date >= %s
+      AND o.order_deleted_at IS NULL
+    ORDER BY o.order_date, o.order_id
+"""
+register_statement("upcoming_orders", UPCOMING_ORDERS_SQL, sqlite_sql=UPCOMING_ORDERS_SQLITE_SQL)
+
+# 主キー (order_id, order_date) で1行だけ更新する（本人の注文で未キャンセル・締め切り前のものだけ）
+CANCEL_ORDER_SQL = """
+    UPDATE orders
+    SET order_deleted_at = NOW(), order_updated_at = NOW()
+    WHERE order_id = %s AND order_date = %s
+      AND user_id = (SELECT user_id FROM users WHERE user_line_id = %s)
+      AND order_deleted_at IS NULL
+      AND order_date >= %s
+    RETURNING order_id
+"""
+
+
+class UpcomingOrderCache:
+    """
+    user_line_id -> 今日以降の未キャンセルの注文（order_date, order_id 順）。
+    LRU で max_users 人分まで、各エントリは ttl 秒で読み直す。
+    他のワーカーで書き込まれた注文は ttl 秒以内に反映される。
+    """
+
+    def __init__(self, max_users=1000, ttl=60):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, line_user_id, today):
+        rows = execute_prepared(
+            "upcoming_orders", (line_user_id, today), sticky_key=line_user_id
+        )
+        if "error" in rows:
+            return rows
+        return [
+            {
+                "order_id": row["order_id"],
+                "order_date": row["order_date"],
+                "product_name": row["product_name"],
+                "quantity": row["quantity"],
+                "total_amount": row["total_amount"],
+                "options": row["options"],
+            }
+            for row in rows
+        ]
+
+    def get(self, line_user_id):
+        """今後の注文のリストを返す。DBエラー時は {"error": ...}。"""
+        today = today_jst()
+        with self._lock:
+            entry = self._entries.get(line_user_id)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self._entries.move_to_end(line_user_id)
+                # 日付が変わった場合は過去になった注文を外すだけでよい
+                return [order for order in entry[0] if order["order_date"] >= today]
+
+        orders = self._load(line_user_id, today)
+        if "error" in orders:
+            return orders
+        with self._lock:
+            self._entries[line_user_id] = (orders, time.monotonic())
+            self._entries.move_to_end(line_user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return list(orders)
+
+    def invalidate(self, line_user_id):
+        """注文を書き込んだ・変更したときに呼ぶ（次の get() で読み直す）。"""
+        with self._lock:
+            self._entries.pop(line_user_id, None)
+
+    def find(self, line_user_id, order_id):
+        """
+        注文番号（order_id）の今後の注文を返す。キャッシュになければ（他のワーカーで注文した直後など）
+        読み直して探す。見つからなければ None、DBエラー時は {"error": ...}。
+        """
+        for attempt in range(2):
+            if attempt:
+                self.invalidate(line_user_id)
+            orders = self.get(line_user_id)
+            if "error" in orders:
+                return orders
+            for order in orders:
+                if order["order_id"] == order_id:
+                    return order
+        return None
+
+    def cancel(self, line_user_id, order_id, now=None):
+        """
+        注文番号（order_id）の注文を1件キャンセルする。
+        締め切りを過ぎた日（order_window() の最初の日より前）の注文はキャンセルできない。
+        戻り値: {"success": True, "order": 注文} / {"error": ...}（すでにキャンセル済み・存在しない場合も error）
+        """
+        order = self.find(line_user_id, order_id)
+        if order is None:
+            return {"error": f"注文番号 {order_id} の注文は見つかりません。"}
+        if "error" in order:
+            return order
+        first_day, _ = order_window(now)
+        if order["order_date"] < first_day:
+            return {"error": "締め切りを過ぎたため、この注文はキャンセルできません。"}
+
+        rows = execute_sql(
+            CANCEL_ORDER_SQL,
+            (order["order_id"], order["order_date"], line_user_id, first_day),
+            fetch=True,
+            sticky_key=line_user_id,
+        )
+        if "error" in rows:
+            return rows
+        if not rows:
+            # 他の端末・ワーカーで変更されていた（キャッシュが古い）
+            self.invalidate(line_user_id)
+            return {"error": "この注文はすでにキャンセルされています。"}
+
+        with self._lock:
+            entry = self._entries.get(line_user_id)
+            if entry is not None:
+                remaining = [o for o in entry[0] if o["order_id"] != order["order_id"]]
+                self._entries[line_user_id] = (remaining, entry[1])
+        return {"success": True, "order": order}
+
+
+_order_cache = None
+_order_cache_lock = threading.Lock()
+
+
+def get_order_cache():
+    global _order_cache
+    if _order_cache is None:
+        with _order_cache_lock:
+            if _order_cache is None:
+                config = get_config()
+                _order_cache = UpcomingOrderCache(
+                    max_users=config["ORDER_CACHE_SIZE"],
+                    ttl=config["ORDER_CACHE_TTL"],
+                )
+    return _order_cache
@@ -0,0 +1,116 @@
+# 注文の書き込み用ファイル
+#   複数日分の注文を1トランザクション・1回の複数行 INSERT で登録する。
+#   ORDER_BUFFER=1 のときは utils.order_buffer で複数ユーザーの注文をまとめて書き込む（グループコミット）。
+import logging
+
+from utils.config import get_config
+from utils.db_utils import transaction
+from utils.order_buffer import DB_ERROR, get_order_buffer
+from utils.order_cache import get_order_cache
+
+logger = logging.getLogger(__name__)
+
+USER_IDS_SQL = """
+    SELECT user_line_id, user_id FROM users
+    WHERE user_line_id IN ({placeholders}) AND user_deleted_at IS NULL
+"""
+
+ORDER_COLUMNS = (
+    "user_id, product_id, product_name, quantity, unit_price, "
+    "option_total_amount, total_amount, order_date"
+)
+
+# 複数行 INSERT。RETURNING の並び順は保証されないため、各行に通し番号（ordinal）を付けて
+# その順に INSERT する。order_id はこの順に採番されるので、返ってきた order_id を
+# 昇順に並べると VALUES の順（= 依頼・品目の順）になる。
+INSERT_ORDERS_SQL = f"""
+    WITH v ({ORDER_COLUMNS}, ordinal) AS (VALUES {{rows}})
+    INSERT INTO orders ({ORDER_COLUMNS})
+    SELECT {ORDER_COLUMNS} FROM v ORDER BY ordinal
+    RETURNING order_id
+"""
+
+
+def _order_values(user_id, item):
+    total_amount = item["unit_price"] * item["quantity"]
+    return (
+        user_id,
+        item["product_id"],
+        item["product_name"],
+        item["quantity"],
+        item["unit_price"],
+        0,
+        total_amount,
+        item["order_date"],
+    )
+
+
+def _placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+def write_order_batch(cursor, requests):
+    """
+    注文依頼 [(line_user_id, items), ...] を、渡されたトランザクションのカーソルでまとめて登録する。
+    戻り値は requests と同じ順の結果のリスト（place_orders() の戻り値と同じ形）。
+    ユーザー不明は依頼ごとの {"error": ...}、DBエラーは例外として伝わる。
+    """
+    line_user_ids = sorted({line_user_id for line_user_id, _ in requests})
+    cursor.execute(USER_IDS_SQL.format(placeholders=_placeholders(len(line_user_ids))), line_user_ids)
+    user_ids = {r[0]: r[1] for r in cursor.fetchall()}
+
+    results = [None] * len(requests)
+    accepted = []
+    for index, (line_user_id, items) in enumerate(requests):
+        user_id = user_ids.get(line_user_id)
+        if user_id is None:
+            results[index] = {"error": "ユーザー情報が見つかりません。"}
+            continue
+        accepted.append((index, [_order_values(user_id, item) for item in items]))
+
+    if not accepted:
+        return results
+
+    values = [row_values for _, rows in accepted for row_values in rows]
+    row_sql = "(" + _placeholders(len(values[0]) + 1) + ")"
+    cursor.execute(
+        INSERT_ORDERS_SQL.format(rows=", ".join([row_sql] * len(values))),
+        [value for ordinal, row_values in enumerate(values) for value in (*row_values, ordinal)],
+    )
+    order_ids = iter(sorted(r[0] for r in cursor.fetchall()))
+    for index, rows in accepted:
+        results[index] = {
+            "success": True,
+            "order_ids": [next(order_ids) for _ in rows],
+            "total_amount": sum(row_values[6] for row_values in rows),
+        }
+    return results
+
+
+def write_orders(requests):
+    """
+    write_order_batch() を1トランザクションで実行する（OrderWriteBuffer の書き込み関数）。
+    DBエラーは例外のまま返し、まとめ書き込みでは OrderWriteBuffer が1件ずつ書き込み直す。
+    """
+    # コミット後しばらくは、この利用者の「確認」をレプリカではなくプライマリから読む
+    sticky_keys = [line_user_id for line_user_id, _ in requests]
+    with transaction(sticky_key=sticky_keys) as cursor:
+        return write_order_batch(cursor, requests)
+
+
+def place_orders(line_user_id, items):
+    """
+    parse_and_validate_order_text() の data をまとめて登録する。
+    ORDER_BUFFER=1 のときは他のユーザーの注文と一緒に書き込み、コミットされるまで待つ。
+    戻り値: {"success": True, "order_ids": [...], "total_amount": 合計} または {"error": "メッセージ"}
+    """
+    try:
+        if get_config()["ORDER_BUFFER"]:
+            return get_order_buffer(write_orders).submit(line_user_id, items)
+        return write_orders([(line_user_id, items)])[0]
+    except Exception as e:
+        logger.error("!!! 注文の登録に失敗しました: %s !!!", e)
+        return {"error": DB_ERROR}
+    finally:
+        # 確認・キャンセル用のキャッシュは次回読み直す
+        get_order_cache().invalidate(line_user_id)
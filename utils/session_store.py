@@ -0,0 +1,160 @@
+# サーバーサイドセッション用ファイル（sessions テーブル）
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from utils.db_utils import execute_sql, execute_prepared, register_statement
+
+logger = logging.getLogger(__name__)
+
+SESSION_SELECT_SQL = """
+    SELECT data, expires_at FROM sessions
+    WHERE session_id = %s AND expires_at > NOW()
+"""
+register_statement("session_select", SESSION_SELECT_SQL)
+SESSION_UPSERT_SQL = """
+    INSERT INTO sessions (session_id, data, expires_at) VALUES (%s, %s, %s)
+    ON CONFLICT (session_id) DO UPDATE
+    SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at
+"""
+SESSION_TOUCH_SQL = "UPDATE sessions SET expires_at = %s WHERE session_id = %s"
+SESSION_DELETE_SQL = "DELETE FROM sessions WHERE session_id = %s"
+
+
+class DbSession(CallbackDict, SessionMixin):
+    """sessions テーブルの1行に対応するセッション。変更されたら modified が立つ。"""
+
+    def __init__(self, initial=None, session_id=None, expires_at=None, new=False):
+        def on_update(self_):
+            self_.modified = True
+
+        super().__init__(initial, on_update)
+        self.session_id = session_id
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+
+
+class DbSessionInterface(SessionInterface):
+    """
+    sessions テーブルを使う SessionInterface。
+    - 読み込みはプロセス内の小さなキャッシュ（LRU + 短い TTL）を優先する
+    - 書き込みはセッションが変更されたときだけ行う
+    - 有効期限の延長は残り時間が半分を切ったときだけ行う
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, lifetime_minutes=60, cache_size=256, cache_ttl=5):
+        self.lifetime = timedelta(minutes=lifetime_minutes)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------------------- キャッシュ ----------------------
+    def _cache_get(self, session_id):
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is None:
+                return None
+            text, expires_at, cached_at = entry
+            if time.monotonic() - cached_at > self.cache_ttl:
+                del self._cache[session_id]
+                return None
+            self._cache.move_to_end(session_id)
+            return text, expires_at
+
+    def _cache_put(self, session_id, text, expires_at):
+        with self._lock:
+            self._cache[session_id] = (text, expires_at, time.monotonic())
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, session_id):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+    # ---------------------- 読み込み ----------------------
+    def _new_session(self):
+        return DbSession(session_id=secrets.token_urlsafe(32), new=True)
+
+    def open_session(self, app, request):
+        session_id = request.cookies.get(self.get_cookie_name(app))
+        if not session_id or len(session_id) > 128:
+            return self._new_session()
+
+        now_utc = datetime.now(timezone.utc)
+        cached = self._cache_get(session_id)
+        if cached and cached[1] > now_utc:
+            data = self.serializer.loads(cached[0])
+            return DbSession(data, session_id=session_id, expires_at=cached[1])
+
+        rows = execute_prepared("session_select", (session_id,))
+        if "error" in rows:
+            logger.warning("セッションの読み込みに失敗しました: %s", rows["error"])
+            return self._new_session()
+        if not rows:
+            return self._new_session()
+
+        expires_at = rows[0]["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        # キャッシュにはシリアライズ済みの文字列を置く（ネストした値の共有を避ける）
+        self._cache_put(session_id, rows[0]["data"], expires_at)
+        data = self.serializer.loads(rows[0]["data"])
+        return DbSession(data, session_id=session_id, expires_at=expires_at)
+
+    # ---------------------- 書き込み ----------------------
+    def save_session(self, app, session, response):
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # 空になったセッションは行ごと削除する
+        if not session:
+            if session.modified and not session.new:
+                execute_sql(SESSION_DELETE_SQL, (session.session_id,))
+                self._cache_drop(session.session_id)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        now_utc = datetime.now(timezone.utc)
+        new_expires_at = now_utc + self.lifetime
+
+        if session.modified or session.new:
+            # TaggedJSONSerializer は区切り文字を詰めて出力する
+            data = self.serializer.dumps(dict(session))
+            result = execute_sql(
+                SESSION_UPSERT_SQL, (session.session_id, data, new_expires_at)
+            )
+            if "error" in result:
+                return
+            self._cache_put(session.session_id, data, new_expires_at)
+        elif session.expires_at - now_utc < self.lifetime / 2:
+            # 有効期限の延長は遅延させる（残り半分を切ったときだけ UPDATE）
+            execute_sql(SESSION_TOUCH_SQL, (new_expires_at, session.session_id))
+            self._cache_put(
+                session.session_id, self.serializer.dumps(dict(session)), new_expires_at
+            )
+        else:
+            return
+
+        response.set_cookie(
+            cookie_name,
+            session.session_id,
+            expires=new_expires_at,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
@@ -1,7 +1,11 @@
 from datetime import datetime, timedelta, timezone
 import secrets
-from datetime import datetime, timedelta
-from utils.db_utils import execute_sql
+from flask import session
+from utils.db_utils import execute_sql, execute_prepared, register_statement
+
+# 管理画面のトークン検証（フォーム表示・送信のたびに実行される）
+AUTH_TOKEN_LOOKUP_SQL = "SELECT admin_id, expires_at FROM auth_tokens WHERE token = %s"
+register_statement("auth_token_lookup", AUTH_TOKEN_LOOKUP_SQL)
 
 #--------------------------------------------------------------
 #ワンタイムトークンを作成して auth_tokens に保存する
@@ -39,11 +43,62 @@ def verify_token(token: str):
     """
     rows = execute_sql(sql, (token,), fetch=True)
 
-    if not rows:
+    if not rows or "error" in rows:
         return None
 
     row = rows[0]
-    if datetime.utcnow() > row["expires_at"]:
+    # expires_at は TIMESTAMPTZ（aware）なので、aware な UTC と比較する
+    if datetime.now(timezone.utc) > row["expires_at"]:
         return None
 
-    return row
\ No newline at end of file
+    return row
+
+#--------------------------------------------------------------
+#管理画面用トークンを検証する（同じセッションで検証済みならDBを見ない）
+#--------------------------------------------------------------
+def check_admin_token(token):
+    """
+    戻り値: {"success": True, "admin_id": ...} または {"error": "メッセージ"}
+    """
+    if not token:
+        return {"error": "トークンがありません。"}
+
+    now_utc = datetime.now(timezone.utc)
+
+    # 同じセッションで検証済みのトークンなら DB に問い合わせない
+    verified = session.get("admin_token")
+    if (
+        verified
+        and verified.get("token") == token
+        and verified.get("expires_at", 0) > now_utc.timestamp()
+    ):
+        return {"success": True, "admin_id": verified.get("admin_id")}
+
+    rows = execute_prepared("auth_token_lookup", (token,))
+
+    if not rows or "error" in rows:
+        return {"error": "無効なトークンです。"}
+
+    expires_at = rows[0]["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+
+    # 有効期限チェック（UTC-awareで比較）
+    if now_utc > expires_at:
+        execute_sql("DELETE FROM auth_tokens WHERE token = %s", (token,))
+        return {"error": "トークンの有効期限が切れています。"}
+
+    session["admin_token"] = {
+        "token": token,
+        "admin_id": rows[0]["admin_id"],
+        "expires_at": expires_at.timestamp(),
+    }
+    return {"success": True, "admin_id": rows[0]["admin_id"]}
+
+
+#--------------------------------------------------------------
+#トークンを失効させる（DBとセッションの両方から削除）
+#--------------------------------------------------------------
+def revoke_admin_token(token):
+    session.pop("admin_token", None)
+    return execute_sql("DELETE FROM auth_tokens WHERE token = %s", (token,))
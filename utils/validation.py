@@ -1,6 +1,10 @@
 #データ検証用ファイル
 import re  # 正規表現処理用
 import unicodedata  # 全角・半角変換用
+from datetime import date, timedelta
+
+import constants
+from utils.date_utils import order_window
 
 # =========================================================
 # ★ 新規ユーザー登録のためのデータ検証関数
@@ -62,4 +66,129 @@ def parse_and_validate_registration_data(user_text):
             "last_name": last_name,
             "first_name": first_name,
         },
-    }
\ No newline at end of file
+    }
+
+# =========================================================
+# ★ 注文（複数日まとめて）のためのデータ検証関数
+#   例: 「注文 月 幕の内 / 火 ハンバーグ丼 2」
+#   日付は曜日（月〜金）または M/D、商品名は前方一致・部分一致でもよい（1つに決まる場合）
+# =========================================================
+WEEKDAY_NAMES = "月火水木金土日"
+
+
+def _resolve_order_date(day_text, first_day, last_day):
+    """曜日または M/D を、first_day〜last_day の範囲の日付にする。決められなければ None。"""
+    day_text = re.sub(r"(曜日|曜)$", "", day_text)
+
+    if len(day_text) == 1 and day_text in WEEKDAY_NAMES:
+        # first_day 以降で最初のその曜日
+        offset = (WEEKDAY_NAMES.index(day_text) - first_day.weekday()) % 7
+        return first_day + timedelta(days=offset)
+
+    match = re.fullmatch(r"(\d{1,2})/(\d{1,2})", day_text)
+    if match:
+        month, day = int(match.group(1)), int(match.group(2))
+        # 年は省略されるので、範囲内に入る方を選ぶ（年末に年明けの分を注文する場合など）
+        for year in (first_day.year, first_day.year + 1):
+            try:
+                candidate = date(year, month, day)
+            except ValueError:
+                return None
+            if first_day <= candidate <= last_day:
+                return candidate
+    return None
+
+
+def _match_product(product_text, products):
+    """完全一致 -> 前方一致 -> 部分一致の順で、1つに決まる商品を返す。(商品, エラー文)"""
+    for rule in (
+        lambda name: name == product_text,
+        lambda name: name.startswith(product_text),
+        lambda name: product_text in name,
+    ):
+        candidates = [p for p in products if rule(p["product_name"])]
+        if len(candidates) == 1:
+            return candidates[0], None
+        if len(candidates) > 1:
+            names = "、".join(p["product_name"] for p in candidates)
+            return None, f"「{product_text}」に当てはまる商品が複数あります（{names}）。"
+    return None, None
+
+
+def parse_and_validate_order_text(user_text, catalog, now=None):
+    """
+    注文メッセージをパースし、商品の販売日・休日・締切で検証する。
+    catalog は utils.catalog.Catalog（products_for(date) / is_holiday(date) を持つもの）。
+    戻り値: {"success": True, "data": [{order_date, product_id, product_name, unit_price, quantity}, ...]}
+            または {"error": "メッセージ"}
+    """
+    # 締切を過ぎていれば今日の分は注文できない
+    first_day, last_day = order_window(now)
+
+    # 1. 前処理: 全角英数字・記号を半角に（全角スペースも半角になる）、先頭の「注文」を外す
+    normalized_text = unicodedata.normalize("NFKC", user_text).strip()
+    if normalized_text.startswith(constants.USER_KEYWORD_ORDER):
+        normalized_text = normalized_text[len(constants.USER_KEYWORD_ORDER):]
+
+    # 2. 「/」または改行で1日分ずつに分ける
+    segments = [s.strip() for s in re.split(r"[/\n]", normalized_text) if s.strip()]
+    # M/D の「/」で分かれてしまった分を戻す（「5」と「20 幕の内」 -> 「5/20 幕の内」）
+    merged = []
+    for segment in segments:
+        if merged and re.fullmatch(r"\d{1,2}", merged[-1]) and re.match(r"\d{1,2}\s", segment):
+            merged[-1] = merged[-1] + "/" + segment
+        else:
+            merged.append(segment)
+
+    if not merged:
+        return {
+            "error": "注文する日と商品をスペース区切りで入力してください。（例: 注文 月 幕の内 / 火 ハンバーグ丼）"
+        }
+
+    items = []
+    for segment in merged:
+        parts = re.split(r"\s+", segment)
+        if len(parts) not in (2, 3):
+            return {"error": f"「{segment}」は「曜日 商品名 [個数]」の形で入力してください。"}
+
+        # 【検証 1: 日付】
+        order_date = _resolve_order_date(parts[0], first_day, last_day)
+        if order_date is None:
+            return {
+                "error": f"「{parts[0]}」は注文できる日ではありません。"
+                f"（{first_day.month}/{first_day.day}〜{last_day.month}/{last_day.day} の曜日または M/D で指定してください）"
+            }
+        label = f"{order_date.month}/{order_date.day}({WEEKDAY_NAMES[order_date.weekday()]})"
+        if catalog.is_holiday(order_date):
+            return {"error": f"{label} はお休みのため注文できません。"}
+
+        # 【検証 2: 商品（その日に販売しているもの）】
+        products = catalog.products_for(order_date)
+        if not products:
+            return {"error": f"{label} は注文できる商品がありません。"}
+        product, error = _match_product(parts[1], products)
+        if error:
+            return {"error": error}
+        if product is None:
+            return {"error": f"{label} に「{parts[1]}」は販売していません。"}
+
+        # 【検証 3: 個数（省略時は1）】
+        quantity = 1
+        if len(parts) == 3:
+            quantity_text = re.sub(r"^[x×]|個$", "", parts[2])
+            if not quantity_text.isdigit() or not (1 <= int(quantity_text) <= 5):
+                return {"error": f"個数は1から5の数字で入力してください。（{parts[2]}）"}
+            quantity = int(quantity_text)
+
+        items.append(
+            {
+                "order_date": order_date,
+                "product_id": product["product_id"],
+                "product_name": product["product_name"],
+                "unit_price": product["price"],
+                "quantity": quantity,
+            }
+        )
+
+    items.sort(key=lambda item: item["order_date"])
+    return {"success": True, "data": items}